@@ -1,17 +1,26 @@
+import time
+import json
+
 import streamlit as st
 import yfinance as yf
 import pandas as pd
-import json
-import os
 
-from data_provider import get_stock_data, get_etf_data, get_crypto_data, fetch_concurrently
+from data_provider import get_daemon_client, stream_rows, fetch_rows, PENDING_STATUS
+from screener import get_universe, parse_tickers, run_screener, filter_results
+from history_provider import load_watchlist_history
+from technical_provider import calculate_technical_summaries
 from ui_helpers import (
     render_dataframe, render_etf_dataframe, render_crypto_dataframe, 
     inject_premium_css, render_ticker_tape, render_metric_card,
-    render_custom_header
+    render_custom_header, render_streaming_dataframe, render_trace_waterfall
 )
-from economics_provider import get_market_summary, get_economic_calendar
+from economics_provider import get_market_summary, get_live_market_summary, get_economic_calendar, CALENDAR_COLUMNS
+from rate_limiter import UpstreamThrottled
 from tools_helper import render_compound_interest_tool, render_mortgage_tool
+from watchlist import load_tickers, save_tickers
+from refresher import start_background_refresh
+from metrics import start_metrics_server, summary as metrics_summary, REGISTRY as METRICS
+import tracing
 import consts
 
 # --- Page Configuration ---
@@ -26,55 +35,221 @@ st.set_page_config(
 inject_premium_css()
 
 # --- Load Data ---
-TICKERS_FILE = "tickers.json"
-DEFAULT_TICKERS = {
-    "stocks": ["AAPL", "TSLA", "MSFT", "GOOGL", "AMZN", "META", "NVDA", "NFLX", "AMD", "INTC"],
-    "etfs": [],
-    "crypto": []
-}
-
-def load_tickers():
-    if os.path.exists(TICKERS_FILE):
-        try:
-            with open(TICKERS_FILE, "r") as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    return {"stocks": data, "etfs": [], "crypto": []}
-                if isinstance(data, dict):
-                    for key in ["stocks", "etfs", "crypto"]:
-                        if key not in data:
-                            data[key] = []
-                    return data
-        except Exception:
-            pass
-    return DEFAULT_TICKERS.copy()
-
-def save_tickers(tickers):
-    try:
-        with open(TICKERS_FILE, "w") as f:
-            json.dump(tickers, f)
-    except Exception as e:
-        print(f"Error saving tickers: {e}")
-
 # Initialize session state
 if 'tickers' not in st.session_state:
     st.session_state.tickers = load_tickers()
 
+LIVE_INTERVALS = [5, 10, 30, 60]  # Seconds between partial reruns in live mode
+SNAPSHOT_TTL = 60  # Seconds a session reuses its rows across reruns and pages
+SCREENER_UNIVERSES = ["Mi lista", "S&P 500", "NASDAQ 100", "Lista personalizada"]
+SCREENER_POLL = 3  # Seconds between checks on a screener run in the market daemon
+ASSET_VIEWS = {"🏢 Acciones": "stocks", "📊 ETFs": "etfs", "🪙 Cripto": "crypto"}
+NAV_PAGES = ["Dashboard Principal", "Análisis de Mercado", "Calendario Económico", "Herramientas"]
+ADMIN_PAGES = ["Métricas", "Trazas"]  # Only listed with ?admin=1 in the URL
+
+def tracing_enabled():
+    """Reruns are traced with TRACING=1, or for one session opened with ?trace=1."""
+    return tracing.enabled() or st.query_params.get("trace") == "1"
+
+def live_interval():
+    """Seconds between fragment reruns, or None when live mode is off."""
+    if st.session_state.get("live_refresh"):
+        return st.session_state.get("live_interval", LIVE_INTERVALS[1])
+    return None
+
+def load_market_summary(live=False):
+    """Tape items from the market daemon when configured (empty while it can't be reached), otherwise fetched here."""
+    with tracing.span("market_summary", live=live):
+        client = get_daemon_client()
+        if client is not None:
+            return client.market_summary() or []
+        try:
+            return get_live_market_summary() if live else get_market_summary()
+        except UpstreamThrottled as e:
+            print(f"Error fetching market summary: {e}")
+            return []  # Not cached, so the next rerun tries again
+
+def load_economic_calendar():
+    """This week's calendar from the market daemon when configured, otherwise fetched here."""
+    client = get_daemon_client()
+    if client is None:
+        try:
+            return get_economic_calendar()
+        except UpstreamThrottled as e:
+            print(f"Error fetching economic calendar: {e}")
+            return pd.DataFrame(columns=CALENDAR_COLUMNS)  # Not cached, so the next rerun tries again
+    calendar = client.economic_calendar()
+    return calendar if calendar is not None else pd.DataFrame(columns=CALENDAR_COLUMNS)
+
+def load_screener(universe, tickers=None):
+    """
+    Screener results for a universe (tickers given for 'Mi lista' and custom
+    lists). With a market daemon the run happens there: returns None while it
+    is still running. Raises when the universe or the run fails.
+    """
+    client = get_daemon_client()
+    if client is None:
+        return run_screener(tickers or get_universe(universe))
+    response = client.screener(universe, tickers)
+    if response is None:
+        raise RuntimeError("el demonio de datos no responde")
+    status, payload = response
+    if status == "failed":
+        raise RuntimeError(payload)
+    return payload if status == "done" else None
+
+def screener_poll():
+    """Fragment shown while the daemon runs the screener; reruns the page on each tick to check on it."""
+    if fragment_rerun("screener_poll"):
+        st.rerun()
+
+def live_ticker_tape(summary=None):
+    """
+    Ticker tape body; rerun on its own as a fragment in live mode. A page run
+    renders the summary main() already loaded; live ticks load a fresh one.
+    """
+    tick = fragment_rerun("live_ticker_tape")
+    with tracing.trace("live_ticker_tape", enabled=tracing_enabled()):
+        if summary is None or tick:
+            summary = load_market_summary(live=bool(st.session_state.get("live_refresh")))
+        render_ticker_tape(summary)
+
+def fragment_rerun(name):
+    """
+    True when fragment `name` reruns on its own (a live tick) rather than as
+    part of a full page run; main() counts those in page_run.
+    """
+    page_run = st.session_state.get("page_run", 0)
+    seen = st.session_state.setdefault("fragment_runs", {})
+    rerun = seen.get(name) == page_run
+    seen[name] = page_run
+    return rerun
+
+def session_rows(kind, tickers, max_age=SNAPSHOT_TTL):
+    """Rows from this session's snapshot if it covers tickers and is recent enough, else None."""
+    entry = st.session_state.get("snapshot", {}).get(kind)
+    if entry and entry["tickers"] == tuple(tickers) and time.time() - entry["at"] < max_age:
+        return entry["rows"]
+    return None
+
+def store_rows(kind, tickers, rows):
+    """Keeps a complete set of rows as the session snapshot shared by every page."""
+    if any(row.get("Estado") == PENDING_STATUS for row in rows):
+        return  # Timed-out tickers get another chance on the next rerun
+    st.session_state.setdefault("snapshot", {})[kind] = {
+        "tickers": tuple(tickers), "rows": rows, "at": time.time()
+    }
+
+def prepare_rows(kind, tickers):
+    """Loads the shared history and technicals stock rows are built from."""
+    if kind == "stocks" and get_daemon_client() is None:
+        with st.spinner("Cargando cotizaciones..."):
+            with tracing.span("load_watchlist_history", tickers=len(tickers)):
+                load_watchlist_history(tickers)
+            with tracing.span("calculate_technical_summaries", tickers=len(tickers)):
+                calculate_technical_summaries(tickers)
+
+def load_rows(kind, tickers):
+    """Rows for a page that doesn't stream: the session snapshot, or fetched and stored."""
+    rows = session_rows(kind, tickers)
+    if rows is None:
+        prepare_rows(kind, tickers)
+        rows = fetch_rows(kind, tickers)
+        store_rows(kind, tickers, rows)
+    return rows
+
+def live_asset_table(kind, tickers, render_func):
+    """
+    Asset table body; rerun on its own as a fragment in live mode. Page reruns
+    within SNAPSHOT_TTL (or the live interval) reuse the session snapshot;
+    live ticks and older snapshots stream the rows in, with slow fields from
+    the shared cache so only the quotes are refetched.
+    """
+    with tracing.trace("live_asset_table", enabled=tracing_enabled(), kind=kind):
+        interval = live_interval()
+        if interval and fragment_rerun("live_asset_table"):
+            rows = None  # Every tick shows new quotes
+        else:
+            rows = session_rows(kind, tickers, interval or SNAPSHOT_TTL)
+        if rows is not None:
+            tracing.annotate(snapshot=True)
+            render_func(pd.DataFrame(rows))
+            return
+        prepare_rows(kind, tickers)
+        streamed = render_streaming_dataframe(stream_rows(kind, tickers), tickers, render_func)
+        store_rows(kind, tickers, [streamed[t] for t in tickers if t in streamed])
+
+def render_metrics_page():
+    """Admin view of this process's provider, upstream, cache and thread-pool metrics."""
+    st.title("🛠️ Métricas del Proceso")
+    st.caption("Contadores desde el arranque de este proceso. Prometheus puede leerlos en /metrics del puerto METRICS_PORT.")
+    tables = metrics_summary()
+    sections = [
+        ("Funciones de datos", "providers", "Sin llamadas calculadas todavía."),
+        ("Peticiones a Yahoo Finance", "upstream", "Sin peticiones todavía."),
+        ("Caché", "cache", "Sin consultas a la caché todavía."),
+        ("Pool de hilos", "pool", "Sin tareas en el pool todavía."),
+        ("Errores", "errors", "Sin errores registrados.")
+    ]
+    for title, key, empty in sections:
+        st.markdown(f"### {title}")
+        if tables[key]:
+            st.dataframe(pd.DataFrame(tables[key]), use_container_width=True, hide_index=True)
+        else:
+            st.info(empty)
+    with st.expander("Formato Prometheus"):
+        st.code(METRICS.render(), language="text")
+
+def render_traces_page():
+    """Debug view of the traces in this process's ring buffer, as a waterfall per rerun."""
+    st.title("🧭 Trazas de Ejecución")
+    traces = tracing.recent_traces()
+    if not traces:
+        st.info("No hay trazas. Activa TRACING=1 o abre la app con ?trace=1 y navega por alguna página.")
+        return
+
+    def describe(current):
+        page = current.root.attrs.get("page", "")
+        started = time.strftime("%H:%M:%S", time.localtime(current.started_at))
+        return f"{started} · {current.name} {page} · {current.duration * 1000:.0f} ms"
+
+    selected = st.selectbox("Traza", traces, format_func=describe)
+    rows = tracing.waterfall(selected)
+    render_trace_waterfall(rows)
+    with st.expander("Pasos"):
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    st.download_button(
+        "Exportar trazas (Chrome trace JSON)",
+        json.dumps(tracing.to_chrome_trace(traces)),
+        file_name="trazas.json",
+        mime="application/json",
+        help="Se abre en chrome://tracing o ui.perfetto.dev"
+    )
+
 def main():
+    st.session_state.page_run = st.session_state.get("page_run", 0) + 1
+
+    # Keep the watchlist cache warm so renders don't wait on yfinance;
+    # with a market daemon configured, the daemon does the fetching instead
+    if get_daemon_client() is None:
+        start_background_refresh()
+    start_metrics_server()
+
+    # Fragments rerun alone on the interval; the rest of the page only on interaction
+    refresh_every = live_interval()
+
     # --- Top Bar Segment (Ticker Tape) ---
-    market_summary = get_market_summary()
-    render_ticker_tape(market_summary)
+    market_summary = load_market_summary(live=bool(refresh_every))
+    st.fragment(live_ticker_tape, run_every=refresh_every)(market_summary)
     render_custom_header()
 
     # --- Sidebar Navigation ---
     with st.sidebar:
         st.title("🛡️ Investing Pro")
         st.markdown("---")
-        nav_selection = st.radio(
-            "Navegación",
-            ["Dashboard Principal", "Análisis de Mercado", "Calendario Económico", "Herramientas"],
-            index=0
-        )
+        pages = NAV_PAGES + (ADMIN_PAGES if st.query_params.get("admin") == "1" else [])
+        nav_selection = st.radio("Navegación", pages, index=0)
+        tracing.annotate(page=nav_selection)
         st.markdown("---")
         st.caption("Configuración de Cartera")
         # Reuse existing management UI but condensed for sidebar
@@ -86,6 +261,15 @@ def main():
                     st.session_state.tickers["stocks"].remove(t)
                 save_tickers(st.session_state.tickers)
                 st.rerun()
+        st.caption("Actualización en Vivo")
+        st.toggle("Precios en vivo", key="live_refresh")
+        st.select_slider(
+            "Intervalo (segundos)",
+            options=LIVE_INTERVALS,
+            value=LIVE_INTERVALS[1],
+            key="live_interval",
+            disabled=not st.session_state.get("live_refresh")
+        )
 
     if nav_selection == "Dashboard Principal":
         st.title("Panel de Control")
@@ -103,11 +287,17 @@ def main():
                     )
 
         st.markdown("### Mis Activos")
-        tab_stocks, tab_etfs, tab_crypto = st.tabs([
-            "🏢 Acciones", "📊 ETFs", "🪙 Cripto"
-        ])
+        # Only the selected asset class is loaded (st.tabs would run all three bodies)
+        asset_view = st.segmented_control(
+            "Tipo de Activo",
+            list(ASSET_VIEWS),
+            default="🏢 Acciones",
+            key="asset_view",
+            label_visibility="collapsed"
+        ) or "🏢 Acciones"
+        kind = ASSET_VIEWS.get(asset_view)
 
-        with tab_stocks:
+        if kind == "stocks":
             # Search / Add UI
             c1, c2 = st.columns([4, 1])
             with c1:
@@ -121,39 +311,29 @@ def main():
                             save_tickers(st.session_state.tickers)
                             st.success(f"Añadido {t}")
                             st.rerun()
-            
-            if st.session_state.tickers["stocks"]:
-                with st.spinner("Cargando cotizaciones..."):
-                    data = fetch_concurrently(st.session_state.tickers["stocks"], get_stock_data)
-                if data:
-                    df = pd.DataFrame(data)
-                    render_dataframe(df)
-            else:
-                st.info("Añade acciones para comenzar.")
 
-        with tab_etfs:
-            if st.session_state.tickers["etfs"]:
-                with st.spinner("Cargando ETFs..."):
-                    data = fetch_concurrently(st.session_state.tickers["etfs"], get_etf_data)
-                if data:
-                    render_etf_dataframe(pd.DataFrame(data))
-            else:
+        if kind:
+            tickers = st.session_state.tickers[kind]
+            if tickers:
+                render_func = {
+                    "stocks": render_dataframe,
+                    "etfs": render_etf_dataframe,
+                    "crypto": render_crypto_dataframe
+                }[kind]
+                st.fragment(live_asset_table, run_every=refresh_every)(kind, tickers, render_func)
+            elif kind == "stocks":
+                st.info("Añade acciones para comenzar.")
+            elif kind == "etfs":
                 st.info("Añade ETFs en la sección de herramientas.")
-
-        with tab_crypto:
-             if st.session_state.tickers["crypto"]:
-                with st.spinner("Cargando Cripto..."):
-                    data = fetch_concurrently(st.session_state.tickers["crypto"], get_crypto_data)
-                if data:
-                    render_crypto_dataframe(pd.DataFrame(data))
-             else:
+            else:
                 st.info("Añade Cripto en la sección de herramientas.")
 
     elif nav_selection == "Análisis de Mercado":
         st.title("Análisis Financerio")
         st.markdown("### 💎 Oportunidades (Value Investing)")
         if st.session_state.tickers["stocks"]:
-            data = fetch_concurrently(st.session_state.tickers["stocks"], get_stock_data)
+            # Reuses the rows the dashboard already loaded in this session
+            data = load_rows("stocks", st.session_state.tickers["stocks"])
             if data:
                 df = pd.DataFrame(data)
                 if 'Estado' in df.columns:
@@ -168,6 +348,59 @@ def main():
             else:
                 st.info("No hay datos disponibles para analizar.")
         
+        st.markdown("---")
+        st.markdown("### 🔎 Screener de Valor")
+        c1, c2 = st.columns([3, 1])
+        with c1:
+            universe = st.selectbox("Universo", SCREENER_UNIVERSES, key="screener_universe")
+            custom = ""
+            if universe == "Lista personalizada":
+                custom = st.text_area("Tickers (separados por comas o espacios)", key="screener_custom")
+        with c2:
+            run = st.button("Ejecutar Screener")
+        if run:
+            if universe == "Mi lista":
+                universe_tickers = list(st.session_state.tickers["stocks"])
+            elif universe == "Lista personalizada":
+                universe_tickers = parse_tickers(custom)
+            else:
+                universe_tickers = None  # Index constituents, loaded where the screener runs
+            if universe_tickers is None or universe_tickers:
+                st.session_state.screener_request = (universe, universe_tickers)
+
+        request = st.session_state.get("screener_request")
+        if request:
+            try:
+                with st.spinner(f"Analizando {request[0]}..."):
+                    results = load_screener(*request)
+            except Exception as e:
+                st.error(f"No se pudo ejecutar el screener sobre {request[0]}: {e}")
+                st.session_state.screener_request = None
+            else:
+                if results is None:
+                    st.info("El demonio de datos está analizando el universo; los resultados aparecerán en unos segundos.")
+                    st.fragment(screener_poll, run_every=SCREENER_POLL)()
+                else:
+                    st.session_state.screener_results = results
+                    st.session_state.screener_request = None
+
+        results = st.session_state.get("screener_results")
+        if results is not None and len(results):
+            f1, f2, f3 = st.columns(3)
+            with f1:
+                min_potential = st.slider("Potencial mínimo (%)", -100, 200, 0, key="screener_potential")
+            with f2:
+                max_pe = st.number_input("P/E máximo (0 = sin límite)", min_value=0.0, value=0.0, key="screener_pe")
+            with f3:
+                signals = st.multiselect(
+                    "Señal técnica",
+                    ["Compra Fuerte", "Compra", "Neutral", "Venta", "Venta Fuerte"],
+                    key="screener_signals"
+                )
+            screened = filter_results(results, min_potential / 100, max_pe or None, signals)
+            st.caption(f"{len(screened)} de {len(results)} acciones")
+            render_dataframe(screened)
+
         st.markdown("---")
         st.markdown("### 📊 Comparativa de Rendimiento (Sparklines Próximamente)")
         st.info("Métricas técnicas detalladas se añadirán en la próxima actualización.")
@@ -175,7 +408,7 @@ def main():
     elif nav_selection == "Calendario Económico":
         st.title("Calendario Económico")
         st.markdown("Eventos clave que mueven el mercado hoy.")
-        cal_df = get_economic_calendar()
+        cal_df = load_economic_calendar()
         
         # Display as a clean table with highlighting
         def style_importance(val):
@@ -206,5 +439,12 @@ def main():
         elif tool_type == "Calculadora Hipoteca":
             render_mortgage_tool()
 
+    elif nav_selection == "Métricas":
+        render_metrics_page()
+
+    elif nav_selection == "Trazas":
+        render_traces_page()
+
 if __name__ == "__main__":
-    main()
+    with tracing.trace("rerun", enabled=tracing_enabled()):
+        main()
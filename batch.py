@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import argparse
+
+import pandas as pd
+
+from data_provider import fetch_rows, get_stock_fundamentals
+from history_provider import load_watchlist_history
+from technical_provider import calculate_technical_summaries
+from screener import parse_tickers
+from watchlist import load_tickers
+
+def read_tickers(path):
+    """Stocks from a tickers.json-style watchlist, or any text file of tickers."""
+    with open(path) as f:
+        text = f.read()
+    if path.endswith(".json"):
+        data = json.loads(text)
+        return list(dict.fromkeys(data["stocks"] if isinstance(data, dict) else data))
+    return parse_tickers(text)
+
+KEEP_HOURS = 26  # A nightly run's entries last until the next one, with some slack
+
+def run_batch(tickers, keep_hours=KEEP_HOURS):
+    """
+    Runs the stocks-tab pipeline (price history, technicals, fundamentals,
+    fair value and quotes) without Streamlit. The computed fundamentals stay
+    in the shared cache for keep_hours, so the dashboard serves them (stale,
+    with fresh quotes) until the next run. Returns (rows, timings).
+    """
+    timings = {"tickers": len(tickers)}
+    started = time.perf_counter()
+
+    phase = time.perf_counter()
+    load_watchlist_history(tickers)
+    timings["history_seconds"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    calculate_technical_summaries(tickers)
+    timings["technicals_seconds"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    rows = fetch_rows("stocks", tickers)
+    for ticker in tickers:
+        get_stock_fundamentals.keep(keep_hours * 3600, ticker)
+    timings["rows_seconds"] = time.perf_counter() - phase
+
+    timings["rows"] = len(rows)
+    timings["total_seconds"] = time.perf_counter() - started
+    return rows, timings
+
+def write_results(rows, output):
+    """Writes the rows to Parquet or CSV, chosen by the file extension."""
+    df = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    if output.endswith(".parquet"):
+        df.to_parquet(output, index=False)
+    else:
+        df.to_csv(output, index=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precomputes stock valuations without Streamlit")
+    parser.add_argument("tickers_file", nargs="?",
+                        help="tickers.json-style watchlist or a text file of tickers (default: the app's watchlist)")
+    parser.add_argument("-o", "--output", default="data/valuations.parquet",
+                        help="Output file; .parquet or .csv (default: data/valuations.parquet)")
+    parser.add_argument("--keep-hours", type=float, default=KEEP_HOURS,
+                        help=f"Hours the dashboard may serve this run's cached rows (default: {KEEP_HOURS})")
+    args = parser.parse_args(argv)
+
+    tickers = read_tickers(args.tickers_file) if args.tickers_file else load_tickers()["stocks"]
+    rows, timings = run_batch(tickers, args.keep_hours)
+    write_results(rows, args.output)
+
+    timings_path = os.path.splitext(args.output)[0] + ".timings.json"
+    timings["finished_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with open(timings_path, "w") as f:
+        json.dump(timings, f, indent=2)
+    print(f"{timings['rows']}/{timings['tickers']} tickers in {timings['total_seconds']:.1f}s -> {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from data_source import DataSource
+
+HISTORY_BARS = 1260  # ~5 years of daily bars
+CALENDAR_EVENTS = 500
+
+def _rng(*parts):
+    return np.random.default_rng(zlib.crc32(":".join(map(str, parts)).encode()))
+
+class SyntheticSource(DataSource):
+    """
+    Deterministic stand-in for Yahoo Finance: every ticker gets the same
+    shaped payloads on every run. The benchmarks record it once and measure
+    against the replayed fixtures.
+    """
+
+    def __init__(self, end="2025-06-30"):
+        self.dates = pd.bdate_range(end=end, periods=HISTORY_BARS)
+
+    def _closes(self, ticker):
+        rng = _rng("close", ticker)
+        return 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(self.dates))))
+
+    def info(self, ticker):
+        rng = _rng("info", ticker)
+        price = float(self._closes(ticker)[-1])
+        eps = float(rng.uniform(0.5, 10))
+        return {
+            "shortName": f"{ticker} Corp",
+            "currentPrice": price,
+            "regularMarketPrice": price,
+            "navPrice": price,
+            "trailingEps": eps,
+            "trailingPE": price / eps,
+            "pegRatio": float(rng.uniform(0.5, 3)),
+            "targetMeanPrice": price * float(rng.uniform(0.8, 1.4)),
+            "marketCap": price * 1e9,
+            "enterpriseValue": price * 1.1e9,
+            "dividendYield": float(rng.uniform(0, 0.04)),
+            "priceToBook": float(rng.uniform(1, 10)),
+            "priceToSalesTrailing12Months": float(rng.uniform(1, 10)),
+            "debtToEquity": float(rng.uniform(0, 2)),
+            "fiftyTwoWeekHigh": price * float(rng.uniform(1, 1.5)),
+            "fiftyDayAverage": price * float(rng.uniform(0.9, 1.1)),
+            "twoHundredDayAverage": price * float(rng.uniform(0.8, 1.2)),
+            "mostRecentQuarter": 1735603200,
+            "earningsTimestamp": 4102444800  # Far future: fundamentals never expire mid-run
+        }
+
+    def financials(self, ticker):
+        rng = _rng("financials", ticker)
+        report_dates = pd.to_datetime(["2024-12-31", "2023-12-31", "2022-12-31", "2021-12-31"])
+        return pd.DataFrame([rng.uniform(0.5, 10, len(report_dates))], index=["Basic EPS"], columns=report_dates)
+
+    def quote(self, ticker):
+        closes = self._closes(ticker)
+        return float(closes[-1]), float(closes[-2])
+
+    def _bars(self, ticker):
+        closes = self._closes(ticker)
+        volume = _rng("volume", ticker).uniform(1e5, 1e7, len(closes))
+        return pd.DataFrame({
+            "Open": closes, "High": closes * 1.01, "Low": closes * 0.99, "Close": closes, "Volume": volume
+        }, index=self.dates)
+
+    def history(self, ticker, **window):
+        return self._bars(ticker)
+
+    def download(self, tickers, **window):
+        return pd.concat({t: self._bars(t) for t in tickers}, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+    def economic_calendar(self, start, end):
+        rng = _rng("calendar", start)
+        impacts = np.array(["low", "medium", "high"])
+        return pd.DataFrame({
+            "Start": [f"03/03/2026 {h:02d}:{m:02d}:00" for h, m in zip(rng.integers(0, 24, CALENDAR_EVENTS), rng.integers(0, 60, CALENDAR_EVENTS))],
+            "Currency": rng.choice(["USD", "EUR", "JPY", "GBP"], CALENDAR_EVENTS),
+            "Name": [f"Event {i}" for i in range(CALENDAR_EVENTS)],
+            "Impact": impacts[rng.integers(0, 3, CALENDAR_EVENTS)],
+            "actual": rng.normal(0, 1, CALENDAR_EVENTS).round(2),
+            "consensus": rng.normal(0, 1, CALENDAR_EVENTS).round(2),
+            "previous": [None] * CALENDAR_EVENTS
+        })
@@ -0,0 +1,242 @@
+"""
+Concurrent-session load test: drives N simulated users through app.py with
+Streamlit's AppTest against a synthetic, latency-injected data source, and
+reports rerun latency percentiles, upstream calls per session and peak RSS.
+
+    python benchmarks/loadtest.py --sessions 1 5 10 20 --latency 0.2
+
+The sessions of a level run on threads of one process, as the sessions of
+one Streamlit server do: they compete for the same thread pools, token
+bucket, single-flight and memory, so the numbers are per-server capacity.
+Every level starts in a fresh process with a cold cache and empty stores.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import functools
+import contextlib
+import resource
+import tempfile
+import threading
+import traceback
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# The cache a deployment shares between its worker processes
+os.environ.setdefault("CACHE_BACKEND", "sqlite")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run import ROOT, tickers, write_report
+from benchmarks.fixtures import SyntheticSource
+
+import cache_backend
+import data_source
+import watchlist
+
+APP_PATH = os.path.join(ROOT, "app.py")
+RERUN_TIMEOUT = 120  # Seconds one scripted rerun may take before the session counts as failed
+STORE_FILES = {
+    "CACHE_PATH": "cache.db",
+    "PRICE_STORE_PATH": "prices.db",
+    "PANEL_PATH": "panel.json",
+    "FUNDAMENTALS_STORE_PATH": "fundamentals.db"
+}
+
+class LatencySource:
+    """Wraps a data source, sleeping `latency` seconds per request and counting requests by method."""
+
+    def __init__(self, inner, latency=0.0):
+        self.inner = inner
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        method = getattr(self.inner, name)
+
+        @functools.wraps(method)
+        def delayed(*args, **kwargs):
+            with self._lock:
+                self.calls[name] += 1
+            if self.latency:
+                time.sleep(self.latency)
+            return method(*args, **kwargs)
+        return delayed
+
+def run_session(at):
+    """One user: opens the dashboard, switches to ETFs, opens the analysis page and goes back."""
+    latencies = []
+
+    def rerun(step=None):
+        if step:
+            step(at)
+        started = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - started)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    rerun()
+    rerun(lambda at: at.button_group(key="asset_view").set_value("📊 ETFs"))
+    rerun(lambda at: at.sidebar.radio[0].set_value("Análisis de Mercado"))
+    rerun(lambda at: at.sidebar.radio[0].set_value("Dashboard Principal"))
+    return latencies
+
+def _share_runtime():
+    """
+    AppTest assumes one script run per process: every run installs its own
+    mock Runtime, config override and script cache, and removes them when it
+    finishes, under any other session's feet. Installs one of each for the
+    whole process instead, as a Streamlit server has, and makes AppTest's
+    per-run copies inert, so sessions can run on threads. Returns the
+    config override to keep open while the sessions run.
+    """
+    from unittest.mock import MagicMock
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test, util
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = app_test.MediaFileManager(app_test.MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = app_test.DataframeSourceManager()
+    runtime.cache_storage_manager = app_test.MemoryCacheStorageManager()
+    components = app_test.BidiComponentManager()
+    components.discover_and_register_components(start_file_watching=False)
+    runtime.bidi_component_registry = components
+    Runtime._instance = runtime
+
+    class PerRunRuntime(Runtime):
+        """Receives (and drops) the runtime each AppTest run installs and removes."""
+
+    # Compiling the script once also keeps threads from parsing it concurrently
+    script_cache = app_test.ScriptCache()
+    app_test.Runtime = PerRunRuntime
+    app_test.ScriptCache = lambda: script_cache
+    app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+    return util.patch_config_options({"global.appTest": True})
+
+def _run_sessions(n_sessions, tickers_file, latency):
+    """Level process entry point: runs n_sessions sessions on threads, started together."""
+    from streamlit.testing.v1 import AppTest
+
+    # AppTest resets Streamlit's log levels on every run; these notices would repeat for every rerun
+    for name in ("streamlit.deprecation_util", "streamlit.runtime.scriptrunner_utils.script_run_context"):
+        logging.getLogger(name).disabled = True
+    watchlist.TICKERS_FILE = tickers_file
+    source = LatencySource(SyntheticSource(), latency)
+    data_source.set_source(source)
+
+    sessions = [{"latencies": [], "error": None} for _ in range(n_sessions)]
+    start = threading.Barrier(n_sessions + 1)
+
+    def session(result):
+        at = AppTest.from_file(APP_PATH, default_timeout=RERUN_TIMEOUT)
+        start.wait()
+        try:
+            result["latencies"] = run_session(at)
+        except Exception:
+            result["error"] = traceback.format_exc()
+
+    with _share_runtime():
+        threads = [threading.Thread(target=session, args=(s,), name=f"session-{i}") for i, s in enumerate(sessions)]
+        for thread in threads:
+            thread.start()
+        # ru_maxrss is in KiB on Linux
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    return {
+        "sessions": sessions,
+        "elapsed": elapsed,
+        "upstream_calls": dict(source.calls),
+        "cache": cache_backend.cache_stats(),
+        "baseline_rss_mb": baseline,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+def summarize(sessions, elapsed, upstream_calls=None, cache=None, peak_rss_mb=None, baseline_rss_mb=None):
+    """
+    Rerun latency percentiles, upstream calls per session and memory for one
+    concurrency level. Upstream calls, cache statistics and RSS are those of
+    the one process every session of the level ran in.
+    """
+    latencies = [t for s in sessions for t in s["latencies"]]
+    upstream = Counter(upstream_calls or {})
+    p50, p95, p99 = (float(p) for p in np.percentile(latencies, [50, 95, 99])) if latencies else (None,) * 3
+    per_session = None
+    if sessions and peak_rss_mb is not None and baseline_rss_mb is not None:
+        per_session = (peak_rss_mb - baseline_rss_mb) / len(sessions)
+    return {
+        "sessions": len(sessions),
+        "failed_sessions": sum(1 for s in sessions if s["error"]),
+        "reruns": len(latencies),
+        "p50_s": p50,
+        "p95_s": p95,
+        "p99_s": p99,
+        "max_s": max(latencies) if latencies else None,
+        "upstream_calls": dict(upstream),
+        "upstream_calls_per_session": sum(upstream.values()) / len(sessions) if sessions else 0.0,
+        "cache": cache or {},
+        "peak_rss_mb": peak_rss_mb,
+        "rss_per_session_mb": per_session,
+        "elapsed_s": elapsed
+    }
+
+def run_level(n_sessions, tickers_file, latency):
+    """Runs n_sessions concurrent sessions in a fresh process, against a cold cache and empty stores."""
+    directory = tempfile.mkdtemp(prefix=f"investing-load-{n_sessions}-")
+    for variable, name in STORE_FILES.items():
+        os.environ[variable] = os.path.join(directory, name)
+
+    # Spawned: the level must not inherit this process's imported modules and their state
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        level = executor.submit(_run_sessions, n_sessions, tickers_file, latency).result()
+    for session in level["sessions"]:
+        if session["error"]:
+            print(session["error"], file=sys.stderr)
+    return summarize(
+        level["sessions"], level["elapsed"], level["upstream_calls"], level["cache"],
+        level["peak_rss_mb"], level["baseline_rss_mb"]
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test of the Streamlit app")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 10, 20],
+                        help="Concurrent session counts to run, one level after another")
+    parser.add_argument("--tickers", type=int, default=10, help="Stocks (and half as many ETFs) on the watchlist")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated upstream latency per request (s)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<time>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    tickers_file = os.path.join(tempfile.mkdtemp(prefix="investing-load-"), "tickers.json")
+    watchlist.TICKERS_FILE = tickers_file
+    watchlist.save_tickers({
+        "stocks": tickers(args.tickers),
+        "etfs": [f"E{i:03d}" for i in range(max(1, args.tickers // 2))],
+        "crypto": []
+    })
+
+    results = {}
+    for n_sessions in args.sessions:
+        level = run_level(n_sessions, tickers_file, args.latency)
+        results[f"sessions[{n_sessions}]"] = level
+        seconds = lambda key: "-" if level[key] is None else f"{level[key]:.3f}s"
+        print(f"{n_sessions:4} sessions  p50 {seconds('p50_s')}  p95 {seconds('p95_s')}  p99 {seconds('p99_s')}  "
+              f"upstream/session {level['upstream_calls_per_session']:.1f}  "
+              f"failed {level['failed_sessions']}  peak RSS {level['peak_rss_mb']:.0f} MB "
+              f"(+{level['rss_per_session_mb']:.1f} MB/session)")
+
+    output = write_report(results, args.output, kind="loadtest", tickers=args.tickers, latency=args.latency)
+    print(f"Results written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+"""
+Benchmarks for the provider and valuation hot paths, measured against
+replayed fixtures. Results go to benchmarks/results/ as JSON so runs can be
+compared across commits:
+
+    python benchmarks/run.py
+    python benchmarks/run.py --compare benchmarks/results/<base>.json benchmarks/results/<new>.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Upstream is simulated: keep the production rate limit from pacing the replay
+os.environ.setdefault("UPSTREAM_RATE", "1000000")
+os.environ.setdefault("UPSTREAM_BURST", "1000000")
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("BACKGROUND_REFRESH", "0")
+
+import cache_backend
+import data_source
+import history_provider
+import fundamentals_provider
+import technical_provider
+from data_provider import get_stock_data, get_etf_data, fetch_concurrently
+from economics_provider import get_economic_calendar
+from valuation import get_historical_pe
+from price_store import PriceStore
+from panel_store import PanelStore
+from fundamentals_store import FundamentalsStore
+from benchmarks.fixtures import SyntheticSource, CALENDAR_EVENTS
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+THROUGHPUT_SIZES = (10, 100, 1000)
+
+class Workspace:
+    """Temporary stores and fixtures; every round starts with cold caches and empty stores."""
+
+    def __init__(self, latency=0.0):
+        self.dir = tempfile.mkdtemp(prefix="investing-bench-")
+        self.fixtures = os.path.join(self.dir, "fixtures")
+        self.latency = latency
+        self._round = 0
+
+    def reset(self):
+        self._round += 1
+        base = os.path.join(self.dir, f"round-{self._round}")
+        os.makedirs(base)
+        history_provider._price_store = PriceStore(os.path.join(base, "prices.db"))
+        history_provider._panel = PanelStore(os.path.join(base, "panel.json"))
+        fundamentals_provider._store = FundamentalsStore(os.path.join(base, "fundamentals.db"))
+        technical_provider._watchlist_signals.clear()
+        technical_provider._live_technicals.clear()
+        cache_backend.set_backend(cache_backend.MemoryCache())
+
+    def record(self):
+        data_source.set_source(data_source.RecordingSource(SyntheticSource(), self.fixtures))
+
+    def replay(self):
+        data_source.set_source(data_source.ReplaySource(self.fixtures, latency=self.latency))
+
+def measure(workspace, run, items, rounds, setup=None):
+    """
+    Times run() over `rounds` rounds of `items` items each. A first, untimed
+    round records the fixtures that the timed rounds replay.
+    """
+    samples = []
+    for i in range(rounds + 1):
+        workspace.reset()
+        workspace.record() if i == 0 else workspace.replay()
+        if setup:
+            setup()
+        started = time.perf_counter()
+        run()
+        if i:
+            samples.append(time.perf_counter() - started)
+    median = statistics.median(samples)
+    return {
+        "rounds": rounds,
+        "items": items,
+        "min_s": min(samples),
+        "median_s": median,
+        "mean_s": statistics.fmean(samples),
+        "stdev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "per_item_s": median / items,
+        "items_per_s": items / median if median else None
+    }
+
+def tickers(n):
+    return [f"T{i:04d}" for i in range(n)]
+
+def run_suite(n_tickers=100, sizes=THROUGHPUT_SIZES, rounds=5, latency=0.0):
+    workspace = Workspace(latency)
+    universe = tickers(n_tickers)
+    load_universe = lambda: history_provider.load_watchlist_history(universe)
+    results = {}
+
+    def prepare_stocks():
+        load_universe()
+        technical_provider.calculate_technical_summaries(universe)
+
+    results["get_stock_data"] = measure(
+        workspace, lambda: [get_stock_data(t) for t in universe], len(universe), rounds, prepare_stocks
+    )
+    for size in sizes:
+        results[f"fetch_concurrently[{size}]"] = measure(
+            workspace, lambda: fetch_concurrently(tickers(size), get_etf_data), size, rounds
+        )
+    results["calculate_technical_summary"] = measure(
+        workspace, lambda: [technical_provider.calculate_technical_summary(t) for t in universe],
+        len(universe), rounds, load_universe
+    )
+    results["calculate_technical_summaries"] = measure(
+        workspace, lambda: technical_provider.calculate_technical_summaries(universe),
+        len(universe), rounds, load_universe
+    )
+    results["get_historical_pe"] = measure(
+        workspace, lambda: [get_historical_pe(t) for t in universe], len(universe), rounds, load_universe
+    )
+    results["get_economic_calendar"] = measure(workspace, get_economic_calendar, CALENDAR_EVENTS, rounds)
+    return results
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def write_report(results, output=None, **settings):
+    commit = _git("rev-parse", "--short", "HEAD")
+    report = {
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "settings": settings,
+        "results": results
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    return output
+
+def compare(base_path, new_path, threshold=0.2):
+    """Prints the median change per benchmark; returns the names slower than threshold."""
+    with open(base_path) as f:
+        base = json.load(f)["results"]
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    regressions = []
+    for name in sorted(set(base) & set(new)):
+        change = new[name]["median_s"] / base[name]["median_s"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  <-- slower"
+        print(f"{name:36} {base[name]['median_s'] * 1000:10.2f} ms -> {new[name]['median_s'] * 1000:10.2f} ms  {change:+7.1%}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Provider and valuation benchmarks on replayed fixtures")
+    parser.add_argument("--tickers", type=int, default=100, help="Universe size for the per-ticker benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(THROUGHPUT_SIZES),
+                        help="Ticker counts for the fetch_concurrently throughput runs")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated upstream latency per request (s)")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(*args.compare, threshold=args.threshold) else 0
+
+    results = run_suite(args.tickers, args.sizes, args.rounds, args.latency)
+    for name, stats in results.items():
+        print(f"{name:36} median {stats['median_s'] * 1000:10.2f} ms  ({stats['per_item_s'] * 1000:.3f} ms/item)")
+    output = write_report(results, args.output, tickers=args.tickers, sizes=args.sizes,
+                          rounds=args.rounds, latency=args.latency)
+    print(f"Results written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
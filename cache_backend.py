@@ -0,0 +1,300 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+import functools
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from singleflight import SingleFlight
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache.db")
+
+class CacheBackend:
+    """
+    Key/value store with per-entry TTL shared by the provider functions.
+    get() returns (hit, value) so that cached None results still count as hits.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix):
+        raise NotImplementedError
+
+class MemoryCache(CacheBackend):
+    """In-process cache; what st.cache_data gave us, without Streamlit."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return False, None
+            return True, value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+class SQLiteCache(CacheBackend):
+    """
+    Disk cache shared by every worker process on the host (default backend).
+    """
+
+    PURGE_EVERY = 200  # Writes between sweeps of expired rows
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("CACHE_PATH", DEFAULT_CACHE_PATH)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return False, None
+        return True, pickle.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, sqlite3.Binary(pickle.dumps(value)), now + ttl)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+
+    def delete_prefix(self, prefix):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+class RedisCache(CacheBackend):
+    """
+    Cache on any Redis-protocol server (Redis, KeyDB, a local stand-in...),
+    shared by replicas on different hosts. Needs the optional `redis` package
+    unless a client is passed in.
+    """
+
+    def __init__(self, url=None, client=None, namespace="investing:"):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url or os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+        self.client = client
+        self.namespace = namespace
+
+    def get(self, key):
+        blob = self.client.get(self.namespace + key)
+        if blob is None:
+            return False, None
+        return True, pickle.loads(blob)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.namespace + key, pickle.dumps(value), px=max(int(ttl * 1000), 1))
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.namespace + prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+_backend = None
+_backend_lock = threading.Lock()
+_stats = {}
+_stats_lock = threading.Lock()
+# Concurrent misses on the same key share one upstream call
+_flights = SingleFlight()
+# Background revalidation of stale entries
+_refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def _create_backend():
+    kind = os.environ.get("CACHE_BACKEND", "sqlite").lower()
+    if kind == "memory":
+        return MemoryCache()
+    if kind == "redis":
+        return RedisCache()
+    return SQLiteCache()
+
+def get_backend():
+    """Returns the process-wide backend chosen by CACHE_BACKEND (sqlite, memory or redis)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+    return _backend
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+def _record(name, outcome):
+    with _stats_lock:
+        counts = _stats.setdefault(name, {"hits": 0, "misses": 0, "coalesced": 0, "stale": 0, "errors": 0})
+        counts[outcome] += 1
+
+def cache_stats():
+    """Returns {function name: {'hits', 'misses', 'coalesced', 'stale', 'errors'}} for this process."""
+    with _stats_lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+def make_key(name, args, kwargs):
+    raw = repr((args, sorted(kwargs.items())))
+    return f"{name}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+def shared_cache(ttl, stale_ttl=0, name=None):
+    """
+    Drop-in replacement for st.cache_data(ttl=...) backed by the shared backend.
+    Concurrent misses for the same arguments are coalesced into a single call
+    of the function. With stale_ttl, entries older than ttl are still served for
+    up to stale_ttl more seconds while a background thread revalidates them.
+    Backend failures degrade to calling the function directly.
+    """
+    def decorator(func):
+        cache_name = name or func.__name__
+
+        def read(backend, key):
+            """Returns (hit, stored_at, value)."""
+            try:
+                hit, entry = backend.get(key)
+            except Exception as e:
+                print(f"Cache read error for {cache_name}: {e}")
+                _record(cache_name, "errors")
+                return False, None, None
+            if not hit:
+                return False, None, None
+            stored_at, value = entry
+            return True, stored_at, value
+
+        def compute(backend, key, args, kwargs):
+            value = func(*args, **kwargs)
+            try:
+                backend.set(key, (time.time(), value), ttl + stale_ttl)
+            except Exception as e:
+                print(f"Cache write error for {cache_name}: {e}")
+                _record(cache_name, "errors")
+            return value
+
+        def load(backend, key, args, kwargs):
+            # Another caller may have filled the entry while we queued for the flight
+            hit, stored_at, value = read(backend, key)
+            if hit and time.time() - stored_at < ttl:
+                return value
+            return compute(backend, key, args, kwargs)
+
+        def revalidate(backend, key, args, kwargs):
+            with _refreshing_lock:
+                if key in _refreshing:
+                    return
+                _refreshing.add(key)
+
+            def run():
+                try:
+                    _flights.do(key, compute, backend, key, args, kwargs)
+                except Exception as e:
+                    print(f"Background refresh error for {cache_name}: {e}")
+                    _record(cache_name, "errors")
+                finally:
+                    with _refreshing_lock:
+                        _refreshing.discard(key)
+
+            _refresh_pool.submit(run)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(cache_name, args, kwargs)
+            backend = get_backend()
+            hit, stored_at, value = read(backend, key)
+            if hit:
+                if time.time() - stored_at < ttl:
+                    _record(cache_name, "hits")
+                    return value
+                if stale_ttl:
+                    _record(cache_name, "stale")
+                    revalidate(backend, key, args, kwargs)
+                    return value
+
+            value, shared = _flights.do(key, load, backend, key, args, kwargs)
+            _record(cache_name, "coalesced" if shared else "misses")
+            return value
+
+        def refresh(*args, **kwargs):
+            """Recomputes and stores the entry now, regardless of its age."""
+            key = make_key(cache_name, args, kwargs)
+            value, _ = _flights.do(key, compute, get_backend(), key, args, kwargs)
+            return value
+
+        def keep(seconds, *args, **kwargs):
+            """
+            Keeps the cached entry for another `seconds` (e.g. until the next
+            batch run) without changing its age, so once past ttl it is served
+            stale while being revalidated. Returns False when not cached.
+            """
+            backend = get_backend()
+            key = make_key(cache_name, args, kwargs)
+            hit, stored_at, value = read(backend, key)
+            if not hit:
+                return False
+            try:
+                backend.set(key, (stored_at, value), seconds)
+            except Exception as e:
+                print(f"Cache write error for {cache_name}: {e}")
+                _record(cache_name, "errors")
+                return False
+            return True
+
+        def age(*args, **kwargs):
+            """Seconds since the entry was stored, or None when not cached."""
+            hit, stored_at, _ = read(get_backend(), make_key(cache_name, args, kwargs))
+            return time.time() - stored_at if hit else None
+
+        wrapper.clear = lambda: get_backend().delete_prefix(cache_name + ":")
+        wrapper.refresh = refresh
+        wrapper.keep = keep
+        wrapper.age = age
+        wrapper.cache_name = cache_name
+        wrapper.ttl = ttl
+        wrapper.stale_ttl = stale_ttl
+        return wrapper
+    return decorator
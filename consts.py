@@ -144,3 +144,16 @@ COMMON_CRYPTO = [
     "Uniswap (UNI-USD)",
     "Near Protocol (NEAR-USD)"
 ]
+
+# Símbolos de la cinta de cotizaciones (índices, materias primas, cripto, divisas).
+# Se descargan en una sola petición, así que la lista puede crecer (~50) sin
+# aumentar la latencia. Las 4 primeras se muestran también como tarjetas.
+MARKET_SUMMARY_TICKERS = {
+    "^GSPC": "S&P 500",
+    "^IXIC": "NASDAQ",
+    "^DJI": "Dow Jones",
+    "GC=F": "Gold",
+    "CL=F": "Crude Oil",
+    "BTC-USD": "Bitcoin",
+    "EURUSD=X": "EUR/USD"
+}
@@ -1,15 +1,89 @@
-import yfinance as yf
-import streamlit as st
-from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+import threading
+import functools
+from numbers import Number
+from multiprocessing.connection import Client
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+from cache_backend import shared_cache
+from data_source import get_source
+from metrics import instrumented, record_error, pool_wait, pool_run, fetch_misses
+from tracing import span, current_span
+from rate_limiter import call_upstream, upstream_concurrency, UpstreamThrottled
 from valuation import calculate_composite_fair_value
+from fundamentals_provider import get_fundamentals
 
-from technical_provider import calculate_technical_summary
+from technical_provider import calculate_technical_summary, live_technical_summary
 
-@st.cache_data(ttl=900)  # 15 min cache
-def get_stock_data(ticker_symbol):
+TICKER_TIMEOUT = 15  # Seconds a single ticker may run before it is shown as pending
+RENDER_BUDGET = 20  # Seconds a table render waits for rows in total
+MISSING_SHOWN = 10  # Tickers named in the "No data" line; the rest are only counted
+
+QUOTE_TTL = 5  # Seconds; the fast tier only carries price and change
+QUOTE_STALE_TTL = 300  # Tables keep their last quotes while the next batch downloads
+
+DEFAULT_DAEMON_ADDRESS = ("localhost", 6001)
+PENDING_STATUS = "Pendiente"  # Estado of a row that isn't available yet
+
+# Fields that scale linearly with price, and the one that scales inversely
+PRICE_LINEAR_FIELDS = ("Market Cap", "P/E", "P/B", "P/S (TTM)")
+
+def _is_number(value):
+    return isinstance(value, Number) and not isinstance(value, bool) and value == value
+
+def quote_key(tickers):
+    """Cache key of a table's quotes, so the same set of tickers shares one download."""
+    return tuple(sorted(set(tickers)))
+
+@shared_cache(ttl=QUOTE_TTL, stale_ttl=QUOTE_STALE_TTL)
+@instrumented
+def fetch_quotes(tickers):
+    """
+    Fast tier for a whole table: last price, change vs previous close and the
+    market date of the last bar, from one batched daily download (as the
+    ticker tape does). Call it with quote_key(tickers). Returns
+    {ticker: quote}; tickers without a numeric price are left out.
+    """
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        info = ticker.info
+        panel = call_upstream(get_source().download, list(tickers), period="5d")
+    except UpstreamThrottled:
+        raise  # Don't cache a throttled fetch as an empty table
+    except Exception as e:
+        print(f"Error fetching quotes: {e}")
+        record_error("fetch_quotes", e)
+        return {}
+    if panel is None or panel.empty:
+        return {}
+
+    quotes = {}
+    closes = panel["Close"]
+    for ticker in tickers:
+        if ticker not in closes.columns:
+            continue
+        series = closes[ticker].dropna()
+        if not len(series) or series.iloc[-1] <= 0:
+            continue
+        price = float(series.iloc[-1])
+        previous_close = float(series.iloc[-2]) if len(series) >= 2 else None
+        quotes[ticker] = {
+            "price": price,
+            "previous_close": previous_close,
+            "change_pct": (price - previous_close) / previous_close if previous_close else None,
+            "date": pd.Timestamp(series.index[-1]).tz_localize(None).normalize()
+        }
+    return quotes
+
+@shared_cache(ttl=900, stale_ttl=3600)  # 15 min cache, stale served while refreshing
+def get_stock_fundamentals(ticker_symbol):
+    """
+    Slow tier of a stock row: fundamentals (statements from the
+    earnings-driven store, market and analyst fields refetched on a short
+    TTL), fair value and technical signal. Price-dependent fields are relative to
+    "Precio Ref", the price they were computed at.
+    """
+    try:
+        info = get_fundamentals(ticker_symbol)
         
         current_price = info.get('currentPrice') or info.get('regularMarketPrice')
         if not current_price:
@@ -21,26 +95,11 @@ def get_stock_data(ticker_symbol):
         # Calculate Technical Summary
         technical_summary = calculate_technical_summary(ticker_symbol)
 
-        # Status & Potential
-        if fair_value:
-            potential = ((fair_value - current_price) / current_price)
-            if potential > 0.20:
-                status = "Infravalorada"
-            elif potential < -0.20:
-                status = "Sobrevalorada"
-            else:
-                status = "Precio Justo"
-        else:
-            status = "N/A"
-            potential = None
-
         return {
             "Ticker": ticker_symbol,
             "Nombre": info.get('shortName', ticker_symbol),
-            "Precio Actual": current_price,
+            "Precio Ref": current_price,
             "Valor Justo": fair_value,
-            "Potencial": potential,
-            "Estado": status,
             "Market Cap": info.get('marketCap'),
             "Div Yield": info.get('dividendYield'),
             "P/E": info.get('trailingPE'),
@@ -51,15 +110,86 @@ def get_stock_data(ticker_symbol):
             "Técnico": technical_summary,
             "Modelos": model_details
         }
+    except UpstreamThrottled:
+        raise  # Don't cache a throttled fetch as a missing row
     except Exception as e:
         print(f"Error fetching data for {ticker_symbol}: {e}")
+        record_error("get_stock_fundamentals", e)
         return None
 
-@st.cache_data(ttl=900)
+def valuation_status(fair_value, current_price):
+    """Returns (potential, status) of a price against its fair value."""
+    if not fair_value:
+        return None, "N/A"
+    potential = ((fair_value - current_price) / current_price)
+    if potential > 0.20:
+        status = "Infravalorada"
+    elif potential < -0.20:
+        status = "Sobrevalorada"
+    else:
+        status = "Precio Justo"
+    return potential, status
+
+def combine_stock_row(fundamentals, quote, live_signal=None):
+    """
+    Recombines the slow tier with a fresh quote: price, change, Potencial and
+    Estado are recomputed against the cached fair value, and price-dependent
+    ratios are rescaled from the reference price.
+    """
+    ref_price = fundamentals["Precio Ref"]
+    current_price = quote["price"] if quote else ref_price
+    potential, status = valuation_status(fundamentals["Valor Justo"], current_price)
+    row = {
+        "Ticker": fundamentals["Ticker"],
+        "Nombre": fundamentals["Nombre"],
+        "Precio Actual": current_price,
+        "Cambio %": quote["change_pct"] if quote else None,
+        "Valor Justo": fundamentals["Valor Justo"],
+        "Potencial": potential,
+        "Estado": status
+    }
+    row.update({k: v for k, v in fundamentals.items() if k not in row and k != "Precio Ref"})
+
+    if quote and _is_number(ref_price) and ref_price > 0:
+        ratio = current_price / ref_price
+        for field in PRICE_LINEAR_FIELDS:
+            if _is_number(row.get(field)):
+                row[field] = row[field] * ratio
+        if _is_number(row.get("EV")) and _is_number(fundamentals.get("Market Cap")):
+            row["EV"] = row["EV"] + row["Market Cap"] - fundamentals["Market Cap"]
+        if _is_number(row.get("Div Yield")):
+            row["Div Yield"] = row["Div Yield"] / ratio
+        if live_signal:
+            row["Técnico"] = live_signal
+    return row
+
+@instrumented
+def get_stock_data(ticker_symbol, quotes=None):
+    """
+    Stock row for the tables: cached slow tier combined with the ticker's
+    quote. `quotes` is the table's fetch_quotes result (see row_function);
+    without it the ticker's quote is fetched on its own.
+    """
+    fundamentals = get_stock_fundamentals(ticker_symbol)
+    if fundamentals is None:
+        return None
+    if quotes is None:
+        quotes = fetch_quotes(quote_key([ticker_symbol]))
+    quote = quotes.get(ticker_symbol)
+    live_signal = None
+    if quote:
+        try:
+            live_signal = live_technical_summary(ticker_symbol, quote["price"], quote["date"])
+        except Exception as e:
+            print(f"Error updating live technicals for {ticker_symbol}: {e}")
+            record_error("live_technical_summary", e)
+    return combine_stock_row(fundamentals, quote, live_signal)
+
+@shared_cache(ttl=900, stale_ttl=3600)
+@instrumented
 def get_etf_data(ticker_symbol):
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        info = ticker.info
+        info = call_upstream(get_source().info, ticker_symbol)
         
         current_price = info.get('currentPrice') or info.get('navPrice') or info.get('regularMarketPrice')
         if not current_price:
@@ -92,15 +222,18 @@ def get_etf_data(ticker_symbol):
             "Categoría": info.get('category'),
             "Activos": info.get('totalAssets')
         }
+    except UpstreamThrottled:
+        raise  # Don't cache a throttled fetch as a missing row
     except Exception as e:
         print(f"Error fetching ETF data for {ticker_symbol}: {e}")
+        record_error("get_etf_data", e)
         return None
 
-@st.cache_data(ttl=300)
+@shared_cache(ttl=300, stale_ttl=3600)
+@instrumented
 def get_crypto_data(ticker_symbol):
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        info = ticker.info
+        info = call_upstream(get_source().info, ticker_symbol)
         
         current_price = info.get('currentPrice') or info.get('regularMarketPrice')
         if not current_price:
@@ -145,14 +278,263 @@ def get_crypto_data(ticker_symbol):
             "MA 50d": ma50,
             "MA 200d": ma200
         }
+    except UpstreamThrottled:
+        raise  # Don't cache a throttled fetch as a missing row
     except Exception as e:
         print(f"Error fetching Crypto data for {ticker_symbol}: {e}")
+        record_error("get_crypto_data", e)
+        return None
+
+def pending_row(ticker):
+    """Placeholder row for a ticker that is still being fetched."""
+    return {"Ticker": ticker, "Nombre": ticker, "Estado": PENDING_STATUS}
+
+def _fetch_or_none(fetch_func, ticker):
+    try:
+        return fetch_func(ticker)
+    except Exception as e:
+        print(f"Error fetching {ticker} with {fetch_func.__name__}: {e}")
         return None
 
-def fetch_concurrently(tickers, fetch_func, max_workers=10):
+def _pooled(fetch_func, ticker, submitted, parent=None):
+    """
+    Runs one pool task, recording how long it queued for a thread and how long
+    it ran. The ticker's span hangs off `parent`, the span that submitted it.
+    """
+    started = time.monotonic()
+    pool_wait.observe(started - submitted, function=fetch_func.__name__)
+    try:
+        with span(ticker, parent=parent, function=fetch_func.__name__, wait_ms=round((started - submitted) * 1000, 1)):
+            return _fetch_or_none(fetch_func, ticker)
+    finally:
+        pool_run.observe(time.monotonic() - started, function=fetch_func.__name__)
+
+def fetch_concurrently(tickers, fetch_func, max_workers=None):
     """
     Fetches data for multiple tickers concurrently using a thread pool.
+    Upstream calls are paced by the shared rate limiter, whose adaptive limit
+    (not the pool size) decides how many requests are actually in flight.
     """
+    max_workers = max_workers or upstream_concurrency.max_limit
+    submitted, parent = time.monotonic(), current_span()
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        results = list(executor.map(fetch_func, tickers))
+        results = list(executor.map(lambda t: _pooled(fetch_func, t, submitted, parent), tickers))
+    missing = [t for t, r in zip(tickers, results) if r is None]
+    if missing:
+        fetch_misses.inc(len(missing), function=fetch_func.__name__)
+        shown = ", ".join(missing[:MISSING_SHOWN])
+        more = f" and {len(missing) - MISSING_SHOWN} more" if len(missing) > MISSING_SHOWN else ""
+        print(f"No data for {len(missing)} tickers: {shown}{more}")
     return [r for r in results if r is not None]
+
+def stream_concurrently(tickers, fetch_func, ticker_timeout=TICKER_TIMEOUT, total_budget=RENDER_BUDGET, max_workers=None):
+    """
+    Fetches tickers concurrently and yields (ticker, result, timed_out) as each
+    one completes, fastest first. Tickers still running after ticker_timeout
+    seconds, or when total_budget runs out, are yielded with timed_out=True;
+    their fetch keeps running in the background and fills the cache.
+    """
+    max_workers = max_workers or upstream_concurrency.max_limit
+    started_at = {}
+    parent = current_span()
+
+    def run(ticker, submitted):
+        started_at[ticker] = time.monotonic()
+        return _pooled(fetch_func, ticker, submitted, parent)
+
+    deadline = time.monotonic() + total_budget
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {executor.submit(run, t, time.monotonic()): t for t in tickers}
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            for future in [f for f in pending if not f.done()]:
+                ticker = futures[future]
+                if ticker in started_at and now - started_at[ticker] >= ticker_timeout:
+                    pending.discard(future)
+                    yield ticker, None, True
+            done, pending = wait(pending, timeout=min(deadline - now, 0.1), return_when=FIRST_COMPLETED)
+            for future in done:
+                yield futures[future], future.result(), False
+        for future in pending:
+            yield futures[future], None, True
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+ROW_FUNCTIONS = {
+    "stocks": get_stock_data,
+    "etfs": get_etf_data,
+    "crypto": get_crypto_data
+}
+
+def row_function(kind, tickers):
+    """
+    Per-ticker row function for a table of `tickers`. Stock rows share the
+    table's quotes, fetched in one batched download before the pool starts.
+    """
+    if kind != "stocks":
+        return ROW_FUNCTIONS[kind]
+    try:
+        quotes = fetch_quotes(quote_key(tickers))
+    except UpstreamThrottled as e:
+        print(f"Error fetching quotes: {e}")
+        quotes = {}  # Rows fall back to the slow tier's reference price
+
+    @functools.wraps(get_stock_data)
+    def table_row(ticker_symbol):
+        return get_stock_data(ticker_symbol, quotes)
+    return table_row
+
+def parse_address(value):
+    """'host:port' -> (host, port); anything else is a Unix socket path."""
+    host, _, port = value.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return value
+
+def daemon_authkey():
+    """Shared key from MARKET_DAEMON_AUTHKEY, or None when it isn't set."""
+    key = os.environ.get("MARKET_DAEMON_AUTHKEY")
+    return key.encode() if key else None
+
+class MarketDaemonClient:
+    """
+    Connections to market_daemon.py. Each request borrows an idle connection
+    (or opens one), so concurrent sessions don't queue behind each other.
+    Calls return None when the daemon can't be reached or doesn't answer in
+    time; sessions then show their data as pending rather than fetching it.
+    """
+
+    RETRY_AFTER = 30  # Seconds to wait before reconnecting after a failure
+    REQUEST_TIMEOUT = 30  # Seconds to wait for a response
+    MAX_IDLE = 8  # Idle connections kept for reuse
+
+    def __init__(self, address, timeout=REQUEST_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+        self._idle = []
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    def _failed(self):
+        with self._lock:
+            self._failed_at = time.monotonic()
+
+    def _connect(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            if self._failed_at and time.monotonic() - self._failed_at < self.RETRY_AFTER:
+                return None
+        authkey = daemon_authkey()
+        if authkey is None:
+            print("Error connecting to market daemon: MARKET_DAEMON_AUTHKEY is not set")
+            self._failed()
+            return None
+        try:
+            return Client(self.address, authkey=authkey)
+        except Exception as e:
+            print(f"Error connecting to market daemon at {self.address}: {e}")
+            self._failed()
+            return None
+
+    def _request(self, *request):
+        conn = self._connect()
+        if conn is None:
+            return None
+        try:
+            conn.send(request)
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"no response within {self.timeout}s")
+            status, payload = conn.recv()
+        except Exception as e:
+            print(f"Error talking to market daemon: {e}")
+            _close_quietly(conn)  # A late response would otherwise answer the next request
+            self._failed()
+            return None
+        with self._lock:
+            if len(self._idle) < self.MAX_IDLE:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            _close_quietly(conn)
+        if status != "ok":
+            print(f"Market daemon error for {request[0]}: {payload}")
+            return None
+        return payload
+
+    def rows(self, kind, tickers):
+        """
+        Returns {ticker: row} from the daemon's snapshot (None for tickers
+        without data), or None. Tickers the daemon hasn't fetched yet are
+        left out; it queues them for its refresh loop.
+        """
+        return self._request("rows", kind, list(tickers))
+
+    def market_summary(self):
+        return self._request("market_summary")
+
+    def economic_calendar(self):
+        return self._request("economic_calendar")
+
+    def screener(self, universe, tickers=None):
+        """
+        ("pending", None), ("done", results) or ("failed", message) for the
+        daemon's screener run over a universe (or explicit tickers), or None.
+        """
+        return self._request("screener", universe, list(tickers) if tickers else None)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            _close_quietly(conn)
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except OSError:
+        pass
+
+_daemon_client = None
+_daemon_lock = threading.Lock()
+
+def get_daemon_client():
+    """Client for the daemon at MARKET_DAEMON_ADDRESS, or None when it isn't configured."""
+    global _daemon_client
+    address = os.environ.get("MARKET_DAEMON_ADDRESS")
+    if not address:
+        return None
+    with _daemon_lock:
+        if _daemon_client is None:
+            _daemon_client = MarketDaemonClient(parse_address(address))
+    return _daemon_client
+
+def stream_rows(kind, tickers):
+    """
+    Yields (ticker, row, timed_out) for a table: from the daemon's snapshot
+    when one is configured, otherwise fetched here with stream_concurrently.
+    With a daemon nothing is fetched here: tickers it doesn't have yet (or
+    all of them, while it can't be reached) come out as timed out.
+    """
+    client = get_daemon_client()
+    if client is None:
+        yield from stream_concurrently(tickers, row_function(kind, tickers))
+        return
+    rows = client.rows(kind, tickers) or {}
+    for ticker in tickers:
+        yield ticker, rows.get(ticker), ticker not in rows
+
+def fetch_rows(kind, tickers):
+    """
+    Like fetch_concurrently, served from the daemon's snapshot when
+    configured; tickers it doesn't have yet get a pending_row.
+    """
+    client = get_daemon_client()
+    if client is None:
+        return fetch_concurrently(tickers, row_function(kind, tickers))
+    rows = client.rows(kind, tickers) or {}
+    return [rows[t] if t in rows else pending_row(t) for t in tickers if rows.get(t) is not None or t not in rows]
@@ -0,0 +1,210 @@
+import os
+import gzip
+import time
+import pickle
+import random
+import hashlib
+import functools
+import threading
+
+import yfinance as yf
+from ecocal import Calendar
+
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fixtures")
+
+class FixtureMissing(LookupError):
+    """Raised by ReplaySource for a request that was never recorded."""
+
+class DataSource:
+    """
+    Every upstream request the providers make. Implementations return the raw
+    upstream objects (info dicts, statements, OHLCV panels), so the providers'
+    processing is the same whatever the source.
+    """
+
+    def info(self, ticker):
+        """ticker.info dict."""
+        raise NotImplementedError
+
+    def financials(self, ticker):
+        """Annual income statement (ticker.financials)."""
+        raise NotImplementedError
+
+    def quote(self, ticker):
+        """(last_price, previous_close) from the cheap fast_info endpoint."""
+        raise NotImplementedError
+
+    def history(self, ticker, **window):
+        """Daily OHLCV with actions for one ticker (period= or start=)."""
+        raise NotImplementedError
+
+    def download(self, tickers, **window):
+        """Wide (field, ticker) daily panel for several tickers in one request."""
+        raise NotImplementedError
+
+    def economic_calendar(self, start, end):
+        """ecocal detailed calendar between two 'YYYY-MM-DD' dates."""
+        raise NotImplementedError
+
+class YFinanceSource(DataSource):
+    """Live Yahoo Finance (and ecocal for the calendar)."""
+
+    def info(self, ticker):
+        return yf.Ticker(ticker).info
+
+    def financials(self, ticker):
+        return yf.Ticker(ticker).financials
+
+    def quote(self, ticker):
+        fast_info = yf.Ticker(ticker).fast_info
+        return fast_info.last_price, fast_info.previous_close
+
+    def history(self, ticker, **window):
+        return yf.Ticker(ticker).history(actions=True, **window)
+
+    def download(self, tickers, **window):
+        return yf.download(
+            list(tickers),
+            group_by="column",
+            auto_adjust=True,
+            threads=True,
+            progress=False,
+            multi_level_index=True,
+            **window
+        )
+
+    def economic_calendar(self, start, end):
+        return Calendar(
+            startHorizon=start,
+            endHorizon=end,
+            withDetails=True,
+            nbThreads=10,
+            withProgressBar=False
+        ).detailedCalendar
+
+SOURCE_METHODS = ("info", "financials", "quote", "history", "download", "economic_calendar")
+
+def fixture_key(method, args, kwargs):
+    raw = repr((method, args, sorted(kwargs.items())))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+class _FixtureFiles:
+    """One gzipped pickle per recorded request, named by its key."""
+
+    def __init__(self, path):
+        self.path = path or os.environ.get("DATA_FIXTURES_DIR", DEFAULT_FIXTURES_DIR)
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ".pkl.gz")
+
+    def read(self, key):
+        try:
+            with gzip.open(self._file(key), "rb") as f:
+                return True, pickle.load(f)
+        except FileNotFoundError:
+            return False, None
+
+    def write(self, key, value):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = f"{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, "wb") as f:
+            pickle.dump(value, f)
+        os.replace(tmp, self._file(key))
+
+def _dispatching(cls):
+    """
+    Routes every DataSource method of cls through its _call(method, args, kwargs).
+    The routed methods keep their names, which label upstream metrics and spans.
+    """
+    def method(name):
+        @functools.wraps(getattr(DataSource, name))
+        def dispatch(self, *args, **kwargs):
+            return self._call(name, args, kwargs)
+        return dispatch
+    for name in SOURCE_METHODS:
+        setattr(cls, name, method(name))
+    return cls
+
+@_dispatching
+class RecordingSource(DataSource):
+    """Passes requests to another source and saves every response as a fixture."""
+
+    def __init__(self, inner=None, path=None):
+        self.inner = inner or YFinanceSource()
+        self.fixtures = _FixtureFiles(path)
+
+    def _call(self, method, args, kwargs):
+        value = getattr(self.inner, method)(*args, **kwargs)
+        try:
+            self.fixtures.write(fixture_key(method, args, kwargs), value)
+        except Exception as e:
+            print(f"Error recording {method} fixture: {e}")
+        return value
+
+@_dispatching
+class ReplaySource(DataSource):
+    """
+    Serves recorded responses, after a simulated latency of `latency` seconds
+    (plus up to `jitter` more), for deterministic offline and benchmark runs.
+    """
+
+    def __init__(self, path=None, latency=0.0, jitter=0.0):
+        self.fixtures = _FixtureFiles(path)
+        self.latency = latency
+        self.jitter = jitter
+
+    def _call(self, method, args, kwargs):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        hit, value = self.fixtures.read(fixture_key(method, args, kwargs))
+        if not hit:
+            raise FixtureMissing(f"No recorded {method}{args}")
+        return value
+
+@_dispatching
+class FallbackSource(DataSource):
+    """Uses `primary` and, when it fails, the `fallback` source (e.g. replayed fixtures)."""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+
+    def _call(self, method, args, kwargs):
+        try:
+            return getattr(self.primary, method)(*args, **kwargs)
+        except Exception as e:
+            try:
+                value = getattr(self.fallback, method)(*args, **kwargs)
+            except FixtureMissing:
+                raise e
+            print(f"Serving {method}{args} from fallback after: {e}")
+            return value
+
+_source = None
+_source_lock = threading.Lock()
+
+def _create_source():
+    kind = os.environ.get("DATA_SOURCE", "yfinance").lower()
+    if kind == "replay":
+        return ReplaySource(
+            latency=float(os.environ.get("REPLAY_LATENCY", 0)),
+            jitter=float(os.environ.get("REPLAY_JITTER", 0))
+        )
+    source = RecordingSource() if kind == "record" else YFinanceSource()
+    if os.environ.get("DATA_FALLBACK", "0") == "1":
+        source = FallbackSource(source, ReplaySource())
+    return source
+
+def get_source():
+    """Returns the process-wide source chosen by DATA_SOURCE (yfinance, record or replay)."""
+    global _source
+    if _source is None:
+        with _source_lock:
+            if _source is None:
+                _source = _create_source()
+    return _source
+
+def set_source(source):
+    global _source
+    _source = source
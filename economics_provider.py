@@ -1,70 +1,89 @@
-import yfinance as yf
-import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from ecocal import Calendar
 
-@st.cache_data(ttl=1800) # 30 min cache
-def get_market_summary():
-    """Fetches major market indices for the ticker tape."""
-    major_tickers = {
-        "^GSPC": "S&P 500",
-        "^IXIC": "NASDAQ",
-        "^DJI": "Dow Jones",
-        "GC=F": "Gold",
-        "CL=F": "Crude Oil",
-        "BTC-USD": "Bitcoin",
-        "EURUSD=X": "EUR/USD"
+import consts
+from cache_backend import shared_cache
+from data_source import get_source
+from rate_limiter import call_upstream, UpstreamThrottled
+from metrics import instrumented, record_error
+
+CALENDAR_COLUMNS = ["Time", "Currency", "Event", "Importance", "Actual", "Forecast", "Prev"]
+
+def _summary_item(name, closes):
+    """Builds a tape item from a symbol's recent closes (oldest first)."""
+    curr_price = closes.iloc[-1]
+    if len(closes) >= 2:
+        prev_close = closes.iloc[-2]
+        change = curr_price - prev_close
+        change_pct = (change / prev_close) * 100
+        return {
+            "symbol": name,
+            "price": round(curr_price, 2),
+            "change": round(change, 2),
+            "change_pct": round(change_pct, 2)
+        }
+    return {
+        "symbol": name,
+        "price": round(curr_price, 2),
+        "change": 0,
+        "change_pct": 0
     }
-    
+
+LIVE_SUMMARY_TTL = 5  # Seconds; the live tape refreshes at most this often
+
+def _fetch_market_summary(symbols=None):
+    """
+    Fetches the ticker tape symbols (consts.MARKET_SUMMARY_TICKERS by default)
+    in a single batched download; yfinance fetches the symbols concurrently,
+    so latency tracks the slowest symbol rather than the count.
+    """
+    symbols = symbols or consts.MARKET_SUMMARY_TICKERS
+    try:
+        # Use the last 5 days to be safe across weekends
+        panel = call_upstream(get_source().download, list(symbols), period="5d")
+    except UpstreamThrottled:
+        raise  # Don't cache a throttled fetch as an empty tape
+    except Exception as e:
+        print(f"Error fetching market summary: {e}")
+        record_error("_fetch_market_summary", e)
+        return []
+    if panel is None or panel.empty:
+        return []
+
     data = []
-    for symbol, name in major_tickers.items():
-        try:
-            ticker = yf.Ticker(symbol)
-            # Use history for last 5 days to be safe across weekends
-            hist = ticker.history(period="5d")
-            if len(hist) >= 2:
-                prev_close = hist['Close'].iloc[-2]
-                curr_price = hist['Close'].iloc[-1]
-                change = curr_price - prev_close
-                change_pct = (change / prev_close) * 100
-                data.append({
-                    "symbol": name,
-                    "price": round(curr_price, 2),
-                    "change": round(change, 2),
-                    "change_pct": round(change_pct, 2)
-                })
-            elif len(hist) == 1:
-                curr_price = hist['Close'].iloc[-1]
-                data.append({
-                    "symbol": name,
-                    "price": round(curr_price, 2),
-                    "change": 0,
-                    "change_pct": 0
-                })
-        except Exception as e:
-            print(f"Error fetching summary for {symbol}: {e}")
+    closes = panel['Close']
+    for symbol, name in symbols.items():
+        if symbol not in closes.columns:
+            continue
+        symbol_closes = closes[symbol].dropna()
+        if len(symbol_closes):
+            data.append(_summary_item(name, symbol_closes))
     return data
 
-@st.cache_data(ttl=3600)
+@shared_cache(ttl=1800, stale_ttl=3600) # 30 min cache
+@instrumented
+def get_market_summary(symbols=None):
+    return _fetch_market_summary(symbols)
+
+@shared_cache(ttl=LIVE_SUMMARY_TTL)
+@instrumented
+def get_live_market_summary(symbols=None):
+    """Short-lived tape for live mode, shared by every session that has it on."""
+    return _fetch_market_summary(symbols)
+
+@shared_cache(ttl=3600)
+@instrumented
 def get_economic_calendar():
     """Fetches real economic calendar data using ecocal."""
     try:
         start_date = datetime.now()
         end_date = start_date + timedelta(days=7)
         
-        # Instantiate ecocal Calendar
-        ec = Calendar(
-            startHorizon=start_date.strftime("%Y-%m-%d"),
-            endHorizon=end_date.strftime("%Y-%m-%d"),
-            withDetails=True,
-            nbThreads=10,
-            withProgressBar=False
+        df = call_upstream(
+            get_source().economic_calendar, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
         )
-        
-        df = ec.detailedCalendar
         if df is None or df.empty:
-            return pd.DataFrame(columns=["Time", "Currency", "Event", "Importance", "Actual", "Forecast", "Prev"])
+            return pd.DataFrame(columns=CALENDAR_COLUMNS)
         
         # Map columns
         # Start format: '03/03/2026 00:01:00'
@@ -88,7 +107,10 @@ def get_economic_calendar():
             
         return pd.DataFrame(processed_data)
         
+    except UpstreamThrottled:
+        raise  # Don't cache a throttled fetch as an empty calendar
     except Exception as e:
         print(f"Error fetching economic calendar: {e}")
+        record_error("get_economic_calendar", e)
         # Fallback to empty DF with correct columns
-        return pd.DataFrame(columns=["Time", "Currency", "Event", "Importance", "Actual", "Forecast", "Prev"])
+        return pd.DataFrame(columns=CALENDAR_COLUMNS)
@@ -0,0 +1,120 @@
+import time
+from numbers import Number
+
+from cache_backend import shared_cache
+from data_source import get_source
+from fundamentals_store import FundamentalsStore
+from rate_limiter import call_upstream
+
+EARNINGS_GRACE = 2 * 86400  # Statements usually reach Yahoo a day or two after the report
+RECHECK_SECONDS = 6 * 3600  # Re-poll this often while a reported period hasn't shown up yet
+FALLBACK_TTL = 86400  # Validity when no earnings date is known
+EARNINGS_FIELDS = ("earningsTimestampStart", "earningsTimestamp", "earningsTimestampEnd")
+MARKET_TTL = 900  # Prices, analyst targets and price-based ratios move every session
+MARKET_STALE_TTL = 3600
+
+# ticker.info fields that only change when a new period is reported; every
+# other field (price, market cap, yield, ratios, analyst targets) is market data
+STATEMENT_FIELDS = (
+    "trailingEps", "bookValue", "debtToEquity", "totalRevenue", "revenuePerShare",
+    "netIncomeToCommon", "ebitda", "grossProfits", "freeCashflow", "operatingCashflow",
+    "totalDebt", "totalCash", "totalCashPerShare", "profitMargins", "grossMargins",
+    "operatingMargins", "ebitdaMargins", "returnOnAssets", "returnOnEquity",
+    "earningsGrowth", "revenueGrowth", "earningsQuarterlyGrowth", "currentRatio",
+    "quickRatio", "mostRecentQuarter", "lastFiscalYearEnd"
+)
+
+_store = None
+
+def get_fundamentals_store():
+    global _store
+    if _store is None:
+        _store = FundamentalsStore()
+    return _store
+
+def fiscal_period(info):
+    """Identifies the latest reported period by Yahoo's 'mostRecentQuarter' epoch."""
+    mrq = info.get('mostRecentQuarter')
+    return str(int(mrq)) if isinstance(mrq, Number) else "unknown"
+
+def next_earnings(info, now=None):
+    """Epoch seconds of the upcoming (or just reported) earnings date, or None."""
+    now = now or time.time()
+    dates = [
+        float(info[field]) for field in EARNINGS_FIELDS
+        if isinstance(info.get(field), Number) and info[field] > now - EARNINGS_GRACE
+    ]
+    return min(dates) if dates else None
+
+def _validity(info, previous, now):
+    """Returns (fiscal_period, next_earnings, valid_until) for freshly fetched info."""
+    period = fiscal_period(info)
+    if previous and previous["fiscal_period"] == period and previous["next_earnings"] \
+            and previous["next_earnings"] + EARNINGS_GRACE <= now:
+        # The company reported but the new statements haven't reached Yahoo yet
+        return period, previous["next_earnings"], now + RECHECK_SECONDS
+    earnings = next_earnings(info, now)
+    if earnings:
+        return period, earnings, max(earnings + EARNINGS_GRACE, now + RECHECK_SECONDS)
+    return period, None, now + FALLBACK_TTL
+
+def record_info(ticker_symbol, info):
+    """Stores a freshly fetched ticker.info, valid until the next earnings date."""
+    try:
+        store = get_fundamentals_store()
+        now = time.time()
+        period, earnings, valid_until = _validity(info, store.latest(ticker_symbol, "info"), now)
+        store.put(ticker_symbol, "info", period, info, valid_until, earnings)
+    except Exception as e:
+        print(f"Error storing fundamentals for {ticker_symbol}: {e}")
+
+@shared_cache(ttl=MARKET_TTL, stale_ttl=MARKET_STALE_TTL)
+def get_market_info(ticker_symbol):
+    """
+    Fresh ticker.info for its market and analyst fields. Replaces the stored
+    copy once its earnings-driven validity has run out.
+    """
+    info = call_upstream(get_source().info, ticker_symbol)
+    entry = get_fundamentals_store().latest(ticker_symbol, "info")
+    if entry is None or entry["valid_until"] <= time.time():
+        record_info(ticker_symbol, info)
+    return info
+
+def get_fundamentals(ticker_symbol):
+    """
+    ticker.info with market and analyst fields from get_market_info (short
+    TTL) and statement fields (EPS, book value...) from the stored copy, which
+    stays valid until the next earnings date.
+    """
+    info = dict(get_market_info(ticker_symbol))
+    entry = get_fundamentals_store().latest(ticker_symbol, "info")
+    if entry:
+        stored = entry["payload"]
+        info.update({field: stored[field] for field in STATEMENT_FIELDS if field in stored})
+    return info
+
+def get_financials(ticker_symbol):
+    """
+    Returns the annual income statement, refetched only when the stored copy
+    belongs to an older fiscal period or its earnings-driven validity ran out.
+    """
+    store = get_fundamentals_store()
+    now = time.time()
+    info_entry = store.latest(ticker_symbol, "info")
+    entry = store.latest(ticker_symbol, "financials")
+    if entry and entry["valid_until"] > now and (
+        info_entry is None or entry["fiscal_period"] == info_entry["fiscal_period"]
+    ):
+        return entry["payload"]
+
+    fin = call_upstream(get_source().financials, ticker_symbol)
+    if info_entry:
+        period = info_entry["fiscal_period"]
+        valid_until = max(info_entry["valid_until"], now + RECHECK_SECONDS)
+    else:
+        period, valid_until = "unknown", now + FALLBACK_TTL
+    try:
+        store.put(ticker_symbol, "financials", period, fin, valid_until)
+    except Exception as e:
+        print(f"Error storing financials for {ticker_symbol}: {e}")
+    return fin
@@ -0,0 +1,64 @@
+import os
+import time
+import pickle
+import sqlite3
+from contextlib import contextmanager
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fundamentals.db")
+
+class FundamentalsStore:
+    """
+    On-disk store of slow-changing company data (ticker.info, financial
+    statements) keyed by (ticker, kind, fiscal period). Each entry carries the
+    time it stays valid until, which is driven by the next earnings date.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("FUNDAMENTALS_STORE_PATH", DEFAULT_STORE_PATH)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fundamentals ("
+                "ticker TEXT NOT NULL, kind TEXT NOT NULL, fiscal_period TEXT NOT NULL, "
+                "payload BLOB NOT NULL, fetched_at REAL NOT NULL, valid_until REAL NOT NULL, "
+                "next_earnings REAL, "
+                "PRIMARY KEY (ticker, kind, fiscal_period))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def latest(self, ticker, kind):
+        """Returns the most recently fetched entry as a dict, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT fiscal_period, payload, fetched_at, valid_until, next_earnings "
+                "FROM fundamentals WHERE ticker = ? AND kind = ? ORDER BY fetched_at DESC LIMIT 1",
+                (ticker, kind)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "fiscal_period": row[0],
+            "payload": pickle.loads(row[1]),
+            "fetched_at": row[2],
+            "valid_until": row[3],
+            "next_earnings": row[4]
+        }
+
+    def put(self, ticker, kind, fiscal_period, payload, valid_until, next_earnings=None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO fundamentals "
+                "(ticker, kind, fiscal_period, payload, fetched_at, valid_until, next_earnings) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ticker, kind, fiscal_period, sqlite3.Binary(pickle.dumps(payload)),
+                 time.time(), valid_until, next_earnings)
+            )
@@ -0,0 +1,200 @@
+import re
+import time
+
+import pandas as pd
+
+from data_source import get_source
+from price_store import PriceStore
+from panel_store import PanelStore, PANEL_FIELDS
+from rate_limiter import call_upstream
+
+HISTORY_PERIOD = "5y"  # Covers both MA200 and the 5y historical P/E window
+OHLCV_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+STORE_REFRESH_SECONDS = 900  # How often a stored ticker is checked for new bars
+
+_price_store = None
+# Memory-mapped close/volume panel read by technicals and valuation
+_panel = None
+
+def get_price_store():
+    global _price_store
+    if _price_store is None:
+        _price_store = PriceStore()
+    return _price_store
+
+def get_panel():
+    global _panel
+    if _panel is None:
+        _panel = PanelStore()
+    return _panel
+
+def history_start(period=HISTORY_PERIOD, today=None):
+    """First date a yfinance-style period ('5y', '6mo', '30d') reaches back to, or None ('max', 'ytd')."""
+    match = re.fullmatch(r"(\d+)(d|mo|y)", period)
+    if not match:
+        return None
+    count, unit = int(match.group(1)), match.group(2)
+    offset = {"d": pd.DateOffset(days=count), "mo": pd.DateOffset(months=count), "y": pd.DateOffset(years=count)}[unit]
+    return (today or pd.Timestamp.today()).normalize() - offset
+
+def rebuild_panel(tickers=None):
+    """
+    Rewrites the mapped panel from the price store: every stored ticker, or
+    only the columns of `tickers` (written in place when the panel has room
+    for them). Rewrites drop the dates before the history window.
+    """
+    try:
+        if tickers is None:
+            get_panel().write(get_price_store().load_fields(PANEL_FIELDS), start=history_start())
+        else:
+            get_panel().update(get_price_store().load_fields(PANEL_FIELDS, tickers), start=history_start())
+    except Exception as e:
+        print(f"Error rebuilding price panel: {e}")
+
+def _normalize_index(frame):
+    """Drops the timezone so report dates (naive) compare cleanly against bars."""
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    frame.index = index.normalize()
+    return frame
+
+def get_price_history(tickers, period=HISTORY_PERIOD, start=None):
+    """
+    Downloads daily OHLCV (plus split events) for tickers in a single request.
+    Returns a wide frame (dates x (field, ticker)), or None if the request
+    failed. When start is given only bars from that date onwards are requested.
+    """
+    tickers = sorted(set(tickers))
+    if not tickers:
+        return pd.DataFrame()
+    window = {"start": pd.Timestamp(start).strftime("%Y-%m-%d")} if start is not None else {"period": period}
+    try:
+        if len(tickers) == 1:
+            hist = call_upstream(get_source().history, tickers[0], **window)
+            if hist is None or hist.empty:
+                return pd.DataFrame()
+            panel = pd.concat({tickers[0]: hist}, axis=1).swaplevel(axis=1)
+        else:
+            panel = call_upstream(get_source().download, tickers, actions=True, **window)
+        if panel is None or panel.empty:
+            return pd.DataFrame()
+        return _normalize_index(panel)
+    except Exception as e:
+        print(f"Error downloading price history for {len(tickers)} tickers: {e}")
+        return None
+
+def split_panel(panel):
+    """Splits a wide (field, ticker) panel into one OHLCV frame per ticker."""
+    slices = {}
+    if panel is None or panel.empty or not isinstance(panel.columns, pd.MultiIndex):
+        return slices
+    for ticker in panel.columns.get_level_values(1).unique():
+        hist = panel.xs(ticker, axis=1, level=1)
+        hist = hist[[c for c in OHLCV_FIELDS if c in hist.columns]].dropna(subset=["Close"])
+        if not hist.empty:
+            slices[ticker] = hist
+    return slices
+
+ADJUSTING_ACTIONS = ("Stock Splits", "Dividends")
+
+def _tickers_to_reload(panel, last_dates):
+    """
+    Tickers whose new bars include a split or a dividend. Stored bars are
+    adjusted for both, so either one changes every earlier close.
+    """
+    if panel is None or panel.empty:
+        return []
+    reload = set()
+    for action in ADJUSTING_ACTIONS:
+        if action not in panel.columns.get_level_values(0):
+            continue
+        events = panel[action].fillna(0)
+        reload.update(t for t in events.columns if (events.loc[events.index > last_dates[t], t] > 0).any())
+    return sorted(reload)
+
+def sync_history(tickers, period=HISTORY_PERIOD):
+    """
+    Brings the price store up to date for tickers. Stored tickers only fetch
+    bars from their last stored date onwards, in one shared request; tickers
+    seen for the first time (or after a split or dividend) get the full
+    window. Bars older than the window are dropped as new ones come in.
+    """
+    store = get_price_store()
+    now = time.time()
+    checked = store.checked_at(tickers)
+    due = [t for t in tickers if now - checked.get(t, 0) >= STORE_REFRESH_SECONDS]
+    if not due:
+        return
+
+    last_dates = store.last_dates(due)
+    stale = [t for t in due if t in last_dates]
+    reload = [t for t in due if t not in last_dates]
+    synced = []
+    changed = []
+    keep_from = history_start(period)
+
+    # 1. Incremental update for tickers already in the store
+    if stale:
+        panel = get_price_history(stale, start=min(last_dates[t] for t in stale))
+        adjusted = _tickers_to_reload(panel, last_dates)
+        for ticker, hist in split_panel(panel).items():
+            if ticker not in adjusted:
+                store.append(ticker, hist, keep_from)
+                changed.append(ticker)
+        # No new bars (weekend, holiday) still counts as checked; a failed request doesn't
+        if panel is not None:
+            synced += [t for t in stale if t not in adjusted]
+        reload += adjusted
+
+    # 2. Full window for new tickers and ones re-adjusted by a split or dividend
+    if reload:
+        panel = get_price_history(reload, period=period)
+        for ticker, hist in split_panel(panel).items():
+            store.replace(ticker, hist, keep_from)
+            changed.append(ticker)
+        # Tickers with no bars at all (delisted, unknown) aren't asked for again until the next refresh
+        if panel is not None:
+            synced += reload
+
+    store.mark_checked(synced, now)
+    if changed:
+        rebuild_panel(changed)
+
+def get_close_panel(tickers, field="Close"):
+    """
+    Returns a (dates x tickers) frame read from the mapped panel. Tickers
+    missing from the panel are synced first; tickers without any stored bars
+    are left out.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    panel = get_panel()
+    missing = [t for t in tickers if not panel.has(t)]
+    if missing:
+        sync_history(missing)
+        # Bars stored by an earlier sync (or another process) but not in this panel yet
+        unmapped = [t for t in get_price_store().last_dates(missing) if not panel.has(t)]
+        if unmapped:
+            rebuild_panel(unmapped)
+    return panel.frame(tickers, field)
+
+def get_close_series(ticker_symbol):
+    """One ticker's closes (without the gaps before its first bar), or an empty Series."""
+    if not get_panel().has(ticker_symbol):
+        get_close_panel([ticker_symbol])
+    closes = get_panel().series(ticker_symbol)
+    return closes.dropna() if closes is not None else pd.Series(dtype=float)
+
+def load_watchlist_history(tickers, period=HISTORY_PERIOD):
+    """
+    Syncs the price store for a watchlist and returns its (dates x tickers)
+    close frame from the mapped panel.
+    """
+    tickers = sorted(set(tickers))
+    sync_history(tickers, period)
+    return get_close_panel(tickers)
+
+def get_ticker_history(ticker_symbol, period=HISTORY_PERIOD):
+    """Returns daily OHLCV for one ticker from the price store."""
+    sync_history([ticker_symbol], period)
+    return get_price_store().load(ticker_symbol)
@@ -0,0 +1,315 @@
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Listener
+
+import pandas as pd
+
+from data_provider import (
+    ROW_FUNCTIONS, DEFAULT_DAEMON_ADDRESS, daemon_authkey, parse_address, row_function, _fetch_or_none
+)
+from economics_provider import get_live_market_summary, get_economic_calendar, CALENDAR_COLUMNS
+from history_provider import load_watchlist_history
+from screener import get_universe, run_screener
+from technical_provider import calculate_technical_summaries
+from watchlist import load_tickers
+
+DAEMON_INTERVAL = 15  # Seconds between snapshot refreshes
+WATCH_TTL = 3600  # Tickers nobody asked for in this long leave the watchlist union
+SCREENER_TTL = 900  # Seconds a finished screener run is served before the next request reruns it
+
+class LiveProvider:
+    """Fetches through the provider modules (shared cache, rate limiter, stores)."""
+
+    def prepare(self, kind, tickers):
+        if kind == "stocks":
+            # Technicals and historical P/E read from the mapped price panel
+            load_watchlist_history(tickers)
+            calculate_technical_summaries(tickers)
+
+    def row_function(self, kind, tickers):
+        return row_function(kind, tickers)
+
+    def market_summary(self):
+        return get_live_market_summary()
+
+    def economic_calendar(self):
+        return get_economic_calendar()
+
+    def screener(self, universe, tickers):
+        return run_screener(tickers or get_universe(universe))
+
+class FixtureProvider:
+    """
+    Serves canned rows instead of hitting Yahoo Finance, for tests and offline
+    runs. `rows` maps kind -> {ticker: row}; the calendar and screener
+    results are lists of row dicts.
+    """
+
+    def __init__(self, rows, market_summary=None, calendar=None, screener=None):
+        self.rows = rows
+        self.summary = market_summary or []
+        self.calendar = calendar or []
+        self.screener_rows = screener or []
+        self.fetched = []
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            fixtures = json.load(f)
+        return cls(
+            fixtures.get("rows", {}), fixtures.get("market_summary"),
+            fixtures.get("economic_calendar"), fixtures.get("screener")
+        )
+
+    def prepare(self, kind, tickers):
+        pass
+
+    def fetch(self, kind, ticker):
+        self.fetched.append((kind, ticker))
+        return self.rows.get(kind, {}).get(ticker)
+
+    def row_function(self, kind, tickers):
+        return lambda ticker: self.fetch(kind, ticker)
+
+    def market_summary(self):
+        return self.summary
+
+    def economic_calendar(self):
+        return pd.DataFrame(self.calendar, columns=CALENDAR_COLUMNS)
+
+    def screener(self, universe, tickers):
+        return pd.DataFrame(self.screener_rows)
+
+class MarketDaemon:
+    """
+    Owns the union of every session's watchlist (plus tickers.json), refreshes
+    it on a schedule and serves the computed rows, ticker tape, economic
+    calendar and screener runs over local IPC, so the Streamlit workers do no
+    upstream I/O and upstream load doesn't grow with the number of users.
+    Requests never fetch: what isn't computed yet is queued for the refresh
+    loop and reported as pending.
+    """
+
+    def __init__(self, provider=None, interval=DAEMON_INTERVAL, max_workers=8):
+        self.provider = provider or LiveProvider()
+        self.interval = interval
+        self.max_workers = max_workers
+        self._watched = {kind: {} for kind in ROW_FUNCTIONS}  # kind -> {ticker: last requested}
+        self._rows = {kind: {} for kind in ROW_FUNCTIONS}  # kind -> {ticker: row, None without data}
+        self._queued = {kind: set() for kind in ROW_FUNCTIONS}  # Requested, not fetched yet
+        self._summary = None
+        self._calendar = None
+        self._screens = {}  # (universe, tickers) -> (started at, future)
+        self._screen_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="daemon-screener")
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._listener = None
+
+    @property
+    def address(self):
+        return self._listener.address if self._listener else None
+
+    def _fetch(self, kind, tickers):
+        if not tickers:
+            return
+        self.provider.prepare(kind, tickers)
+        fetch = self.provider.row_function(kind, tickers)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(lambda t: _fetch_or_none(fetch, t), tickers))
+        with self._lock:
+            for ticker, row in zip(tickers, results):
+                # A failed refresh keeps the last good row
+                if row is not None or ticker not in self._rows[kind]:
+                    self._rows[kind][ticker] = row
+
+    def refresh(self):
+        """Refreshes every watched ticker, the ticker tape and the economic calendar."""
+        now = time.time()
+        saved = load_tickers()
+        with self._lock:
+            for kind, watched in self._watched.items():
+                for ticker in [t for t, seen in watched.items() if now - seen > WATCH_TTL]:
+                    del watched[ticker]
+                    self._rows[kind].pop(ticker, None)
+                for ticker in saved.get(kind, []):
+                    watched.setdefault(ticker, now)
+                self._queued[kind].clear()
+            jobs = {kind: list(watched) for kind, watched in self._watched.items()}
+        for kind, tickers in jobs.items():
+            self._fetch(kind, tickers)
+        try:
+            summary = self.provider.market_summary()
+        except Exception as e:
+            print(f"Error refreshing market summary: {e}")
+        else:
+            with self._lock:
+                self._summary = summary
+        try:
+            calendar = self.provider.economic_calendar()
+        except Exception as e:
+            print(f"Error refreshing economic calendar: {e}")
+        else:
+            with self._lock:
+                self._calendar = calendar
+
+    def fetch_queued(self):
+        """Fetches the tickers requested since the last refresh."""
+        with self._lock:
+            jobs = {kind: sorted(queued) for kind, queued in self._queued.items()}
+            for queued in self._queued.values():
+                queued.clear()
+        for kind, tickers in jobs.items():
+            self._fetch(kind, tickers)
+
+    def rows(self, kind, tickers):
+        """
+        Returns {ticker: row} for the requested tickers the daemon has
+        fetched. The rest are queued for the refresh loop and left out.
+        """
+        if kind not in self._rows:
+            raise ValueError(f"Unknown asset kind: {kind}")
+        now = time.time()
+        with self._lock:
+            for ticker in tickers:
+                self._watched[kind][ticker] = now
+            missing = [t for t in tickers if t not in self._rows[kind]]
+            self._queued[kind].update(missing)
+            rows = {t: self._rows[kind][t] for t in tickers if t in self._rows[kind]}
+        if missing:
+            self._wake.set()
+        return rows
+
+    def market_summary(self):
+        """The ticker tape; empty until the first refresh has fetched it."""
+        with self._lock:
+            return self._summary or []
+
+    def economic_calendar(self):
+        """This week's calendar, or None until the first refresh has fetched it."""
+        with self._lock:
+            return self._calendar
+
+    def screener(self, universe, tickers=None):
+        """
+        Screener run over a universe (or explicit tickers), started in the
+        background on the first request. Returns ("pending", None) until it
+        finishes, then ("done", results) for SCREENER_TTL, or ("failed", message).
+        """
+        key = (universe, tuple(tickers) if tickers else None)
+        now = time.time()
+        with self._lock:
+            for old in [k for k, (started, job) in self._screens.items() if job.done() and now - started > SCREENER_TTL]:
+                del self._screens[old]
+            if key not in self._screens:
+                self._screens[key] = (now, self._screen_pool.submit(self.provider.screener, universe, tickers))
+            _, job = self._screens[key]
+        if not job.done():
+            return "pending", None
+        if job.exception() is not None:
+            with self._lock:
+                self._screens.pop(key, None)  # The next request tries again
+            return "failed", str(job.exception())
+        return "done", job.result()
+
+    def handle(self, request):
+        """Dispatches one request tuple; returns the response payload."""
+        op = request[0]
+        if op == "rows":
+            return self.rows(request[1], list(request[2]))
+        if op == "market_summary":
+            return self.market_summary()
+        if op == "economic_calendar":
+            return self.economic_calendar()
+        if op == "screener":
+            return self.screener(request[1], request[2])
+        if op == "ping":
+            return "pong"
+        raise ValueError(f"Unknown request: {op}")
+
+    def _serve_connection(self, conn):
+        with conn:
+            while not self._stop.is_set():
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response = ("ok", self.handle(request))
+                except Exception as e:
+                    response = ("error", str(e))
+                try:
+                    conn.send(response)
+                except (EOFError, OSError):
+                    return
+
+    def _refresh_loop(self):
+        """Full refresh every interval; in between, wakes up for tickers queued by requests."""
+        next_refresh = 0.0
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                if time.monotonic() >= next_refresh:
+                    next_refresh = time.monotonic() + self.interval
+                    self.refresh()
+                else:
+                    self.fetch_queued()
+            except Exception as e:
+                print(f"Error refreshing snapshots: {e}")
+            self._wake.wait(max(next_refresh - time.monotonic(), 0))
+
+    def start(self, address=None):
+        """Binds the listener and starts the refresh and accept threads."""
+        authkey = daemon_authkey()
+        if authkey is None:
+            # Requests are unpickled: without a shared secret any local process could run code here
+            raise RuntimeError("MARKET_DAEMON_AUTHKEY must be set to start the market daemon")
+        self._listener = Listener(address or DEFAULT_DAEMON_ADDRESS, authkey=authkey)
+        threading.Thread(target=self._refresh_loop, name="daemon-refresh", daemon=True).start()
+        threading.Thread(target=self._accept_loop, name="daemon-accept", daemon=True).start()
+        return self.address
+
+    def _accept_loop(self):
+        while not self._stop.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._stop.is_set():
+                    return
+                print(f"Error accepting daemon connection: {e}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._screen_pool.shutdown(wait=False, cancel_futures=True)
+        if self._listener:
+            self._listener.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Market data daemon for the Streamlit workers")
+    parser.add_argument("--address", default=os.environ.get("MARKET_DAEMON_ADDRESS"),
+                        help="host:port or Unix socket path (default: localhost:6001)")
+    parser.add_argument("--interval", type=float, default=DAEMON_INTERVAL)
+    parser.add_argument("--fixtures", help="JSON file of canned rows; serves them instead of Yahoo Finance")
+    args = parser.parse_args()
+    if daemon_authkey() is None:
+        parser.error("MARKET_DAEMON_AUTHKEY must be set (the same key in the daemon and the Streamlit workers)")
+
+    provider = FixtureProvider.from_json(args.fixtures) if args.fixtures else LiveProvider()
+    daemon = MarketDaemon(provider, interval=args.interval)
+    address = daemon.start(parse_address(args.address) if args.address else None)
+    print(f"Market daemon listening on {address}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        daemon.stop()
+
+if __name__ == "__main__":
+    main()
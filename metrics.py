@@ -0,0 +1,285 @@
+import os
+import time
+import bisect
+import threading
+import functools
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from cache_backend import cache_stats
+from tracing import span
+
+# Seconds; from cache-speed reads to slow multi-ticker downloads
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class Counter:
+    """Monotonic count per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        """{label values tuple: count}"""
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in sorted(self.values().items())]
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label combination, as Prometheus expects."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def values(self):
+        """{label values tuple: {'counts', 'sum', 'count'}}"""
+        with self._lock:
+            return {key: {**series, "counts": list(series["counts"])} for key, series in self._series.items()}
+
+    def quantile(self, q, series):
+        """Estimates a quantile by linear interpolation inside its bucket (as histogram_quantile does)."""
+        if not series["count"]:
+            return None
+        rank = q * series["count"]
+        seen = 0
+        for i, count in enumerate(series["counts"]):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                if i == len(self.buckets):
+                    return lower  # Above the last bucket: its bound is all we know
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def samples(self):
+        samples = []
+        for key, series in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series["counts"]):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", _format_labels(self.labels, key, [("le", bound)]), cumulative))
+            samples.append((f"{self.name}_sum", _format_labels(self.labels, key), series["sum"]))
+            samples.append((f"{self.name}_count", _format_labels(self.labels, key), series["count"]))
+        return samples
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics + [_cache_requests()]:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += [f"{name}{labels} {value}" for name, labels, value in metric.samples()]
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+provider_calls = REGISTRY.counter(
+    "investing_provider_calls_total", "Provider function calls that were computed (not served from cache)", ("function",)
+)
+provider_errors = REGISTRY.counter(
+    "investing_provider_errors_total", "Errors raised or handled in provider functions, by exception type", ("function", "error")
+)
+provider_latency = REGISTRY.histogram(
+    "investing_provider_latency_seconds", "Time to compute a provider function result", ("function",)
+)
+upstream_calls = REGISTRY.counter(
+    "investing_upstream_calls_total", "Requests sent to the upstream data source, retries included", ("method",)
+)
+upstream_errors = REGISTRY.counter(
+    "investing_upstream_errors_total", "Failed upstream requests, by exception type", ("method", "error")
+)
+upstream_latency = REGISTRY.histogram(
+    "investing_upstream_latency_seconds", "Upstream request latency", ("method",)
+)
+pool_wait = REGISTRY.histogram(
+    "investing_pool_wait_seconds", "Time a per-ticker task waited for a worker thread", ("function",)
+)
+pool_run = REGISTRY.histogram(
+    "investing_pool_task_seconds", "Time a per-ticker task ran on a worker thread", ("function",)
+)
+fetch_misses = REGISTRY.counter(
+    "investing_fetch_misses_total", "Tickers a concurrent fetch returned no data for", ("function",)
+)
+
+def _cache_requests():
+    """Cache lookups by outcome, read from the shared_cache statistics at scrape time."""
+    metric = Counter("investing_cache_requests_total", "shared_cache lookups by outcome", ("function", "outcome"))
+    for function, counts in cache_stats().items():
+        for outcome, count in counts.items():
+            metric.inc(count, function=function, outcome=outcome)
+    return metric
+
+def record_error(function, error):
+    """Counts an error a provider function handled itself (and printed) instead of raising."""
+    provider_errors.inc(function=function, error=type(error).__name__)
+
+def instrumented(func):
+    """
+    Counts calls, latency and raised errors of a provider function, and times
+    it as a span of the current trace. Goes under @shared_cache, so it
+    measures the computed calls; cache hits are in the cache statistics.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        provider_calls.inc(function=name)
+        started = time.perf_counter()
+        try:
+            with span(name):
+                return func(*args, **kwargs)
+        except Exception as e:
+            record_error(name, e)
+            raise
+        finally:
+            provider_latency.observe(time.perf_counter() - started, function=name)
+    return wrapper
+
+def summary():
+    """Tables for the admin page: {'providers', 'upstream', 'cache', 'pool', 'errors'} as lists of rows."""
+    errors_by_function = {}
+    for (function, _), count in provider_errors.values().items():
+        errors_by_function[function] = errors_by_function.get(function, 0) + count
+    upstream_errors_by_method = {}
+    for (method, _), count in upstream_errors.values().items():
+        upstream_errors_by_method[method] = upstream_errors_by_method.get(method, 0) + count
+
+    def latency_rows(histogram, label, extra=None):
+        rows = []
+        for (value,), series in sorted(histogram.values().items()):
+            row = {label: value, "Llamadas": series["count"]}
+            if extra is not None:
+                row["Errores"] = extra.get(value, 0)
+            row.update({
+                "Media (s)": series["sum"] / series["count"],
+                "p50 (s)": histogram.quantile(0.5, series),
+                "p95 (s)": histogram.quantile(0.95, series),
+                "Total (s)": series["sum"]
+            })
+            rows.append(row)
+        return rows
+
+    cache = []
+    for function, counts in sorted(cache_stats().items()):
+        lookups = counts["hits"] + counts["misses"] + counts["coalesced"] + counts["stale"]
+        served = counts["hits"] + counts["coalesced"] + counts["stale"]
+        cache.append({"Función": function, **counts, "Tasa de acierto": served / lookups if lookups else None})
+
+    pool = latency_rows(pool_run, "Función")
+    waits = {value: series for (value,), series in pool_wait.values().items()}
+    for row in pool:
+        series = waits.get(row["Función"])
+        row["Espera p95 (s)"] = pool_wait.quantile(0.95, series) if series else None
+
+    return {
+        "providers": latency_rows(provider_latency, "Función", errors_by_function),
+        "upstream": latency_rows(upstream_latency, "Método", upstream_errors_by_method),
+        "cache": cache,
+        "pool": pool,
+        "errors": [
+            {"Función": function, "Error": error, "Veces": count}
+            for (function, error), count in sorted(provider_errors.values().items())
+        ] + [
+            {"Función": f"upstream.{method}", "Error": error, "Veces": count}
+            for (method, error), count in sorted(upstream_errors.values().items())
+        ]
+    }
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the app's log
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port=None):
+    """
+    Serves /metrics in Prometheus format on `port` (METRICS_PORT by default)
+    from a daemon thread, once per process. Returns the server, or None when
+    no port is configured or it cannot be bound.
+    """
+    global _server
+    if port is None:
+        port = os.environ.get("METRICS_PORT")
+    if port in (None, ""):
+        return None
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer(("", int(port)), _MetricsHandler)
+            except OSError as e:
+                print(f"Error starting metrics server on port {port}: {e}")
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
+
+def stop_metrics_server():
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.shutdown()
+            _server.server_close()
+            _server = None
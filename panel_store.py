@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within the process
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PANEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "panel.json")
+PANEL_FIELDS = ("Close", "Volume")
+DATE_SLACK = 64  # Spare date rows per column, so new trading days are written in place
+
+class PanelStore:
+    """
+    Daily close/volume panel of the whole universe in a memory-mapped file.
+    A small JSON header maps ticker -> column and date -> row; the data file
+    holds one contiguous float64 run per (field, ticker), so every worker and
+    batch job maps it read-only and slices it without unpickling DataFrames.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("PANEL_PATH", DEFAULT_PANEL_PATH)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._mapped = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    @contextmanager
+    def _exclusive(self):
+        """Serializes writers across threads and, through a lock file, across processes."""
+        with self._write_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def write(self, frames, start=None):
+        """
+        Replaces the panel with frames ({field: dates x tickers frame}),
+        dropping dates before start. The data file is written under a new
+        name and the header swapped in atomically, so readers never see a
+        half-written panel.
+        """
+        with self._exclusive():
+            self._write(frames, start)
+
+    def update(self, frames, start=None):
+        """
+        Replaces the columns of the tickers in frames and keeps every other
+        ticker's columns. Columns of tickers already in the panel are
+        overwritten in place, with new trading days going into the spare
+        date rows; the panel is only rewritten (and dates before start
+        dropped) when a ticker is added or the spare rows run out. Readers
+        see each value either before or after the write.
+        """
+        with self._exclusive():
+            mapped = self._load()
+            if not self._update_in_place(mapped, frames):
+                merged = {}
+                for field, frame in frames.items():
+                    kept = [t for t in (mapped["columns"] if mapped else []) if t not in frame.columns]
+                    current = self.frame(kept, field)
+                    merged[field] = pd.concat([current, frame], axis=1) if not current.empty else frame
+                self._write(merged, start)
+
+    def _update_in_place(self, mapped, frames):
+        """Writes frames into the mapped data file; False when the panel has to be rewritten instead."""
+        if not mapped or mapped["data"] is None or any(f not in mapped["fields"] for f in frames):
+            return False
+        dates = mapped["dates"]
+        incoming = pd.DatetimeIndex(sorted(set().union(*(frame.index for frame in frames.values()))))
+        new_dates = incoming.difference(dates)
+        if len(new_dates) and (new_dates[0] <= dates[-1] or len(dates) + len(new_dates) > mapped["capacity"]):
+            return False  # A gap inside the date axis, or no spare rows left
+        if any(t not in mapped["columns"] for frame in frames.values() for t in frame.columns):
+            return False
+
+        dates = dates.append(new_dates)
+        data = np.memmap(mapped["data"].filename, dtype="float64", mode="r+", shape=mapped["data"].shape)
+        for field, frame in frames.items():
+            values = frame.reindex(index=dates).to_numpy(dtype=float).T
+            for ticker, column in zip(frame.columns, values):
+                data[mapped["fields"][field], mapped["columns"][ticker], :len(dates)] = column
+        data.flush()
+        del data
+        if len(new_dates):
+            # The header goes last: until it is swapped in, readers don't look at the new rows
+            header = self._read_header()
+            header["dates"] = [d.strftime("%Y-%m-%d") for d in dates]
+            self._swap_header(header)
+        return True
+
+    def _write(self, frames, start=None):
+        fields = [f for f in PANEL_FIELDS if f in frames]
+        tickers = sorted(set().union(*(frames[f].columns for f in fields))) if fields else []
+        dates = pd.DatetimeIndex(sorted(set().union(*(frames[f].index for f in fields)))) if fields else pd.DatetimeIndex([])
+        if start is not None:
+            dates = dates[dates >= start]
+
+        base = os.path.splitext(self.path)[0]
+        data_path = f"{base}.{time.time_ns()}.bin"
+        capacity = len(dates) + DATE_SLACK
+        if tickers and len(dates):
+            data = np.memmap(data_path, dtype="float64", mode="w+", shape=(len(fields), len(tickers), capacity))
+            data[:, :, len(dates):] = np.nan
+            for i, field in enumerate(fields):
+                data[i, :, :len(dates)] = frames[field].reindex(index=dates, columns=tickers).to_numpy(dtype=float).T
+            data.flush()
+            del data
+        else:
+            data_path = None
+
+        header = {
+            "fields": fields,
+            "tickers": tickers,
+            "dates": [d.strftime("%Y-%m-%d") for d in dates],
+            "capacity": capacity,
+            "data": os.path.basename(data_path) if data_path else None
+        }
+        previous = (self._read_header() or {}).get("data")
+        self._swap_header(header)
+        if previous and previous != header["data"]:
+            # Readers that already mapped it keep it alive until they unmap it
+            try:
+                os.remove(os.path.join(os.path.dirname(self.path) or ".", previous))
+            except OSError:
+                pass
+
+    def _read_header(self):
+        """The current header, or None."""
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _swap_header(self, header):
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        """Returns the mapped panel, remapping it when the header changed; None if there is none."""
+        for _ in range(3):
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return None
+            with self._lock:
+                # Every write swaps in a new header file, so the inode identifies the version
+                version = (stat.st_ino, stat.st_mtime_ns)
+                if self._mapped and self._mapped["version"] == version:
+                    return self._mapped
+                try:
+                    with open(self.path) as f:
+                        header = json.load(f)
+                    capacity = header.get("capacity", len(header["dates"]))
+                    data = None
+                    if header["data"]:
+                        data = np.memmap(
+                            os.path.join(os.path.dirname(self.path) or ".", header["data"]),
+                            dtype="float64", mode="r",
+                            shape=(len(header["fields"]), len(header["tickers"]), capacity)
+                        )
+                except (FileNotFoundError, ValueError):
+                    continue  # Replaced while we were reading it; try the new one
+                self._mapped = {
+                    "version": version,
+                    "data": data,
+                    "capacity": capacity,
+                    "fields": {f: i for i, f in enumerate(header["fields"])},
+                    "columns": {t: i for i, t in enumerate(header["tickers"])},
+                    "dates": pd.DatetimeIndex(pd.to_datetime(header["dates"]), name="Date")
+                }
+                return self._mapped
+        return None
+
+    def tickers(self):
+        mapped = self._load()
+        return list(mapped["columns"]) if mapped else []
+
+    def has(self, ticker):
+        mapped = self._load()
+        return bool(mapped) and ticker in mapped["columns"]
+
+    def frame(self, tickers, field="Close"):
+        """
+        Returns a (dates x tickers) frame for the tickers present in the panel.
+        Dates a ticker has no bar for are NaN. The frame is a copy (the
+        tickers' columns aren't adjacent in the file); series() is zero-copy.
+        """
+        mapped = self._load()
+        if not mapped or mapped["data"] is None or field not in mapped["fields"]:
+            return pd.DataFrame()
+        present = [t for t in tickers if t in mapped["columns"]]
+        if not present:
+            return pd.DataFrame()
+        block = mapped["data"][mapped["fields"][field], :, :len(mapped["dates"])]
+        columns = [mapped["columns"][t] for t in present]
+        return pd.DataFrame(block[columns].T, index=mapped["dates"], columns=present)
+
+    def series(self, ticker, field="Close"):
+        """One ticker's column as a Series backed directly by the mapping (no copy), or None."""
+        mapped = self._load()
+        if not mapped or mapped["data"] is None or ticker not in mapped["columns"] or field not in mapped["fields"]:
+            return None
+        values = mapped["data"][mapped["fields"][field], mapped["columns"][ticker], :len(mapped["dates"])]
+        return pd.Series(values, index=mapped["dates"], name=ticker, copy=False)
@@ -0,0 +1,129 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import pandas as pd
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "prices.db")
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+class PriceStore:
+    """
+    On-disk store of daily OHLCV bars keyed by (ticker, date).
+    Lives next to the app so it survives container restarts.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("PRICE_STORE_PATH", DEFAULT_STORE_PATH)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bars ("
+                "ticker TEXT NOT NULL, date TEXT NOT NULL, "
+                "open REAL, high REAL, low REAL, close REAL, volume REAL, "
+                "PRIMARY KEY (ticker, date))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync (ticker TEXT PRIMARY KEY, checked_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def last_dates(self, tickers):
+        """Returns {ticker: Timestamp of the last stored bar} for tickers with data."""
+        if not tickers:
+            return {}
+        placeholders = ",".join("?" * len(tickers))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT ticker, MAX(date) FROM bars WHERE ticker IN ({placeholders}) GROUP BY ticker",
+                list(tickers)
+            ).fetchall()
+        return {ticker: pd.Timestamp(date) for ticker, date in rows}
+
+    def checked_at(self, tickers):
+        """Returns {ticker: epoch seconds of the last upstream sync}."""
+        if not tickers:
+            return {}
+        placeholders = ",".join("?" * len(tickers))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT ticker, checked_at FROM sync WHERE ticker IN ({placeholders})",
+                list(tickers)
+            ).fetchall()
+        return dict(rows)
+
+    def mark_checked(self, tickers, checked_at):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sync (ticker, checked_at) VALUES (?, ?)",
+                [(t, checked_at) for t in tickers]
+            )
+
+    def append(self, ticker, hist, keep_from=None):
+        """
+        Upserts bars for one ticker. Re-sent dates overwrite the stored bar,
+        so a partial intraday bar is replaced once the session closes. With
+        keep_from, the ticker's bars before that date are dropped.
+        """
+        if hist is None or hist.empty:
+            return 0
+        hist = hist.reindex(columns=BAR_COLUMNS)
+        rows = [
+            (ticker, pd.Timestamp(date).strftime("%Y-%m-%d"),
+             *[None if pd.isna(v) else float(v) for v in values])
+            for date, values in zip(hist.index, hist.itertuples(index=False, name=None))
+            if not pd.isna(values[3])
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO bars (ticker, date, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            if keep_from is not None:
+                conn.execute(
+                    "DELETE FROM bars WHERE ticker = ? AND date < ?",
+                    (ticker, pd.Timestamp(keep_from).strftime("%Y-%m-%d"))
+                )
+        return len(rows)
+
+    def replace(self, ticker, hist, keep_from=None):
+        """Drops every stored bar for ticker and writes hist (used after splits and dividends)."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM bars WHERE ticker = ?", (ticker,))
+        return self.append(ticker, hist, keep_from)
+
+    def load_fields(self, fields, tickers=None):
+        """Returns {field: (dates x tickers) frame} over every stored ticker (or just tickers), in one query."""
+        columns = ", ".join(f.lower() for f in fields)
+        query, params = f"SELECT ticker, date, {columns} FROM bars", []
+        if tickers is not None:
+            query += f" WHERE ticker IN ({','.join('?' * len(tickers))})"
+            params = list(tickers)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        frame = pd.DataFrame(rows, columns=["Ticker", "Date"] + list(fields))
+        frame["Date"] = pd.to_datetime(frame["Date"])
+        return {f: frame.pivot(index="Date", columns="Ticker", values=f) for f in fields}
+
+    def load(self, ticker, start=None):
+        """Returns the stored OHLCV frame for ticker, indexed by naive dates."""
+        query = "SELECT date, open, high, low, close, volume FROM bars WHERE ticker = ?"
+        params = [ticker]
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY date", params).fetchall()
+        frame = pd.DataFrame(rows, columns=["Date"] + BAR_COLUMNS)
+        frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop("Date")), name="Date")
+        return frame
@@ -0,0 +1,144 @@
+import os
+import time
+import random
+import threading
+
+from yfinance.exceptions import YFRateLimitError
+
+import metrics
+import tracing
+
+UPSTREAM_RATE = float(os.environ.get("UPSTREAM_RATE", 5))  # Requests per second, all providers combined
+UPSTREAM_BURST = int(os.environ.get("UPSTREAM_BURST", 10))
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5  # Seconds; doubled on every retry, with full jitter
+BACKOFF_CAP = 30.0
+
+class UpstreamThrottled(Exception):
+    """Raised when the provider keeps throttling after every retry."""
+
+def is_throttling_error(error):
+    if isinstance(error, YFRateLimitError):
+        return True
+    message = str(error).lower()
+    return "429" in message or "too many requests" in message or "rate limit" in message
+
+def is_transient_error(error):
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    message = str(error).lower()
+    return any(s in message for s in ("timed out", "timeout", "connection reset", "502", "503", "504"))
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `capacity` stored."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on concurrent upstream calls. Successes under the target latency
+    grow the limit by one per round; slow calls shrink it by one; throttling halves it.
+    """
+
+    def __init__(self, initial=8, min_limit=1, max_limit=32, target_latency=2.0):
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self, latency):
+        with self._cond:
+            if latency > self.target_latency:
+                self.limit = max(self.min_limit, self.limit - 1)
+                self._successes = 0
+                return
+            self._successes += 1
+            if self._successes >= self.limit:
+                self.limit = min(self.max_limit, self.limit + 1)
+                self._successes = 0
+                self._cond.notify_all()
+
+    def on_throttled(self):
+        with self._cond:
+            self.limit = max(self.min_limit, self.limit // 2)
+            self._successes = 0
+
+# Shared by every provider function in the process
+upstream_bucket = TokenBucket(UPSTREAM_RATE, UPSTREAM_BURST)
+upstream_concurrency = AdaptiveConcurrency()
+
+def backoff_delay(attempt):
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+def call_upstream(fn, *args, **kwargs):
+    """
+    Runs one upstream request under the shared token bucket and adaptive
+    concurrency limit, retrying throttling and transient errors with
+    exponential backoff and jitter. Raises UpstreamThrottled if throttling
+    persists, so callers don't cache the failure as an empty result.
+    """
+    method = getattr(fn, "__name__", "call")
+    with tracing.span(f"upstream.{method}"):
+        return _call_with_retries(method, fn, args, kwargs)
+
+def _call_with_retries(method, fn, args, kwargs):
+    for attempt in range(MAX_RETRIES + 1):
+        upstream_bucket.acquire()
+        upstream_concurrency.acquire()
+        metrics.upstream_calls.inc(method=method)
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            metrics.upstream_errors.inc(method=method, error=type(e).__name__)
+            metrics.upstream_latency.observe(time.monotonic() - started, method=method)
+            throttled = is_throttling_error(e)
+            if throttled:
+                upstream_concurrency.on_throttled()
+            elif not is_transient_error(e):
+                raise
+            if attempt == MAX_RETRIES:
+                if throttled:
+                    raise UpstreamThrottled(str(e)) from e
+                raise
+        else:
+            latency = time.monotonic() - started
+            metrics.upstream_latency.observe(latency, method=method)
+            upstream_concurrency.on_success(latency)
+            return result
+        finally:
+            upstream_concurrency.release()
+        tracing.annotate(retries=attempt + 1)
+        time.sleep(backoff_delay(attempt))
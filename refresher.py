@@ -0,0 +1,84 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from data_provider import get_stock_fundamentals, get_etf_data, get_crypto_data, fetch_quotes, quote_key
+from economics_provider import get_market_summary
+from history_provider import load_watchlist_history
+from technical_provider import calculate_technical_summaries
+from watchlist import load_tickers
+
+REFRESH_INTERVAL = 30  # Seconds between watchlist sweeps
+REFRESH_LEAD = 60  # Refresh entries this many seconds before their TTL expires
+WATCHLIST_FUNCTIONS = {
+    "stocks": get_stock_fundamentals,
+    "etfs": get_etf_data,
+    "crypto": get_crypto_data
+}
+
+_thread = None
+_stop = threading.Event()
+_lock = threading.Lock()
+
+def _is_due(func, *args):
+    age = func.age(*args)
+    return age is None or age >= func.ttl - REFRESH_LEAD
+
+def refresh_watchlist(max_workers=4):
+    """
+    Refreshes every cached entry of the watchlist in tickers.json (plus the
+    market summary) that is missing or close to expiry. The watchlist's
+    quotes outlive QUOTE_TTL only as stale entries, so they are refreshed on
+    every sweep.
+    Returns the number of refreshed entries.
+    """
+    tickers = load_tickers()
+    jobs = [
+        (func, ticker)
+        for kind, func in WATCHLIST_FUNCTIONS.items()
+        for ticker in tickers.get(kind, [])
+        if _is_due(func, ticker)
+    ]
+
+    due_stocks = [ticker for func, ticker in jobs if func is get_stock_fundamentals]
+    if due_stocks:
+        # Technicals and historical P/E read from the mapped price panel
+        load_watchlist_history(tickers["stocks"])
+        calculate_technical_summaries(tickers["stocks"])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(func.refresh, ticker) for func, ticker in jobs]
+        if tickers.get("stocks"):
+            futures.append(executor.submit(fetch_quotes.refresh, quote_key(tickers["stocks"])))
+        if _is_due(get_market_summary):
+            futures.append(executor.submit(get_market_summary.refresh))
+        for future in futures:
+            future.result()
+    return len(futures)
+
+def _run(interval):
+    while not _stop.is_set():
+        try:
+            refresh_watchlist()
+        except Exception as e:
+            print(f"Error refreshing watchlist: {e}")
+        _stop.wait(interval)
+
+def start_background_refresh(interval=REFRESH_INTERVAL):
+    """
+    Starts (once per process) the thread that keeps the watchlist cache warm, so
+    page renders are served from cache instead of waiting on yfinance.
+    Disabled with BACKGROUND_REFRESH=0.
+    """
+    global _thread
+    if os.environ.get("BACKGROUND_REFRESH", "1") == "0":
+        return None
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _stop.clear()
+            _thread = threading.Thread(target=_run, args=(interval,), name="watchlist-refresher", daemon=True)
+            _thread.start()
+    return _thread
+
+def stop_background_refresh():
+    _stop.set()
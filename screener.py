@@ -0,0 +1,129 @@
+import io
+import os
+import re
+import math
+import multiprocessing
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import requests
+
+from cache_backend import shared_cache
+from data_provider import fetch_concurrently, valuation_status
+from fundamentals_provider import get_fundamentals
+from history_provider import load_watchlist_history, get_panel
+from panel_store import PanelStore
+from technical_provider import technical_signals, INSUFFICIENT_DATA
+from valuation import calculate_historical_pes, composite_fair_value
+
+# Index universes: constituents table on Wikipedia and its ticker column
+UNIVERSE_SOURCES = {
+    "S&P 500": ("https://en.wikipedia.org/wiki/List_of_S%26P_500_companies", "Symbol"),
+    "NASDAQ 100": ("https://en.wikipedia.org/wiki/Nasdaq-100", "Ticker")
+}
+INLINE_LIMIT = 50  # Universes up to this size are scored in-process; the pool isn't worth starting
+INFO_FIELDS = (
+    "shortName", "currentPrice", "regularMarketPrice",
+    "trailingEps", "trailingPE", "pegRatio", "targetMeanPrice"
+)
+
+@shared_cache(ttl=86400)
+def get_universe(name):
+    """Constituents of an index universe. Raises if the list can't be fetched (so it isn't cached)."""
+    url, column = UNIVERSE_SOURCES[name]
+    response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}, timeout=15)
+    response.raise_for_status()
+    for table in pd.read_html(io.StringIO(response.text)):
+        if column in table.columns:
+            # Yahoo writes share classes with a dash (BRK-B)
+            return sorted({str(s).strip().replace(".", "-") for s in table[column].dropna()})
+    raise ValueError(f"No '{column}' column found for {name}")
+
+def parse_tickers(text):
+    """Tickers from a user-supplied list separated by commas, semicolons or whitespace."""
+    return list(dict.fromkeys(t.upper() for t in re.split(r"[\s,;]+", text) if t))
+
+def _info_subset(ticker):
+    info = get_fundamentals(ticker)
+    return ticker, {field: info.get(field) for field in INFO_FIELDS}
+
+def load_screener_inputs(tickers):
+    """
+    I/O phase: syncs the price panel, and reads fundamentals and historical P/E
+    (both served from their stores when warm). Returns (infos, hist_pes).
+    """
+    load_watchlist_history(tickers)
+    infos = dict(fetch_concurrently(tickers, _info_subset))
+    hist_pes = calculate_historical_pes(list(infos))
+    return infos, {t: float(pe) for t, pe in hist_pes.items()}
+
+SCREENER_FIELDS = (
+    "Ticker", "Nombre", "Precio Actual", "Valor Justo", "Potencial", "Estado", "P/E", "P/E Hist.", "Técnico"
+)
+
+def _score_chunk(panel_path, items):
+    """
+    CPU phase for a chunk of (ticker, info, hist_pe): technical signals over
+    the mapped panel and composite fair value. Runs in worker processes.
+    Returns {field: values}, filled column by column rather than as a dict
+    per ticker.
+    """
+    closes = PanelStore(panel_path).frame([item[0] for item in items])
+    signals = technical_signals(closes)
+    columns = {field: [] for field in SCREENER_FIELDS}
+    for ticker, info, hist_pe in items:
+        price = info.get('currentPrice') or info.get('regularMarketPrice')
+        if not price:
+            continue
+        fair_value, _ = composite_fair_value(price, info, hist_pe)
+        potential, status = valuation_status(fair_value, price)
+        columns["Ticker"].append(ticker)
+        columns["Nombre"].append(info.get('shortName') or ticker)
+        columns["Precio Actual"].append(price)
+        columns["Valor Justo"].append(fair_value)
+        columns["Potencial"].append(potential)
+        columns["Estado"].append(status)
+        columns["P/E"].append(info.get('trailingPE'))
+        columns["P/E Hist."].append(hist_pe)
+        columns["Técnico"].append(signals.get(ticker, INSUFFICIENT_DATA))
+    return columns
+
+@shared_cache(ttl=900)
+def run_screener(tickers, max_workers=None):
+    """
+    Values and scores a whole universe. Inputs are loaded once in this process;
+    the scoring is split across a process pool, each worker mapping the price
+    panel itself. Returns a DataFrame ranked by Potencial (highest first).
+    """
+    tickers = list(dict.fromkeys(tickers))
+    infos, hist_pes = load_screener_inputs(tickers)
+    items = [(t, infos[t], hist_pes.get(t)) for t in tickers if t in infos]
+    panel_path = get_panel().path
+
+    if len(items) <= INLINE_LIMIT:
+        chunks = [_score_chunk(panel_path, items)]
+    else:
+        workers = max_workers or os.cpu_count() or 1
+        size = math.ceil(len(items) / workers)
+        parts = [items[i:i + size] for i in range(0, len(items), size)]
+        # Spawned workers: forking the threaded Streamlit server isn't safe
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=len(parts), mp_context=context) as executor:
+            chunks = list(executor.map(_score_chunk, repeat(panel_path), parts))
+
+    columns = {field: [value for chunk in chunks for value in chunk[field]] for field in SCREENER_FIELDS}
+    df = pd.DataFrame(columns, columns=list(SCREENER_FIELDS))
+    df["Potencial"] = df["Potencial"].astype(float)
+    return df.sort_values("Potencial", ascending=False, na_position="last", kind="stable").reset_index(drop=True)
+
+def filter_results(df, min_potential=None, max_pe=None, signals=None):
+    """Filters screener results by minimum Potencial, maximum P/E and technical signal."""
+    mask = pd.Series(True, index=df.index)
+    if min_potential is not None:
+        mask &= df["Potencial"].fillna(-math.inf) >= min_potential
+    if max_pe is not None:
+        mask &= df["P/E"].notna() & (df["P/E"] <= max_pe)
+    if signals:
+        mask &= df["Técnico"].isin(signals)
+    return df[mask]
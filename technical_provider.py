@@ -1,55 +1,275 @@
-import yfinance as yf
+import threading
+from collections import deque
+
 import pandas as pd
 import numpy as np
 
+from history_provider import get_close_panel, get_close_series, get_price_store
+from metrics import instrumented, record_error
+
+MA_WINDOWS = (20, 50, 200)
+RSI_WINDOW = 14
+MIN_BARS = max(MA_WINDOWS)  # MA200 needs 200 daily bars; the shared 5y history covers it
+INSUFFICIENT_DATA = "Neutro (Datos insuficientes)"
+
+# {ticker: (date of the last stored bar, signal)} from the last computation
+_watchlist_signals = {}
+# Live indicator state per ticker, seeded from stored history
+_live_technicals = {}
+_live_lock = threading.Lock()
+
+def _right_align(prices):
+    """
+    Moves each column's valid prices to the bottom of the matrix, keeping their
+    order, so row -1 is every ticker's latest bar regardless of gaps or listing date.
+    """
+    valid = ~np.isnan(prices)
+    order = np.argsort(valid, axis=0, kind="stable")
+    return np.take_along_axis(prices, order, axis=0), valid.sum(axis=0)
+
+def score_to_signal(scores):
+    """Maps indicator scores to 'Compra Fuerte' / 'Compra' / 'Neutral' / 'Venta' / 'Venta Fuerte'."""
+    scores = np.asarray(scores)
+    return np.select(
+        [scores >= 3, scores >= 1, scores <= -3, scores <= -1],
+        ["Compra Fuerte", "Compra", "Venta Fuerte", "Venta"],
+        default="Neutral"
+    ).astype(object)
+
+def score_indicators(current_price, moving_averages, rsi):
+    """
+    Scores price vs each moving average (+1/-1) and RSI extremes (+2/-2).
+    Works element-wise, so it serves both the batch engine and live state.
+    """
+    scores = np.zeros(np.shape(current_price), dtype=int)
+    for ma in moving_averages:
+        scores += np.where(current_price > ma, 1, -1)
+    scores += np.where(rsi < 30, 2, 0)  # Oversold (Buy signal)
+    scores -= np.where(rsi > 70, 2, 0)  # Overbought (Sell signal)
+    return scores
+
+def _rsi(gain, loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 - 100 / (1 + np.divide(gain, loss))
+
+def compute_scores(prices):
+    """
+    Scores every column of a 2-D (bars x tickers) close matrix at once.
+    Returns (scores, bar_counts); scores are only meaningful where
+    bar_counts >= MIN_BARS.
+    """
+    prices = np.asarray(prices, dtype=float)
+    if prices.ndim == 1:
+        prices = prices[:, None]
+    if len(prices) < MIN_BARS:
+        padding = np.full((MIN_BARS - len(prices), prices.shape[1]), np.nan)
+        prices = np.vstack([padding, prices])
+
+    aligned, counts = _right_align(prices)
+
+    # 1. Moving averages
+    moving_averages = [aligned[-window:].mean(axis=0) for window in MA_WINDOWS]
+
+    # 2. RSI (simple 14-bar average of gains and losses)
+    delta = np.diff(aligned[-(RSI_WINDOW + 1):], axis=0)
+    gain = np.where(delta > 0, delta, 0.0).mean(axis=0)
+    loss = np.where(delta < 0, -delta, 0.0).mean(axis=0)
+
+    return score_indicators(aligned[-1], moving_averages, _rsi(gain, loss)), counts
+
+def technical_signals(close_panel):
+    """
+    Computes the technical signal for every ticker of a (dates x tickers) close
+    frame in one vectorized pass. Returns a Series indexed by ticker.
+    """
+    if close_panel.empty:
+        return pd.Series(dtype=object)
+    scores, counts = compute_scores(close_panel.to_numpy(dtype=float))
+    signals = np.where(counts >= MIN_BARS, score_to_signal(scores), INSUFFICIENT_DATA)
+    return pd.Series(signals, index=close_panel.columns, dtype=object)
+
+def calculate_technical_summaries(tickers):
+    """
+    Calculates the technical summary for a whole watchlist at once and keeps
+    the result for subsequent calculate_technical_summary calls, until the
+    price store gets newer bars.
+    """
+    signals = technical_signals(get_close_panel(tickers))
+    signals = signals.reindex(list(tickers), fill_value=INSUFFICIENT_DATA)
+    last_dates = get_price_store().last_dates(list(tickers))
+    _watchlist_signals.update({t: (last_dates.get(t), signal) for t, signal in signals.items()})
+    return signals
+
+@instrumented
 def calculate_technical_summary(ticker_symbol):
     """
     Calculates a technical summary based on multiple indicators.
-    Returns: 'Strong Buy', 'Buy', 'Neutral', 'Sell', 'Strong Sell'
+    Returns: 'Compra Fuerte', 'Compra', 'Neutral', 'Venta', 'Venta Fuerte'
     """
     try:
-        ticker = yf.Ticker(ticker_symbol)
-        hist = ticker.history(period="6mo")
-        if len(hist) < 200:
-            return "Neutro (Datos insuficientes)"
-
-        close = hist['Close']
-        
-        # 1. Moving Averages
-        ma20 = close.rolling(window=20).mean().iloc[-1]
-        ma50 = close.rolling(window=50).mean().iloc[-1]
-        ma200 = close.rolling(window=200).mean().iloc[-1]
-        current_price = close.iloc[-1]
-        
-        scores = 0
-        
-        # Score based on price vs MAs
-        if current_price > ma20: scores += 1
-        else: scores -= 1
-        
-        if current_price > ma50: scores += 1
-        else: scores -= 1
-        
-        if current_price > ma200: scores += 1
-        else: scores -= 1
-        
-        # 2. RSI (Relative Strength Index)
-        delta = close.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs)).iloc[-1]
-        
-        if rsi < 30: scores += 2 # Oversold (Buy signal)
-        elif rsi > 70: scores -= 2 # Overbought (Sell signal)
-        
-        # Final Signal Logic
-        if scores >= 3: return "Compra Fuerte"
-        elif scores >= 1: return "Compra"
-        elif scores <= -3: return "Venta Fuerte"
-        elif scores <= -1: return "Venta"
-        else: return "Neutral"
-        
+        last_date = get_price_store().last_dates([ticker_symbol]).get(ticker_symbol)
+        memo = _watchlist_signals.get(ticker_symbol)
+        if memo is not None and memo[0] == last_date:
+            return memo[1]
+        closes = get_close_series(ticker_symbol)
+        if len(closes) < MIN_BARS:
+            return INSUFFICIENT_DATA
+        signal = technical_signals(closes.to_frame(ticker_symbol))[ticker_symbol]
+        _watchlist_signals[ticker_symbol] = (last_date, signal)
+        return signal
+
     except Exception as e:
         print(f"Error calculating technicals for {ticker_symbol}: {e}")
+        record_error("calculate_technical_summary", e)
         return "N/A"
+
+class _RollingWindow:
+    """Fixed-size window with a running sum; add/replace_last are O(1)."""
+
+    RESUM_EVERY = 1000  # Re-sum from scratch now and then to cancel float drift
+
+    def __init__(self, size):
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+        self._updates = 0
+
+    @property
+    def full(self):
+        return len(self.values) == self.values.maxlen
+
+    def add(self, value):
+        if self.full:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+        self._tick()
+
+    def replace_last(self, value):
+        self.total += value - self.values[-1]
+        self.values[-1] = value
+        self._tick()
+
+    def mean(self):
+        return self.total / len(self.values)
+
+    def _tick(self):
+        self._updates += 1
+        if self._updates >= self.RESUM_EVERY:
+            self.total = float(sum(self.values))
+            self._updates = 0
+
+class StreamingTechnicals:
+    """
+    Incremental version of the technical summary for live price updates.
+    Keeps running sums for MA20/50/200 and the 14-bar RSI gains/losses, so a
+    new tick costs O(1) instead of recomputing the windows over the history.
+    Uses the same simple RSI average as the batch engine, so both agree to
+    floating-point tolerance.
+    """
+
+    def __init__(self):
+        self.moving_averages = [_RollingWindow(w) for w in MA_WINDOWS]
+        self.gains = _RollingWindow(RSI_WINDOW)
+        self.losses = _RollingWindow(RSI_WINDOW)
+        self.bars = 0
+        self.last_date = None
+        self.history_date = None  # Last stored bar the state was seeded from
+        self._prev_close = None  # Close of the bar before the current one
+        self._last_close = None
+
+    @classmethod
+    def from_history(cls, closes):
+        """Seeds the state from a close Series (e.g. the stored daily history)."""
+        state = cls()
+        closes = closes.dropna()
+        for price in closes.iloc[-(MIN_BARS + 1):]:
+            state.push(price)
+        state.bars = len(closes)
+        if len(closes):
+            state.last_date = state.history_date = pd.Timestamp(closes.index[-1]).normalize()
+        return state
+
+    def push(self, price, date=None):
+        """Appends a new bar."""
+        price = float(price)
+        for window in self.moving_averages:
+            window.add(price)
+        if self._last_close is not None:
+            delta = price - self._last_close
+            self.gains.add(max(delta, 0.0))
+            self.losses.add(max(-delta, 0.0))
+        self._prev_close, self._last_close = self._last_close, price
+        self.bars += 1
+        if date is not None:
+            self.last_date = pd.Timestamp(date).normalize()
+
+    def update(self, price):
+        """Revises the current bar with an intraday tick."""
+        if self._last_close is None:
+            return self.push(price)
+        price = float(price)
+        for window in self.moving_averages:
+            window.replace_last(price)
+        if self._prev_close is not None:
+            delta = price - self._prev_close
+            self.gains.replace_last(max(delta, 0.0))
+            self.losses.replace_last(max(-delta, 0.0))
+        self._last_close = price
+
+    def on_price(self, price, date=None):
+        """
+        Routes a live price by the market date of its bar: a later trading date
+        appends a bar, anything else (same date, or no date) revises the
+        current one, so weekend and holiday ticks never add bars.
+        """
+        date = pd.Timestamp(date).normalize() if date is not None else None
+        if date is not None and (self.last_date is None or date > self.last_date):
+            self.push(price, date)
+        else:
+            self.update(price)
+        return self.signal
+
+    def indicators(self):
+        """Returns the current price, moving averages and RSI."""
+        values = {"price": self._last_close}
+        for window, state in zip(MA_WINDOWS, self.moving_averages):
+            values[f"ma{window}"] = state.mean() if state.full else np.nan
+        values["rsi"] = float(_rsi(self.gains.mean(), self.losses.mean())) if self.gains.full else np.nan
+        return values
+
+    @property
+    def signal(self):
+        if self.bars < MIN_BARS or not self.gains.full:
+            return INSUFFICIENT_DATA
+        values = self.indicators()
+        score = score_indicators(
+            values["price"], [values[f"ma{w}"] for w in MA_WINDOWS], values["rsi"]
+        )
+        return score_to_signal(score).item()
+
+def _history_moved_past(state, stored):
+    """True when the store has a bar newer than both the live state and its seed."""
+    if stored is None:
+        return False
+    stored = pd.Timestamp(stored).normalize()
+    return all(d is None or stored > d for d in (state.last_date, state.history_date))
+
+def live_technical_summary(ticker_symbol, price, date=None):
+    """
+    Updates the ticker's live indicator state with a price whose bar is on
+    market date `date`, and returns the signal. The state is seeded from
+    stored history the first time it is used, and re-seeded once the store
+    has bars past the state's last date.
+    """
+    stored = get_price_store().last_dates([ticker_symbol]).get(ticker_symbol)
+    with _live_lock:
+        state = _live_technicals.get(ticker_symbol)
+    if state is None or _history_moved_past(state, stored):
+        # Seeding reads the panel; other tickers' ticks shouldn't wait on it
+        seeded = StreamingTechnicals.from_history(get_close_series(ticker_symbol))
+        with _live_lock:
+            state = _live_technicals.get(ticker_symbol)
+            if state is None or _history_moved_past(state, stored):
+                state = _live_technicals[ticker_symbol] = seeded
+    with _live_lock:
+        return state.on_price(price, date)
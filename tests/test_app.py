@@ -1,5 +1,11 @@
 import os
 import sys
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import urllib.request
 from unittest.mock import MagicMock
 import unittest
 from unittest.mock import patch
@@ -8,6 +14,13 @@ import pandas as pd
 # Add parent directory to path so we can import app
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# Keep test runs out of the app's persistent price store and shared cache
+os.environ["PRICE_STORE_PATH"] = os.path.join(tempfile.mkdtemp(), "prices.db")
+os.environ["PANEL_PATH"] = os.path.join(tempfile.mkdtemp(), "panel.json")
+os.environ["FUNDAMENTALS_STORE_PATH"] = os.path.join(tempfile.mkdtemp(), "fundamentals.db")
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["BACKGROUND_REFRESH"] = "0"
+
 # --- Mock Streamlit before importing app ---
 mock_st = MagicMock()
 
@@ -18,6 +31,14 @@ def cache_data_mock(**kwargs):
     return decorator
 
 mock_st.cache_data = cache_data_mock
+
+# Mock fragment to return the function itself, so fragment bodies run inline
+def fragment_mock(func=None, **kwargs):
+    if func is None:
+        return lambda f: f
+    return func
+
+mock_st.fragment = fragment_mock
 mock_st.set_page_config = MagicMock()
 mock_st.markdown = MagicMock()
 
@@ -65,9 +86,45 @@ import app
 import ui_helpers
 import valuation
 import data_provider
+import history_provider
+import technical_provider
+import cache_backend
+import market_daemon
+from benchmarks import run as benchmarks
+from benchmarks import loadtest
+import data_source
+import batch
+import screener
+import refresher
+import rate_limiter
+import metrics
+import tracing
+import economics_provider
+import fundamentals_provider
+from fundamentals_store import FundamentalsStore
+from price_store import PriceStore
+from panel_store import PanelStore
+import numpy as np
 
 class TestApp(unittest.TestCase):
 
+    def setUp(self):
+        self._store_dir = tempfile.TemporaryDirectory()
+        history_provider._price_store = PriceStore(os.path.join(self._store_dir.name, "prices.db"))
+        history_provider._panel = PanelStore(os.path.join(self._store_dir.name, "panel.json"))
+        fundamentals_provider._store = FundamentalsStore(os.path.join(self._store_dir.name, "fundamentals.db"))
+        technical_provider._watchlist_signals.clear()
+        cache_backend.set_backend(cache_backend.MemoryCache())
+        cache_backend.reset_cache_stats()
+
+    def tearDown(self):
+        history_provider._price_store = None
+        history_provider._panel = None
+        fundamentals_provider._store = None
+        data_source.set_source(None)
+        technical_provider._watchlist_signals.clear()
+        self._store_dir.cleanup()
+
     def test_format_large_number(self):
         self.assertEqual(ui_helpers.format_large_number(1_500_000_000_000), "1.5 T")
         self.assertEqual(ui_helpers.format_large_number(2_500_000_000), "2.5 B")
@@ -75,7 +132,7 @@ class TestApp(unittest.TestCase):
         self.assertEqual(ui_helpers.format_large_number(100), "100.00")
         self.assertEqual(ui_helpers.format_large_number(None), "-")
 
-    @patch('valuation.yf.Ticker')
+    @patch('data_source.yf.Ticker')
     def test_get_historical_pe(self, mock_ticker):
         # Setup mock
         mock_instance = mock_ticker.return_value
@@ -100,7 +157,581 @@ class TestApp(unittest.TestCase):
         self.assertEqual(avg_pe, 20.0)
         self.assertEqual(method, "5y Historical Avg")
 
-    @patch('data_provider.yf.Ticker')
+    def test_compute_historical_pe_matches_report_loop(self):
+        def reference_pe(history, eps_series):
+            # Per-report mask loop the as-of join replaces
+            values = []
+            for date, eps in eps_series.items():
+                mask = history.index <= pd.Timestamp(date)
+                if mask.any() and eps > 0:
+                    pe = history.loc[mask].iloc[-1] / eps
+                    if 0 < pe < 200:
+                        values.append(pe)
+            return sum(values) / len(values) if values else None
+
+        rng = np.random.default_rng(3)
+        dates = pd.bdate_range('2020-01-01', periods=1250)
+        panel = pd.DataFrame(
+            50 * np.exp(np.cumsum(rng.normal(0, 0.02, (1250, 4)), axis=0)),
+            index=dates, columns=["A", "B", "C", "D"]
+        )
+        panel.iloc[:600, 3] = np.nan  # Listed after the first reports
+        report_dates = pd.to_datetime(['2020-12-31', '2021-12-31', '2022-12-31', '2023-12-31', '2019-12-31'])
+        eps = {
+            "A": pd.Series([2.0, 2.5, 3.0, 3.5, 1.5], index=report_dates),
+            "B": pd.Series([-1.0, 0.1, 2.0, np.nan, 1.0], index=report_dates),  # Negative, outlier, missing
+            "C": pd.Series([0.01, 0.02, 0.01, 0.01, 0.01], index=report_dates),  # Only outliers
+            "D": pd.Series([1.0, 1.2, 1.4, 1.6, 1.0], index=report_dates),
+        }
+
+        result = valuation.compute_historical_pe(panel, valuation._eps_table(eps))
+
+        for ticker in ["A", "B", "D"]:
+            self.assertAlmostEqual(result[ticker], reference_pe(panel[ticker].dropna(), eps[ticker]), places=9)
+        self.assertNotIn("C", result.index)
+
+    @patch('data_source.yf.Ticker')
+    def test_financials_invalidated_by_earnings_date(self, mock_ticker):
+        now = time.time()
+        mock_ticker.return_value.financials = pd.DataFrame({pd.Timestamp('2023-12-31'): [5.0]}, index=['Basic EPS'])
+        info = {'mostRecentQuarter': 1700000000, 'earningsTimestamp': now + 30 * 86400}
+        fundamentals_provider.record_info("ACME", info)
+
+        fundamentals_provider.get_financials("ACME")
+        fundamentals_provider.get_financials("ACME")
+        self.assertEqual(mock_ticker.call_count, 1)  # Served from the store until the report
+
+        entry = fundamentals_provider.get_fundamentals_store().latest("ACME", "financials")
+        self.assertAlmostEqual(entry["valid_until"], now + 32 * 86400, delta=5)
+
+        # A new fiscal period in info invalidates the stored statements right away
+        fundamentals_provider.record_info("ACME", dict(info, mostRecentQuarter=1710000000))
+        fundamentals_provider.get_financials("ACME")
+        self.assertEqual(mock_ticker.call_count, 2)
+
+    @patch('data_source.yf.Ticker')
+    def test_market_fields_refresh_while_statements_wait_for_earnings(self, mock_ticker):
+        now = time.time()
+        stored = {
+            'mostRecentQuarter': 1700000000, 'earningsTimestamp': now + 60 * 86400,
+            'trailingEps': 5.0, 'targetMeanPrice': 120.0, 'currentPrice': 100.0
+        }
+        fundamentals_provider.record_info("ACME", stored)
+        mock_ticker.return_value.info = dict(stored, trailingEps=5.5, targetMeanPrice=150.0, currentPrice=110.0)
+
+        info = fundamentals_provider.get_fundamentals("ACME")
+        self.assertEqual(info['targetMeanPrice'], 150.0)
+        self.assertEqual(info['currentPrice'], 110.0)
+        self.assertEqual(info['trailingEps'], 5.0)  # Kept until the next report
+
+        # Market fields are cached for MARKET_TTL; refetching them leaves the valid stored copy alone
+        fundamentals_provider.get_fundamentals("ACME")
+        self.assertEqual(mock_ticker.call_count, 1)
+        fundamentals_provider.get_market_info.refresh("ACME")
+        self.assertEqual(mock_ticker.call_count, 2)
+        self.assertEqual(fundamentals_provider.get_fundamentals_store().latest("ACME", "info")["payload"], stored)
+
+    def test_reported_period_missing_is_rechecked_soon(self):
+        now = time.time()
+        previous = {"fiscal_period": "1700000000", "next_earnings": now - 3 * 86400}
+        info = {'mostRecentQuarter': 1700000000, 'earningsTimestamp': now + 90 * 86400}
+
+        period, _, valid_until = fundamentals_provider._validity(info, previous, now)
+
+        self.assertEqual(period, "1700000000")
+        self.assertEqual(valid_until, now + fundamentals_provider.RECHECK_SECONDS)
+
+    @patch('data_source.yf.download')
+    def test_load_watchlist_history(self, mock_download):
+        dates = pd.to_datetime(['2023-01-02', '2023-01-03'])
+        columns = pd.MultiIndex.from_product([['Close', 'Volume'], ['AAA', 'BBB']])
+        mock_download.return_value = pd.DataFrame(
+            [[10.0, None, 100, None], [11.0, 20.0, 110, 200]], index=dates, columns=columns
+        )
+
+        history_provider.load_watchlist_history(["BBB", "AAA"])
+        mock_download.assert_called_once()
+        self.assertEqual(mock_download.call_args[0][0], ["AAA", "BBB"])
+
+        aaa = history_provider.get_ticker_history("AAA")
+        bbb = history_provider.get_ticker_history("BBB")
+        self.assertEqual(list(aaa['Close']), [10.0, 11.0])
+        # Rows before the ticker's first bar are dropped from its slice
+        self.assertEqual(list(bbb['Close']), [20.0])
+
+    @patch('data_source.yf.download')
+    def test_close_panel_is_memory_mapped(self, mock_download):
+        dates = pd.to_datetime(['2023-01-02', '2023-01-03'])
+        columns = pd.MultiIndex.from_product([['Close', 'Volume'], ['AAA', 'BBB']])
+        mock_download.return_value = pd.DataFrame(
+            [[10.0, None, 100, None], [11.0, 20.0, 110, 200]], index=dates, columns=columns
+        )
+        closes = history_provider.load_watchlist_history(["AAA", "BBB"])
+        self.assertEqual(list(closes.columns), ["AAA", "BBB"])
+        self.assertTrue(np.isnan(closes.loc['2023-01-02', 'BBB']))
+
+        # A second reader (another worker) maps the same file read-only
+        reader = PanelStore(history_provider.get_panel().path)
+        series = reader.series("AAA")
+        self.assertIsInstance(series.values.base, np.memmap)
+        self.assertEqual(list(series), [10.0, 11.0])
+        self.assertEqual(list(reader.frame(["BBB"], field="Volume")["BBB"].dropna()), [200.0])
+        self.assertIsNone(reader.series("CCC"))
+
+        # Rewrites swap in a new file that readers pick up on their next access
+        history_provider.get_price_store().append("CCC", pd.DataFrame({"Close": [5.0]}, index=dates[:1]))
+        history_provider.rebuild_panel()
+        self.assertEqual(list(reader.series("CCC").dropna()), [5.0])
+        data_files = [f for f in os.listdir(self._store_dir.name) if f.endswith(".bin")]
+        self.assertEqual(len(data_files), 1)
+
+    def test_panel_update_writes_synced_tickers_in_place(self):
+        dates = pd.to_datetime(['2023-01-02', '2023-01-03'])
+        store = history_provider.get_price_store()
+        store.append("AAA", pd.DataFrame({"Close": [10.0, 11.0]}, index=dates))
+        store.append("BBB", pd.DataFrame({"Close": [20.0, 21.0]}, index=dates))
+        history_provider.rebuild_panel()
+        bin_files = lambda: sorted(f for f in os.listdir(self._store_dir.name) if f.endswith(".bin"))
+        original = bin_files()
+        reader = PanelStore(history_provider.get_panel().path)
+        mapped = reader.series("BBB")
+
+        # A new trading day for BBB goes into the spare rows of the same data file
+        store.append("BBB", pd.DataFrame({"Close": [22.0]}, index=pd.to_datetime(['2023-01-04'])))
+        with patch.object(store, 'load_fields', wraps=store.load_fields) as load_fields:
+            history_provider.rebuild_panel(["BBB"])
+        load_fields.assert_called_once_with(history_provider.PANEL_FIELDS, ["BBB"])
+        self.assertEqual(bin_files(), original)
+        self.assertEqual(list(reader.series("AAA").dropna()), [10.0, 11.0])
+        self.assertEqual(list(reader.series("BBB")), [20.0, 21.0, 22.0])
+
+        # Revised bars are visible through mappings readers already hold
+        store.append("BBB", pd.DataFrame({"Close": [21.5]}, index=dates[1:]))
+        history_provider.rebuild_panel(["BBB"])
+        self.assertEqual(list(mapped), [20.0, 21.5])
+
+        # Another process's data file, written but not swapped in yet, must survive a rewrite
+        in_flight = os.path.join(self._store_dir.name, "panel.999.bin")
+        open(in_flight, "wb").close()
+        store.append("CCC", pd.DataFrame({"Close": [5.0]}, index=dates[:1]))
+        history_provider.rebuild_panel(["CCC"])  # A new ticker rewrites the panel
+        self.assertEqual(list(reader.series("CCC").dropna()), [5.0])
+        self.assertEqual(list(reader.series("BBB")), [20.0, 21.5, 22.0])
+        data_files = bin_files()
+        self.assertEqual(len(data_files), 2)
+        self.assertIn("panel.999.bin", data_files)
+        self.assertNotIn(original[0], data_files)
+
+    @patch('history_provider.STORE_REFRESH_SECONDS', 0)
+    @patch('data_source.yf.download')
+    def test_sync_history_incremental(self, mock_download):
+        columns = pd.MultiIndex.from_product([['Close'], ['AAA', 'BBB']])
+        mock_download.return_value = pd.DataFrame(
+            [[10.0, 20.0], [11.0, 21.0]], index=pd.to_datetime(['2023-01-02', '2023-01-03']), columns=columns
+        )
+        history_provider.sync_history(["AAA", "BBB"])
+
+        # Second sync only asks for bars from the last stored date onwards
+        mock_download.return_value = pd.DataFrame(
+            [[11.5, 21.5], [12.0, 22.0]], index=pd.to_datetime(['2023-01-03', '2023-01-04']), columns=columns
+        )
+        history_provider.sync_history(["AAA", "BBB"])
+
+        self.assertEqual(mock_download.call_args.kwargs['start'], '2023-01-03')
+        self.assertNotIn('period', mock_download.call_args.kwargs)
+        stored = history_provider.get_price_store().load("AAA")
+        self.assertEqual(list(stored['Close']), [10.0, 11.5, 12.0])
+
+    @patch('history_provider.STORE_REFRESH_SECONDS', 0)
+    @patch('data_source.yf.Ticker')
+    @patch('data_source.yf.download')
+    def test_sync_history_reloads_after_dividends_and_prunes_old_bars(self, mock_download, mock_ticker):
+        columns = pd.MultiIndex.from_product([['Close', 'Dividends'], ['AAA', 'BBB']])
+        dates = pd.to_datetime(['2023-01-02', '2023-01-03'])
+        mock_download.return_value = pd.DataFrame([[10.0, 20.0, 0, 0], [11.0, 21.0, 0, 0]], index=dates, columns=columns)
+        history_provider.sync_history(["AAA", "BBB"])
+
+        # AAA goes ex-dividend: its earlier closes are re-adjusted upstream, so the window is reloaded
+        mock_download.return_value = pd.DataFrame(
+            [[11.0, 21.0, 0, 0], [12.0, 22.0, 0.5, 0]], index=pd.to_datetime(['2023-01-03', '2023-01-04']), columns=columns
+        )
+        mock_ticker.return_value.history.return_value = pd.DataFrame(
+            {"Close": [9.5, 10.5, 12.0], "Dividends": [0, 0, 0.5]}, index=pd.to_datetime(['2023-01-02', '2023-01-03', '2023-01-04'])
+        )
+        history_provider.sync_history(["AAA", "BBB"])
+        mock_ticker.assert_called_once_with("AAA")
+        self.assertEqual(mock_ticker.return_value.history.call_args.kwargs['period'], history_provider.HISTORY_PERIOD)
+        self.assertEqual(list(history_provider.get_price_store().load("AAA")['Close']), [9.5, 10.5, 12.0])
+
+        store = history_provider.get_price_store()
+        store.append("BBB", pd.DataFrame({"Close": [23.0]}, index=pd.to_datetime(['2023-01-05'])), keep_from='2023-01-03')
+        self.assertEqual(list(store.load("BBB").index.strftime('%Y-%m-%d')), ['2023-01-03', '2023-01-04', '2023-01-05'])
+        self.assertEqual(history_provider.history_start("6mo", pd.Timestamp('2024-08-31')), pd.Timestamp('2024-02-29'))
+        self.assertIsNone(history_provider.history_start("max"))
+
+    @patch('data_source.yf.download')
+    def test_sync_history_marks_tickers_without_bars_checked(self, mock_download):
+        columns = pd.MultiIndex.from_product([['Close'], ['AAA']])
+        mock_download.return_value = pd.DataFrame([[10.0]], index=pd.to_datetime(['2023-01-02']), columns=columns)
+        history_provider.sync_history(["AAA", "GONE"])
+        history_provider.sync_history(["AAA", "GONE"])
+
+        # GONE came back empty from a successful request: not downloaded again on the next rerun
+        self.assertEqual(mock_download.call_count, 1)
+        self.assertTrue(history_provider.get_price_store().load("GONE").empty)
+
+        # A failed request leaves tickers unchecked, so they are retried
+        mock_download.side_effect = ConnectionError("offline")
+        with patch('history_provider.print'):
+            history_provider.sync_history(["NEW1", "NEW2"])
+        self.assertEqual(history_provider.get_price_store().checked_at(["NEW1", "NEW2"]), {})
+
+    def test_memoized_signal_follows_new_stored_bars(self):
+        store = history_provider.get_price_store()
+        dates = pd.bdate_range('2023-01-02', periods=260)
+        store.append("AAA", pd.DataFrame({"Close": np.linspace(50, 150, 260), "Volume": 1e6}, index=dates))
+        history_provider.rebuild_panel()
+        self.assertEqual(technical_provider.calculate_technical_summaries(["AAA"])["AAA"], "Compra")
+
+        # A crash stored after the batch pass: the memo no longer matches the last stored bar
+        crash = pd.bdate_range(dates[-1] + pd.offsets.BDay(), periods=30)
+        store.append("AAA", pd.DataFrame({"Close": np.linspace(140, 40, 30), "Volume": 1e6}, index=crash))
+        history_provider.rebuild_panel(["AAA"])
+        expected = technical_provider.technical_signals(history_provider.get_close_panel(["AAA"]))["AAA"]
+        self.assertNotEqual(expected, "Compra")
+        self.assertEqual(technical_provider.calculate_technical_summary("AAA"), expected)
+
+    def test_technical_signals_match_rolling_reference(self):
+        def reference_signal(close):
+            # Per-ticker pandas rolling implementation the engine replaces
+            price = close.iloc[-1]
+            scores = sum(1 if price > close.rolling(w).mean().iloc[-1] else -1 for w in (20, 50, 200))
+            delta = close.diff()
+            gain = delta.where(delta > 0, 0).rolling(14).mean()
+            loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+            rsi = 100 - (100 / (1 + gain / loss)).iloc[-1]
+            if rsi < 30: scores += 2
+            elif rsi > 70: scores -= 2
+            if scores >= 3: return "Compra Fuerte"
+            if scores >= 1: return "Compra"
+            if scores <= -3: return "Venta Fuerte"
+            if scores <= -1: return "Venta"
+            return "Neutral"
+
+        rng = np.random.default_rng(7)
+        dates = pd.bdate_range('2022-01-03', periods=320)
+        panel = pd.DataFrame(
+            100 * np.exp(np.cumsum(rng.normal(0, 0.02, (320, 6)), axis=0)),
+            index=dates, columns=[f"T{i}" for i in range(6)]
+        )
+        panel.iloc[:200, 4] = np.nan   # Recent listing: only 120 bars
+        panel.iloc[[50, 90], 5] = np.nan  # Gaps in the middle of the series
+
+        signals = technical_provider.technical_signals(panel)
+
+        for ticker in panel.columns[[0, 1, 2, 3, 5]]:
+            self.assertEqual(signals[ticker], reference_signal(panel[ticker].dropna()), ticker)
+        self.assertEqual(signals["T4"], "Neutro (Datos insuficientes)")
+
+    def test_streaming_technicals_match_batch(self):
+        rng = np.random.default_rng(11)
+        dates = pd.bdate_range('2022-01-03', periods=320)
+        closes = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.02, 320))), index=dates)
+
+        state = technical_provider.StreamingTechnicals.from_history(closes.iloc[:250])
+        for i in range(250, 320):
+            signal = state.on_price(closes.iloc[i], dates[i])
+            window = closes.iloc[:i + 1]
+            self.assertEqual(signal, technical_provider.technical_signals(window.to_frame("T"))["T"])
+
+            values = state.indicators()
+            self.assertAlmostEqual(values["ma20"], window.iloc[-20:].mean(), places=9)
+            self.assertAlmostEqual(values["ma200"], window.iloc[-200:].mean(), places=9)
+
+        # An intraday tick revises the current bar instead of adding one
+        revised = closes.copy()
+        revised.iloc[-1] *= 0.9
+        signal = state.on_price(revised.iloc[-1], dates[-1])
+        self.assertEqual(state.bars, 320)
+        self.assertEqual(signal, technical_provider.technical_signals(revised.to_frame("T"))["T"])
+        self.assertAlmostEqual(state.indicators()["ma50"], revised.iloc[-50:].mean(), places=9)
+
+    def test_live_technicals_follow_market_dates_and_reseed(self):
+        rng = np.random.default_rng(5)
+        dates = pd.bdate_range(end='2026-10-16', periods=300)  # Ends on a Friday
+        closes = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.02, 300))), index=dates)
+        store = MagicMock()
+        store.last_dates.return_value = {"LIVE": dates[-1]}
+        technical_provider._live_technicals.pop("LIVE", None)
+
+        with patch('technical_provider.get_price_store', return_value=store), \
+             patch('technical_provider.get_close_series', return_value=closes) as series:
+            # Weekend ticks still carry Friday's market date: they revise Friday's bar
+            for tick in (101.0, 102.0):
+                technical_provider.live_technical_summary("LIVE", tick, dates[-1])
+            state = technical_provider._live_technicals["LIVE"]
+            self.assertEqual((state.bars, state.indicators()["price"]), (300, 102.0))
+
+            # Monday's quote opens a bar; the store catching up to Monday doesn't re-seed
+            monday = pd.Timestamp('2026-10-19')
+            technical_provider.live_technical_summary("LIVE", 103.0, monday)
+            store.last_dates.return_value = {"LIVE": monday}
+            technical_provider.live_technical_summary("LIVE", 104.0, monday)
+            self.assertEqual(technical_provider._live_technicals["LIVE"].bars, 301)
+            self.assertEqual(series.call_count, 1)
+
+            # A store that moved past the live state (e.g. the process missed Tuesday) re-seeds it
+            extended = pd.concat([closes, pd.Series([103.0, 105.0], index=[monday, monday + pd.Timedelta(days=1)])])
+            series.return_value = extended
+            store.last_dates.return_value = {"LIVE": extended.index[-1]}
+            technical_provider.live_technical_summary("LIVE", 105.0, extended.index[-1])
+        self.assertEqual(series.call_count, 2)
+        self.assertEqual(technical_provider._live_technicals.pop("LIVE").bars, 302)
+
+    def test_shared_cache_across_backends(self):
+        calls = []
+
+        @cache_backend.shared_cache(ttl=60, name="double")
+        def double(x):
+            calls.append(x)
+            return x * 2
+
+        # Two SQLite handles on one file behave like two worker processes
+        path = os.path.join(self._store_dir.name, "cache.db")
+        cache_backend.set_backend(cache_backend.SQLiteCache(path))
+        self.assertEqual(double(2), 4)
+        cache_backend.set_backend(cache_backend.SQLiteCache(path))
+        self.assertEqual(double(2), 4)
+        self.assertEqual(calls, [2])
+        self.assertEqual(cache_backend.cache_stats()["double"], {"hits": 1, "misses": 1, "coalesced": 0, "stale": 0, "errors": 0})
+
+        double.clear()
+        double(2)
+        self.assertEqual(calls, [2, 2])
+
+        # Expired entries are misses
+        cache_backend.get_backend().set("short", "v", ttl=-1)
+        self.assertEqual(cache_backend.get_backend().get("short"), (False, None))
+
+    @patch('data_source.yf.Ticker')
+    def test_concurrent_misses_share_one_upstream_call(self, mock_ticker):
+        release = threading.Event()
+        calls = []
+
+        def slow_info():
+            calls.append(1)
+            release.wait(5)
+            return {'regularMarketPrice': 10.0, 'shortName': 'Coalesced'}
+
+        type(mock_ticker.return_value).info = property(lambda self: slow_info())
+
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            futures = [executor.submit(data_provider.get_etf_data, "SHARED") for _ in range(20)]
+            while cache_backend._flights.in_flight() == 0:
+                time.sleep(0.01)
+            time.sleep(0.1)  # Let the other sessions queue behind the in-flight call
+            release.set()
+            results = [f.result() for f in futures]
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r['Nombre'] == 'Coalesced' for r in results))
+        stats = cache_backend.cache_stats()["get_etf_data"]
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"] + stats["coalesced"], 19)
+
+    def test_stale_entries_are_served_while_revalidating(self):
+        release = threading.Event()
+        values = iter(["old", "new"])
+
+        @cache_backend.shared_cache(ttl=0.05, stale_ttl=60, name="quote")
+        def quote():
+            value = next(values)
+            if value == "new":
+                release.wait(5)
+            return value
+
+        self.assertEqual(quote(), "old")
+        time.sleep(0.1)
+        # Expired: the previous value comes back right away, refresh runs behind it
+        self.assertEqual(quote(), "old")
+        release.set()
+        deadline = time.time() + 5
+        while quote.age() > 0.05 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(quote(), "new")
+        self.assertGreaterEqual(cache_backend.cache_stats()["quote"]["stale"], 1)
+
+    @patch('refresher.load_tickers', return_value={"stocks": [], "etfs": ["VOO", "SPY"], "crypto": []})
+    def test_refresh_watchlist_only_refreshes_due_entries(self, _):
+        with patch.object(data_provider.get_etf_data, 'refresh') as refresh_etf, \
+             patch.object(refresher.get_market_summary, 'refresh') as refresh_summary, \
+             patch.object(data_provider.get_etf_data, 'age', side_effect=lambda t: 10 if t == "VOO" else None), \
+             patch.object(refresher.get_market_summary, 'age', return_value=1790):
+            refreshed = refresher.refresh_watchlist()
+
+        # SPY is missing and the summary is within REFRESH_LEAD of expiry; VOO is fresh
+        self.assertEqual(refreshed, 2)
+        refresh_etf.assert_called_once_with("SPY")
+        refresh_summary.assert_called_once_with()
+
+    @patch('rate_limiter.time.sleep')
+    def test_call_upstream_backs_off_on_throttling(self, mock_sleep):
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise Exception("429 Client Error: Too Many Requests")
+            return "ok"
+
+        limiter = rate_limiter.AdaptiveConcurrency(initial=8)
+        with patch('rate_limiter.upstream_concurrency', limiter):
+            self.assertEqual(rate_limiter.call_upstream(flaky), "ok")
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(limiter.limit, 2)  # Halved on each throttle
+        self.assertEqual(limiter.in_flight, 0)
+
+        # Non-transient errors are not retried
+        with self.assertRaises(ValueError):
+            rate_limiter.call_upstream(lambda: (_ for _ in ()).throw(ValueError("bad ticker")))
+
+    @patch('rate_limiter.time.sleep')
+    @patch('data_source.yf.Ticker')
+    def test_throttled_fetch_is_not_cached(self, mock_ticker, _):
+        type(mock_ticker.return_value).info = property(
+            lambda self: (_ for _ in ()).throw(Exception("Too Many Requests. Rate limited."))
+        )
+        self.assertEqual(data_provider.fetch_concurrently(["THROTTLED"], data_provider.get_etf_data), [])
+        self.assertIsNone(data_provider.get_etf_data.age("THROTTLED"))
+
+    def test_fetch_misses_are_counted_and_logged_truncated(self):
+        def no_data(ticker):
+            return None
+
+        tickers = [f"T{i}" for i in range(25)]
+        before = metrics.fetch_misses.values().get(("no_data",), 0)
+        with patch('builtins.print') as mock_print:
+            self.assertEqual(data_provider.fetch_concurrently(tickers, no_data), [])
+        self.assertEqual(metrics.fetch_misses.values()[("no_data",)] - before, 25)
+        line = mock_print.call_args[0][0]
+        self.assertIn("No data for 25 tickers", line)
+        self.assertIn("T9 and 15 more", line)
+        self.assertNotIn("T10", line)
+
+    def test_adaptive_concurrency_grows_on_fast_calls(self):
+        limiter = rate_limiter.AdaptiveConcurrency(initial=2, max_limit=4, target_latency=1.0)
+        for _ in range(2):
+            limiter.on_success(0.1)
+        self.assertEqual(limiter.limit, 3)
+        limiter.on_success(5.0)  # Slow call
+        self.assertEqual(limiter.limit, 2)
+
+    def test_stream_concurrently_yields_fastest_first_and_flags_timeouts(self):
+        delays = {"SLOW": 1.0, "MID": 0.1, "FAST": 0.0}
+
+        def fetch(ticker):
+            time.sleep(delays[ticker])
+            return {"Ticker": ticker}
+
+        events = list(data_provider.stream_concurrently(
+            ["SLOW", "MID", "FAST"], fetch, ticker_timeout=0.5, total_budget=5
+        ))
+
+        self.assertEqual([e[0] for e in events], ["FAST", "MID", "SLOW"])
+        self.assertEqual(events[2], ("SLOW", None, True))
+
+        rows = ui_helpers.render_streaming_dataframe(iter(events), ["SLOW", "MID", "FAST"], MagicMock())
+        self.assertEqual(rows["SLOW"]["Estado"], "Pendiente")
+        self.assertEqual(rows["FAST"], {"Ticker": "FAST"})
+
+    @patch('data_source.yf.download')
+    def test_market_summary_single_batched_download(self, mock_download):
+        dates = pd.to_datetime(['2024-03-01', '2024-03-02', '2024-03-04'])
+        columns = pd.MultiIndex.from_product([['Close'], ['^GSPC', 'BTC-USD', 'NEW']])
+        mock_download.return_value = pd.DataFrame(
+            [[100.0, 60000.0, None], [None, 61000.0, None], [102.0, 63000.0, 5.0]],
+            index=dates, columns=columns
+        )
+        symbols = {"^GSPC": "S&P 500", "BTC-USD": "Bitcoin", "NEW": "Listed today", "GONE": "Missing"}
+
+        summary = economics_provider.get_market_summary(symbols)
+
+        mock_download.assert_called_once()
+        self.assertEqual(mock_download.call_args[0][0], list(symbols))
+        self.assertEqual([item['symbol'] for item in summary], ["S&P 500", "Bitcoin", "Listed today"])
+        # Weekend gaps are skipped per symbol
+        self.assertEqual(summary[0]['change'], 2.0)
+        self.assertEqual(summary[0]['change_pct'], 2.0)
+        self.assertEqual(summary[1]['change'], 2000.0)
+        self.assertEqual(summary[2]['change_pct'], 0)
+
+    def test_throttled_market_summary_is_not_cached(self):
+        symbols = {"^GSPC": "S&P 500"}
+        with patch('economics_provider.call_upstream', side_effect=rate_limiter.UpstreamThrottled("429")):
+            with self.assertRaises(rate_limiter.UpstreamThrottled):
+                economics_provider.get_market_summary(symbols)
+            self.assertIsNone(economics_provider.get_market_summary.age(symbols))
+
+            # The page shows an empty tape for this rerun instead of failing
+            with patch('app.get_daemon_client', return_value=None):
+                self.assertEqual(app.load_market_summary(), [])
+
+    def test_economic_calendar_goes_through_the_rate_limiter(self):
+        economics_provider.get_economic_calendar.clear()
+        with patch('economics_provider.call_upstream', side_effect=rate_limiter.UpstreamThrottled("429")) as upstream:
+            with self.assertRaises(rate_limiter.UpstreamThrottled):
+                economics_provider.get_economic_calendar()
+            self.assertIsNone(economics_provider.get_economic_calendar.age())
+
+            with patch('app.get_daemon_client', return_value=None):
+                calendar = app.load_economic_calendar()
+        self.assertTrue(calendar.empty)
+        self.assertEqual(list(calendar.columns), economics_provider.CALENDAR_COLUMNS)
+        self.assertEqual(upstream.call_args[0][0].__name__, "economic_calendar")
+
+    def test_kept_cache_entries_are_served_stale_past_their_lifetime(self):
+        calls = []
+
+        @cache_backend.shared_cache(ttl=10, stale_ttl=10, name="kept")
+        def compute(x):
+            calls.append(x)
+            return len(calls)
+
+        self.assertEqual(compute("A"), 1)
+        self.assertTrue(compute.keep(3600, "A"))
+        self.assertFalse(compute.keep(3600, "B"))
+
+        # Long past ttl + stale_ttl, the kept entry is still served (and revalidated in the background)
+        later = time.time() + 600
+        with patch('cache_backend.time.time', return_value=later):
+            self.assertEqual(compute("A"), 1)
+        deadline = time.monotonic() + 2
+        while len(calls) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(calls, ["A", "A"])
+
+    def test_redis_cache_with_stand_in_client(self):
+        class StandInRedis:
+            def __init__(self):
+                self.data = {}
+            def get(self, key):
+                return self.data.get(key)
+            def set(self, key, value, px=None):
+                self.data[key] = value
+            def scan_iter(self, match):
+                return [k for k in self.data if k.startswith(match.rstrip("*"))]
+            def delete(self, *keys):
+                for k in keys:
+                    self.data.pop(k, None)
+
+        backend = cache_backend.RedisCache(client=StandInRedis())
+        backend.set("get_stock_data:abc", {"Ticker": "AAPL"}, ttl=900)
+        self.assertEqual(backend.get("get_stock_data:abc"), (True, {"Ticker": "AAPL"}))
+        backend.delete_prefix("get_stock_data:")
+        self.assertEqual(backend.get("get_stock_data:abc"), (False, None))
+
+    @patch('data_source.yf.Ticker')
     def test_get_stock_data_valid(self, mock_ticker):
         mock_instance = mock_ticker.return_value
         
@@ -133,6 +764,55 @@ class TestApp(unittest.TestCase):
         self.assertEqual(result['Precio Actual'], 150.0)
         self.assertIsNotNone(result['Valor Justo'])
 
+    def test_combine_stock_row_reprices_from_fresh_quote(self):
+        fundamentals = {
+            "Ticker": "ACME", "Nombre": "Acme", "Precio Ref": 100.0, "Valor Justo": 150.0,
+            "Market Cap": 1000.0, "Div Yield": 0.022, "P/E": 20.0, "P/B": 4.0, "P/S (TTM)": None,
+            "EV": 1200.0, "Deuda/Eq": 0.5, "Técnico": "Neutral", "Modelos": "Analyst Target: $150.00"
+        }
+        quote = {"price": 110.0, "previous_close": 100.0, "change_pct": 0.1}
+
+        row = data_provider.combine_stock_row(fundamentals, quote, live_signal="Compra")
+
+        self.assertEqual(list(row)[:7], ["Ticker", "Nombre", "Precio Actual", "Cambio %", "Valor Justo", "Potencial", "Estado"])
+        self.assertEqual(row["Precio Actual"], 110.0)
+        self.assertAlmostEqual(row["Potencial"], 40 / 110)
+        self.assertEqual(row["Estado"], "Infravalorada")
+        self.assertAlmostEqual(row["Market Cap"], 1100.0)
+        self.assertAlmostEqual(row["P/E"], 22.0)
+        self.assertAlmostEqual(row["EV"], 1300.0)
+        self.assertAlmostEqual(row["Div Yield"], 0.02)
+        self.assertIsNone(row["P/S (TTM)"])
+        self.assertEqual(row["Técnico"], "Compra")
+        self.assertNotIn("Precio Ref", row)
+
+        # Without a quote the slow tier's own price is used
+        self.assertEqual(data_provider.combine_stock_row(fundamentals, None)["Estado"], "Infravalorada")
+
+    @patch('data_source.yf.download')
+    def test_fetch_quotes_batches_the_table_in_one_download(self, mock_download):
+        dates = pd.to_datetime(["2026-10-15", "2026-10-16"])
+        mock_download.return_value = pd.concat({
+            "Close": pd.DataFrame({"ACME": [100.0, 105.0], "GONE": [np.nan, np.nan]}, index=dates)
+        }, axis=1)
+
+        key = data_provider.quote_key(["ACME", "GONE", "ACME"])
+        quotes = data_provider.fetch_quotes(key)
+        data_provider.fetch_quotes(key)
+
+        self.assertEqual(key, ("ACME", "GONE"))
+        self.assertEqual(quotes["ACME"]["price"], 105.0)
+        self.assertAlmostEqual(quotes["ACME"]["change_pct"], 0.05)
+        self.assertEqual(quotes["ACME"]["date"], pd.Timestamp("2026-10-16"))
+        self.assertNotIn("GONE", quotes)
+        self.assertEqual(mock_download.call_count, 1)  # One request for the table; the second call is cached
+
+        # Every row of the table reuses the batch instead of fetching its own quote
+        with patch('data_provider.get_stock_data') as get_stock_data:
+            data_provider.row_function("stocks", ["GONE", "ACME"])("ACME")
+        get_stock_data.assert_called_once_with("ACME", quotes)
+        self.assertEqual(mock_download.call_count, 1)
+
     def test_load_tickers_migration(self):
         # Test 1: File stores a list (legacy)
         with patch("builtins.open", unittest.mock.mock_open(read_data='["AAPL", "TSLA"]')):
@@ -153,7 +833,7 @@ class TestApp(unittest.TestCase):
                 self.assertEqual(tickers["etfs"], ["VOO"])
                 self.assertEqual(tickers["crypto"], ["BTC-USD"])
 
-    @patch('data_provider.yf.Ticker')
+    @patch('data_source.yf.Ticker')
     def test_get_etf_data(self, mock_ticker):
         mock_instance = mock_ticker.return_value
         mock_instance.info = {
@@ -175,7 +855,7 @@ class TestApp(unittest.TestCase):
         self.assertIsNotNone(result['Estado'])
         self.assertEqual(result['Expense Ratio'], 0.0003)
 
-    @patch('data_provider.yf.Ticker')
+    @patch('data_source.yf.Ticker')
     def test_get_crypto_data(self, mock_ticker):
         mock_instance = mock_ticker.return_value
         mock_instance.info = {
@@ -250,5 +930,451 @@ class TestApp(unittest.TestCase):
         except Exception as e:
              self.fail(f"Main execution raised exception: {e}")
 
+    def test_live_mode_fragments(self):
+        mock_st.session_state.pop("live_refresh", None)
+        self.assertIsNone(app.live_interval())
+
+        mock_st.session_state.live_refresh = True
+        mock_st.session_state.live_interval = 30
+        try:
+            self.assertEqual(app.live_interval(), 30)
+            with patch('app.get_live_market_summary', return_value=[]) as live, \
+                 patch('app.get_market_summary') as slow, \
+                 patch('app.render_ticker_tape'):
+                app.live_ticker_tape()
+            live.assert_called_once()
+            slow.assert_not_called()
+
+            # A page run renders the summary main() loaded; the next tick reloads
+            summary = [{"symbol": "S&P 500", "price": 5000.0, "change": 10.0, "change_pct": 0.2}]
+            mock_st.session_state.page_run = mock_st.session_state.get("page_run", 0) + 1
+            with patch('app.load_market_summary', return_value=[]) as load, \
+                 patch('app.render_ticker_tape') as render:
+                app.live_ticker_tape(summary)
+                load.assert_not_called()
+                render.assert_called_once_with(summary)
+                app.live_ticker_tape(summary)
+                load.assert_called_once_with(live=True)
+        finally:
+            mock_st.session_state.pop("live_refresh", None)
+            mock_st.session_state.pop("live_interval", None)
+
+    def _wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("condition not met in time")
+            time.sleep(0.02)
+
+    def test_market_daemon_serves_fixture_snapshots(self):
+        provider = market_daemon.FixtureProvider(
+            {"stocks": {"AAPL": {"Ticker": "AAPL", "Precio Actual": 150.0}},
+             "crypto": {"BTC-USD": {"Ticker": "BTC-USD", "Precio": 60000.0}}},
+            market_summary=[{"symbol": "S&P 500", "price": 5000.0, "change": 10.0, "change_pct": 0.2}],
+            calendar=[{"Time": "14:30", "Currency": "USD", "Event": "CPI", "Importance": "High"}],
+            screener=[{"Ticker": "AAPL", "Potencial": 0.3}]
+        )
+        daemon = market_daemon.MarketDaemon(provider, interval=3600)
+        with patch('market_daemon.load_tickers', return_value={"stocks": [], "etfs": [], "crypto": ["BTC-USD"]}), \
+             patch.dict(os.environ, {"MARKET_DAEMON_AUTHKEY": "test-key"}):
+            address = daemon.start(("localhost", 0))
+            try:
+                client = data_provider.MarketDaemonClient(address)
+                # Unseen tickers are queued for the refresh loop instead of fetched on the request thread
+                self.assertEqual(client.rows("stocks", ["AAPL", "MISSING"]), {})
+                self._wait_for(lambda: len(client.rows("stocks", ["AAPL", "MISSING"])) == 2)
+                self.assertEqual(client.rows("stocks", ["AAPL", "MISSING"]),
+                                 {"AAPL": {"Ticker": "AAPL", "Precio Actual": 150.0}, "MISSING": None})
+                self.assertIsNone(client.rows("bonds", ["X"]))
+
+                self._wait_for(lambda: client.economic_calendar() is not None)
+                self.assertEqual(client.market_summary()[0]["symbol"], "S&P 500")
+                self.assertEqual(list(client.economic_calendar()["Event"]), ["CPI"])
+
+                # Screener runs happen in the background; sessions poll for the results
+                self._wait_for(lambda: client.screener("S&P 500")[0] == "done")
+                self.assertEqual(list(client.screener("S&P 500")[1]["Ticker"]), ["AAPL"])
+
+                # Requested tickers join the watchlist union and are refreshed with tickers.json
+                provider.fetched.clear()
+                daemon.refresh()
+                self.assertTrue({("stocks", "AAPL"), ("stocks", "MISSING"), ("crypto", "BTC-USD")}
+                                <= set(provider.fetched))
+                self.assertIn("BTC-USD", client.rows("crypto", ["BTC-USD"]))
+                client.close()
+            finally:
+                daemon.stop()
+
+    def test_daemon_requests_time_out_and_run_in_parallel(self):
+        release = threading.Event()
+
+        class SlowDaemon(market_daemon.MarketDaemon):
+            def market_summary(self):
+                release.wait(5)
+                return super().market_summary()
+
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("MARKET_DAEMON_AUTHKEY", None)
+            with self.assertRaises(RuntimeError):
+                market_daemon.MarketDaemon(market_daemon.FixtureProvider({})).start(("localhost", 0))
+            self.assertIsNone(data_provider.MarketDaemonClient(("localhost", 1)).market_summary())
+
+        daemon = SlowDaemon(market_daemon.FixtureProvider({"etfs": {"SPY": {"Ticker": "SPY"}}}), interval=3600)
+        with patch('market_daemon.load_tickers', return_value={}), \
+             patch.dict(os.environ, {"MARKET_DAEMON_AUTHKEY": "test-key"}):
+            address = daemon.start(("localhost", 0))
+            try:
+                client = data_provider.MarketDaemonClient(address, timeout=0.3)
+                # A stuck request gives up after the timeout instead of blocking the session forever...
+                started = time.monotonic()
+                self.assertIsNone(client.market_summary())
+                self.assertLess(time.monotonic() - started, 2)
+
+                # ...and doesn't hold up other sessions, which use their own connections
+                client = data_provider.MarketDaemonClient(address, timeout=5)
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    slow = executor.submit(client.market_summary)
+                    time.sleep(0.1)
+                    self.assertEqual(executor.submit(client.rows, "etfs", ["SPY"]).result(timeout=2), {})
+                    release.set()
+                    self.assertEqual(slow.result(), [])
+                self._wait_for(lambda: client.rows("etfs", ["SPY"]) == {"SPY": {"Ticker": "SPY"}})
+                client.close()
+            finally:
+                release.set()
+                daemon.stop()
+
+    def test_sessions_with_a_daemon_never_fetch_upstream(self):
+        fetch = MagicMock(return_value={"Ticker": "SPY"})
+        client = data_provider.MarketDaemonClient(("localhost", 1))
+        self.assertIsNone(client.rows("stocks", ["AAPL"]))
+
+        # An unreachable daemon shows every row as pending
+        with patch('data_provider.get_daemon_client', return_value=client), \
+             patch.dict(data_provider.ROW_FUNCTIONS, {"etfs": fetch}):
+            self.assertEqual(data_provider.fetch_rows("etfs", ["SPY"]), [data_provider.pending_row("SPY")])
+            self.assertEqual(list(data_provider.stream_rows("etfs", ["SPY"])), [("SPY", None, True)])
+        fetch.assert_not_called()
+
+        served = MagicMock()
+        served.rows.return_value = {"SPY": {"Ticker": "SPY", "Precio": 500.0}, "QQQ": None}
+        with patch('data_provider.get_daemon_client', return_value=served):
+            self.assertEqual(list(data_provider.stream_rows("etfs", ["SPY", "QQQ", "IWM"])),
+                             [("SPY", {"Ticker": "SPY", "Precio": 500.0}, False), ("QQQ", None, False), ("IWM", None, True)])
+            self.assertEqual(data_provider.fetch_rows("etfs", ["SPY", "QQQ", "IWM"]),
+                             [{"Ticker": "SPY", "Precio": 500.0}, data_provider.pending_row("IWM")])
+
+        # The calendar and screener come from the daemon too
+        served.economic_calendar.return_value = None
+        results = pd.DataFrame({"Ticker": ["AAPL"]})
+        with patch('app.get_daemon_client', return_value=served), patch('app.run_screener') as run_screener:
+            self.assertEqual(list(app.load_economic_calendar().columns), economics_provider.CALENDAR_COLUMNS)
+            served.screener.return_value = ("pending", None)
+            self.assertIsNone(app.load_screener("S&P 500"))
+            served.screener.return_value = ("done", results)
+            self.assertIs(app.load_screener("S&P 500"), results)
+            served.screener.return_value = ("failed", "no constituents")
+            with self.assertRaises(RuntimeError):
+                app.load_screener("S&P 500")
+            run_screener.assert_not_called()
+
+    def test_session_snapshot_shared_between_pages(self):
+        mock_st.session_state.pop("snapshot", None)
+        rows = {"SPY": {"Ticker": "SPY", "Precio": 500.0}, "QQQ": {"Ticker": "QQQ", "Precio": 400.0}}
+        stream = MagicMock(side_effect=lambda kind, tickers: iter([(t, rows[t], False) for t in tickers]))
+        render = MagicMock()
+        try:
+            with patch('app.stream_rows', stream), patch('app.fetch_rows') as fetch:
+                app.live_asset_table("etfs", ["SPY", "QQQ"], render)
+                app.live_asset_table("etfs", ["SPY", "QQQ"], render)
+                self.assertEqual(stream.call_count, 1)
+                self.assertEqual(list(render.call_args[0][0]["Ticker"]), ["SPY", "QQQ"])
+
+                # The analysis page reads the same snapshot instead of refetching
+                self.assertEqual(app.load_rows("etfs", ["SPY", "QQQ"]), [rows["SPY"], rows["QQQ"]])
+                fetch.assert_not_called()
+
+                # A different watchlist, or an expired snapshot, loads again
+                app.live_asset_table("etfs", ["SPY"], render)
+                self.assertEqual(stream.call_count, 2)
+                with patch('app.SNAPSHOT_TTL', 0):
+                    app.live_asset_table("etfs", ["SPY"], render)
+                self.assertEqual(stream.call_count, 3)
+
+            # In live mode every tick of the fragment streams new quotes; a page rerun still reuses the snapshot
+            mock_st.session_state.live_refresh = True
+            mock_st.session_state.page_run = mock_st.session_state.get("page_run", 0) + 1
+            with patch('app.stream_rows', stream):
+                app.live_asset_table("etfs", ["SPY"], render)
+                app.live_asset_table("etfs", ["SPY"], render)
+                self.assertEqual(stream.call_count, 4)
+                mock_st.session_state.page_run += 1
+                app.live_asset_table("etfs", ["SPY"], render)
+                self.assertEqual(stream.call_count, 4)
+            mock_st.session_state.pop("live_refresh")
+
+            # Snapshots with pending rows aren't kept
+            pending = MagicMock(return_value=iter([("SPY", None, True)]))
+            with patch('app.stream_rows', pending):
+                app.live_asset_table("crypto", ["SPY"], render)
+            self.assertNotIn("crypto", mock_st.session_state.snapshot)
+        finally:
+            mock_st.session_state.pop("snapshot", None)
+            mock_st.session_state.pop("live_refresh", None)
+
+    def test_screener_ranks_universe_across_process_pool(self):
+        rng = np.random.default_rng(3)
+        dates = pd.bdate_range('2022-01-03', periods=260)
+        store = history_provider.get_price_store()
+        tickers = ["AAA", "BBB", "CCC", "DDD"]
+        for ticker in tickers:
+            closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+            store.append(ticker, pd.DataFrame({"Close": closes, "Volume": 1e6}, index=dates))
+        history_provider.rebuild_panel()
+
+        infos = {
+            "AAA": {"currentPrice": 100.0, "targetMeanPrice": 150.0, "trailingPE": 12.0, "shortName": "Aaa"},
+            "BBB": {"currentPrice": 100.0, "targetMeanPrice": 90.0, "trailingPE": 30.0},
+            "CCC": {"currentPrice": 100.0, "targetMeanPrice": 110.0, "trailingPE": 18.0, "trailingEps": 5.0},
+            "DDD": {"currentPrice": None}
+        }
+        inputs = (infos, {"CCC": 20.0})
+        with patch('screener.load_screener_inputs', return_value=inputs):
+            inline = screener.run_screener.__wrapped__(tickers)
+            with patch('screener.INLINE_LIMIT', 0):
+                pooled = screener.run_screener.__wrapped__(tickers, max_workers=2)
+
+        pd.testing.assert_frame_equal(pooled, inline)
+        df = pooled
+        self.assertEqual(list(df["Ticker"]), ["AAA", "CCC", "BBB"])
+        self.assertAlmostEqual(df.loc[1, "Valor Justo"], 105.0)  # Mean of target 110 and 5 EPS x 20 P/E
+        self.assertEqual(df.loc[0, "Estado"], "Infravalorada")
+        expected = technical_provider.technical_signals(history_provider.get_close_panel(["AAA"]))["AAA"]
+        self.assertEqual(df.loc[0, "Técnico"], expected)
+
+        self.assertEqual(list(screener.filter_results(df, min_potential=0.05)["Ticker"]), ["AAA", "CCC"])
+        self.assertEqual(list(screener.filter_results(df, max_pe=20)["Ticker"]), ["AAA", "CCC"])
+        self.assertEqual(screener.parse_tickers("aapl, msft;AAPL  nvda"), ["AAPL", "MSFT", "NVDA"])
+
+    def test_batch_cli_writes_results_and_timings(self):
+        rows = {
+            "AAA": {"Ticker": "AAA", "Precio Actual": 10.0, "Técnico": "Compra", "Modelos": "Analyst Target: $12.00"},
+            "BBB": {"Ticker": "BBB", "Precio Actual": 20.0, "Técnico": "Neutral", "Modelos": "Insufficient Data"}
+        }
+        tickers_file = os.path.join(self._store_dir.name, "universe.txt")
+        with open(tickers_file, "w") as f:
+            f.write("AAA\nBBB, MISSING\n")
+
+        with patch('batch.load_watchlist_history') as history, \
+             patch('batch.calculate_technical_summaries'), \
+             patch.object(batch.get_stock_fundamentals, 'keep') as keep, \
+             patch('data_provider.row_function', return_value=rows.get):
+            for output in ("out.parquet", "out.csv"):
+                path = os.path.join(self._store_dir.name, output)
+                self.assertEqual(batch.main([tickers_file, "-o", path]), 0)
+                df = pd.read_parquet(path) if output.endswith(".parquet") else pd.read_csv(path)
+                self.assertEqual(list(df["Ticker"]), ["AAA", "BBB"])
+
+        history.assert_called_with(["AAA", "BBB", "MISSING"])
+        keep.assert_called_with(batch.KEEP_HOURS * 3600, "MISSING")  # Rows outlive the night for the dashboard
+        with open(os.path.join(self._store_dir.name, "out.timings.json")) as f:
+            timings = json.load(f)
+        self.assertEqual((timings["tickers"], timings["rows"]), (3, 2))
+        self.assertGreaterEqual(timings["total_seconds"], timings["rows_seconds"])
+
+    def test_dispatched_sources_label_upstream_metrics_by_method(self):
+        class StubSource(data_source.DataSource):
+            def info(self, ticker):
+                return {"shortName": ticker}
+
+        source = data_source.FallbackSource(data_source.RecordingSource(StubSource(), self._store_dir.name), StubSource())
+        self.assertEqual(source.info.__name__, "info")
+        before = metrics.upstream_calls.values().get(("info",), 0)
+        rate_limiter.call_upstream(source.info, "VOO")
+        self.assertEqual(metrics.upstream_calls.values()[("info",)], before + 1)
+
+    def test_record_then_replay_etf_row(self):
+        class StubSource(data_source.DataSource):
+            def __init__(self):
+                self.calls = 0
+            def info(self, ticker):
+                self.calls += 1
+                if ticker == "DOWN":
+                    raise ConnectionError("Yahoo is down")
+                return {'regularMarketPrice': 400.0, 'shortName': 'Replayed', 'fiftyTwoWeekHigh': 440.0}
+
+        fixtures = os.path.join(self._store_dir.name, "fixtures")
+        stub = StubSource()
+        data_source.set_source(data_source.RecordingSource(stub, fixtures))
+        recorded = data_provider.get_etf_data.__wrapped__("VOO")
+
+        data_source.set_source(data_source.ReplaySource(fixtures, latency=0.05))
+        started = time.monotonic()
+        replayed = data_provider.get_etf_data.__wrapped__("VOO")
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(replayed["Nombre"], "Replayed")
+        self.assertEqual(stub.calls, 1)
+        with self.assertRaises(data_source.FixtureMissing):
+            data_source.get_source().info("UNSEEN")
+
+        # Degraded mode: failures of the live source are served from the fixtures
+        fallback = data_source.FallbackSource(stub, data_source.ReplaySource(fixtures))
+        with patch.object(stub, 'info', side_effect=ConnectionError("Yahoo is down")):
+            self.assertEqual(fallback.info("VOO")["shortName"], "Replayed")
+        with self.assertRaises(ConnectionError):
+            fallback.info("DOWN")
+
+    def test_benchmark_suite_writes_json_results(self):
+        output = os.path.join(self._store_dir.name, "bench.json")
+        with patch('rate_limiter.upstream_bucket', rate_limiter.TokenBucket(1e9, 1e9)), \
+             patch('benchmarks.run.print'):
+            self.assertEqual(benchmarks.main(["--tickers", "3", "--sizes", "4", "--rounds", "1", "--output", output]), 0)
+
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual(set(report["results"]), {
+            "get_stock_data", "fetch_concurrently[4]", "calculate_technical_summary",
+            "calculate_technical_summaries", "get_historical_pe", "get_economic_calendar"
+        })
+        self.assertEqual(report["results"]["fetch_concurrently[4]"]["items"], 4)
+        with patch('benchmarks.run.print'):
+            self.assertEqual(benchmarks.compare(output, output), [])
+
+    @patch('rate_limiter.time.sleep')
+    def test_metrics_count_provider_and_upstream_calls(self, mock_sleep):
+        before = metrics.upstream_calls.values().get(("flaky",), 0)
+        errors_before = metrics.upstream_errors.values().get(("flaky", "Exception"), 0)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 2:
+                raise Exception("429 Client Error: Too Many Requests")
+            return "ok"
+
+        with patch('rate_limiter.upstream_concurrency', rate_limiter.AdaptiveConcurrency()):
+            rate_limiter.call_upstream(flaky)
+        self.assertEqual(metrics.upstream_calls.values()[("flaky",)] - before, 2)
+        self.assertEqual(metrics.upstream_errors.values()[("flaky", "Exception")] - errors_before, 1)
+
+        @metrics.instrumented
+        def sample_provider(fail):
+            if fail:
+                raise KeyError("missing")
+            return 1
+
+        sample_provider(False)
+        with self.assertRaises(KeyError):
+            sample_provider(True)
+        metrics.record_error("sample_provider", ValueError("handled"))
+        self.assertEqual(metrics.provider_calls.values()[("sample_provider",)], 2)
+        self.assertEqual(metrics.provider_errors.values()[("sample_provider", "KeyError")], 1)
+        self.assertEqual(metrics.provider_errors.values()[("sample_provider", "ValueError")], 1)
+        series = metrics.provider_latency.values()[("sample_provider",)]
+        self.assertEqual(series["count"], 2)
+        self.assertEqual(sum(series["counts"]), 2)
+
+        rows = {row["Función"]: row for row in metrics.summary()["providers"]}
+        self.assertEqual(rows["sample_provider"]["Errores"], 2)
+
+    def test_histogram_quantiles_and_prometheus_exposition(self):
+        histogram = metrics.Histogram("test_latency_seconds", "Test latency", ("function",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.05, 0.5, 2.0):
+            histogram.observe(value, function="f")
+        series = histogram.values()[("f",)]
+        self.assertEqual(series["counts"], [2, 1, 1])
+        self.assertAlmostEqual(histogram.quantile(0.5, series), 0.1)
+        self.assertAlmostEqual(histogram.quantile(0.75, series), 1.0)
+        self.assertEqual(histogram.quantile(0.99, series), 1.0)
+        samples = {name + labels: value for name, labels, value in histogram.samples()}
+        self.assertEqual(samples['test_latency_seconds_bucket{function="f",le="1.0"}'], 3)
+        self.assertEqual(samples['test_latency_seconds_bucket{function="f",le="+Inf"}'], 4)
+        self.assertEqual(samples['test_latency_seconds_count{function="f"}'], 4)
+
+        cache_backend.reset_cache_stats()
+        cache_backend._record("get_quote", "hits")
+        server = metrics.start_metrics_server(0)
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(f"http://localhost:{port}/metrics") as response:
+                text = response.read().decode()
+        finally:
+            metrics.stop_metrics_server()
+        self.assertIn("# TYPE investing_provider_latency_seconds histogram", text)
+        self.assertIn('investing_cache_requests_total{function="get_quote",outcome="hits"} 1', text)
+
+    @patch('data_source.yf.Ticker')
+    def test_tracing_records_span_tree_across_pool_threads(self, mock_ticker):
+        mock_ticker.return_value.info = {'regularMarketPrice': 50.0, 'fiftyTwoWeekHigh': 60.0, 'shortName': 'Traced'}
+        tracing.clear_traces()
+
+        with tracing.trace("rerun", enabled=False):
+            self.assertIsNone(tracing.current_span())
+            data_provider.fetch_concurrently(["SKIP"], data_provider.get_etf_data)
+        self.assertEqual(tracing.recent_traces(), [])
+
+        with tracing.trace("rerun", page="Dashboard Principal"):
+            with tracing.trace("live_asset_table", kind="etfs"):
+                data_provider.fetch_concurrently(["VTI", "QQQ"], data_provider.get_etf_data)
+            with self.assertRaises(ValueError):
+                with tracing.span("render"):
+                    raise ValueError("bad frame")
+
+        current, = tracing.recent_traces()
+        spans = {(step.name, depth): step for step, depth in current.root.walk()}
+        self.assertEqual(current.root.attrs, {"page": "Dashboard Principal"})
+        self.assertIn(("live_asset_table", 1), spans)
+        for ticker in ("VTI", "QQQ"):
+            self.assertEqual(spans[(ticker, 2)].attrs["function"], "get_etf_data")
+            self.assertNotEqual(spans[(ticker, 2)].thread, current.root.thread)
+        self.assertIn(("get_etf_data", 3), spans)
+        self.assertIn(("upstream.info", 4), spans)
+        self.assertEqual(spans[("render", 1)].error, "ValueError")
+        self.assertTrue(all(step.end is not None for step, _ in current.root.walk()))
+
+        rows = tracing.waterfall(current)
+        self.assertEqual(rows[0]["Paso"], "rerun")
+        self.assertEqual(rows[0]["Inicio (ms)"], 0)
+        events = tracing.to_chrome_trace([current])["traceEvents"]
+        complete = [e for e in events if e["ph"] == "X"]
+        self.assertEqual(len(complete), len(rows))
+        self.assertEqual({e["name"] for e in events if e["ph"] == "M"}, {"process_name", "thread_name"})
+        json.dumps(events)
+
+    def test_trace_ring_buffer_keeps_the_latest_traces(self):
+        tracing.clear_traces()
+        with patch('tracing._traces', tracing.deque(maxlen=3)):
+            for i in range(5):
+                with tracing.trace("rerun", n=i):
+                    pass
+            self.assertEqual([t.root.attrs["n"] for t in tracing.recent_traces()], [4, 3, 2])
+
+    def test_load_test_counts_upstream_calls_and_summarizes_sessions(self):
+        source = loadtest.LatencySource(benchmarks.SyntheticSource())
+        source.info("AAPL")
+        source.info("MSFT")
+        source.quote("AAPL")
+        self.assertEqual(source.calls, {"info": 2, "quote": 1})
+
+        session = lambda latencies, error=None: {"latencies": latencies, "error": error}
+        level = loadtest.summarize(
+            [session([0.1, 0.2, 0.3, 0.4]), session([0.5, 0.6, 0.7, 0.8]), session([], error="Traceback ...")],
+            elapsed=2.0, upstream_calls={"info": 4, "quote": 4},
+            cache={"fetch_quotes": {"hits": 3, "misses": 8}}, peak_rss_mb=160.0, baseline_rss_mb=100.0
+        )
+
+        self.assertEqual(level["sessions"], 3)
+        self.assertEqual(level["failed_sessions"], 1)
+        self.assertEqual(level["reruns"], 8)
+        self.assertAlmostEqual(level["p50_s"], 0.45)
+        self.assertAlmostEqual(level["p99_s"], 0.793)
+        self.assertEqual(level["upstream_calls"], {"info": 4, "quote": 4})
+        self.assertAlmostEqual(level["upstream_calls_per_session"], 8 / 3)
+        self.assertEqual(level["cache"], {"fetch_quotes": {"hits": 3, "misses": 8}})
+        self.assertEqual(level["peak_rss_mb"], 160.0)
+        self.assertAlmostEqual(level["rss_per_session_mb"], 20.0)
+        self.assertIsNone(loadtest.summarize([], elapsed=0.0)["p95_s"])
+
 if __name__ == '__main__':
     unittest.main()
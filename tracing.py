@@ -0,0 +1,183 @@
+import os
+import time
+import random
+import itertools
+import threading
+import functools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+TRACE_BUFFER = int(os.environ.get("TRACE_BUFFER", 50))  # Finished traces kept per process
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 1.0))  # Share of enabled reruns that are traced
+
+class Span:
+    """One timed step of a trace; children may be added from worker threads."""
+
+    __slots__ = ("name", "attrs", "parent", "children", "start", "end", "thread", "error")
+
+    def __init__(self, name, parent=None, attrs=None):
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.parent = parent
+        self.children = []
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread = threading.current_thread().name
+        self.error = None
+
+    @property
+    def duration(self):
+        """Seconds; spans still running (e.g. a timed-out fetch) count up to now."""
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def walk(self, depth=0):
+        """Yields (span, depth) for this span and its descendants, in start order."""
+        yield self, depth
+        for child in sorted(list(self.children), key=lambda s: s.start):
+            yield from child.walk(depth + 1)
+
+class Trace:
+    """Span tree of one Streamlit rerun (or fragment rerun)."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name, attrs):
+        self.id = next(self._ids)
+        self.started_at = time.time()
+        self.root = Span(name, attrs=attrs)
+
+    @property
+    def name(self):
+        return self.root.name
+
+    @property
+    def duration(self):
+        return self.root.duration
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+_traces = deque(maxlen=TRACE_BUFFER)
+_traces_lock = threading.Lock()
+
+def enabled():
+    """Tracing for every session, set with TRACING=1 (sessions can also opt in with ?trace=1)."""
+    return os.environ.get("TRACING", "0") == "1"
+
+def current_span():
+    return _current.get()
+
+@contextmanager
+def span(name, parent=None, **attrs):
+    """
+    Times a step under the current span, or under `parent` (a span captured
+    before handing work to another thread). Does nothing outside a trace.
+    """
+    parent = parent or _current.get()
+    if parent is None:
+        yield None
+        return
+    step = Span(name, parent, attrs)
+    parent.children.append(step)
+    token = _current.set(step)
+    try:
+        yield step
+    except Exception as e:
+        step.error = type(e).__name__
+        raise
+    finally:
+        step.end = time.perf_counter()
+        _current.reset(token)
+
+@contextmanager
+def trace(name, enabled=True, **attrs):
+    """
+    Starts a trace, kept in the ring buffer when it finishes. Inside an active
+    trace (a fragment during a full rerun) it is just another span.
+    """
+    if _current.get() is not None:
+        with span(name, **attrs) as step:
+            yield step
+        return
+    if not enabled or random.random() >= TRACE_SAMPLE_RATE:
+        yield None
+        return
+    current = Trace(name, attrs)
+    token = _current.set(current.root)
+    try:
+        yield current.root
+    except Exception as e:
+        current.root.error = type(e).__name__
+        raise
+    finally:
+        current.root.end = time.perf_counter()
+        _current.reset(token)
+        with _traces_lock:
+            _traces.append(current)
+
+def traced(name=None):
+    """Decorator form of span()."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def annotate(**attrs):
+    """Adds attributes to the current span (e.g. the page a rerun ended up on)."""
+    step = _current.get()
+    if step is not None:
+        step.attrs.update(attrs)
+
+def recent_traces():
+    """Finished traces in the ring buffer, newest first."""
+    with _traces_lock:
+        return list(reversed(_traces))
+
+def clear_traces():
+    with _traces_lock:
+        _traces.clear()
+
+def waterfall(current):
+    """Rows of a trace for the waterfall view: offsets and durations in ms from the trace start."""
+    origin = current.root.start
+    return [{
+        "Paso": step.name,
+        "Nivel": depth,
+        "Inicio (ms)": (step.start - origin) * 1000,
+        "Duración (ms)": step.duration * 1000,
+        "Hilo": step.thread,
+        "Error": step.error,
+        "Atributos": ", ".join(f"{k}={v}" for k, v in step.attrs.items())
+    } for step, depth in current.root.walk()]
+
+def to_chrome_trace(traces):
+    """
+    Trace Event Format ("X" complete events), as read by chrome://tracing and
+    Perfetto. Each trace is one process row, each thread one track.
+    """
+    events = []
+    for current in traces:
+        origin = current.root.start
+        threads = {}
+        events.append({"name": "process_name", "ph": "M", "pid": current.id, "args": {"name": f"{current.name} #{current.id}"}})
+        for step, _ in current.root.walk():
+            tid = threads.setdefault(step.thread, len(threads) + 1)
+            args = {k: str(v) for k, v in step.attrs.items()}
+            if step.error:
+                args["error"] = step.error
+            events.append({
+                "name": step.name,
+                "ph": "X",
+                "ts": (current.started_at + step.start - origin) * 1e6,
+                "dur": step.duration * 1e6,
+                "pid": current.id,
+                "tid": tid,
+                "args": args
+            })
+        events += [
+            {"name": "thread_name", "ph": "M", "pid": current.id, "tid": tid, "args": {"name": thread}}
+            for thread, tid in threads.items()
+        ]
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
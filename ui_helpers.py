@@ -1,4 +1,9 @@
+import time
 import streamlit as st
+import plotly.graph_objects as go
+import pandas as pd
+from tracing import span
+from data_provider import pending_row
 
 def inject_premium_css():
     """Injects high-end financial dashboard styling and hides default elements."""
@@ -291,6 +296,7 @@ def render_dataframe(dataframe):
         "Ticker": st.column_config.TextColumn("Símbolo", width="small"),
         "Nombre": st.column_config.TextColumn("Nombre", width="medium"),
         "Precio Actual": st.column_config.NumberColumn("Precio", format="$%.2f"),
+        "Cambio %": st.column_config.NumberColumn("Cambio", format="percent", help="Variación frente al cierre anterior"),
         "Valor Justo": st.column_config.NumberColumn("Valor Razonable", format="$%.2f", help="Promedio de: Analyst Target, Graham Formula (Growth), Historical PE"),
         "Potencial": st.column_config.ProgressColumn("Potencial", format="%.2f%%", min_value=-1, max_value=1),
         "Estado": st.column_config.TextColumn("Etiqueta", width="small"),
@@ -314,40 +320,44 @@ def render_dataframe(dataframe):
             color = '#f59e0b' # Amber
         return f'color: {color}; font-weight: bold;'
 
-    styled_df = dataframe.style.map(style_status, subset=['Estado', 'Técnico'])
+    with span("style.map", rows=len(dataframe)):
+        styled_df = dataframe.style.map(style_status, subset=[c for c in ['Estado', 'Técnico'] if c in dataframe.columns])
 
-    st.dataframe(
-        styled_df,
-        column_config=column_config,
-        use_container_width=True,
-        hide_index=True,
-        height=600
-    )
+    # The Styler is lazy: the mapped styles are computed when st.dataframe serializes the table
+    with span("st.dataframe", rows=len(dataframe), styled=True):
+        st.dataframe(
+            styled_df,
+            column_config=column_config,
+            use_container_width=True,
+            hide_index=True,
+            height=600
+        )
 
 def render_etf_dataframe(dataframe):
-    st.dataframe(
-        dataframe,
-        column_config={
-            "Ticker": st.column_config.TextColumn("Símbolo", width="small"),
-            "Nombre": st.column_config.TextColumn("Nombre", width="large"),
-            "Precio": st.column_config.NumberColumn("Precio", format="$%.2f"),
-            "Potencial": st.column_config.ProgressColumn(
-                "Potencial 52W",
-                help="Potencial de recuperación hasta el máximo de 52 semanas",
-                format="%.2f%%",
-                min_value=-0.5,
-                max_value=0.5,
-            ),
-            "Estado": st.column_config.TextColumn("Estado", width="medium"),
-            "Yield": st.column_config.NumberColumn("Yield", format="%.2f%%", help="Yield de dividendos (si aplica)"),
-            "Expense Ratio": st.column_config.NumberColumn("Exp. Ratio", format="%.4f", help="Ratio de gastos anual"),
-            "Retorno YTD": st.column_config.NumberColumn("Retorno YTD", format="%.2f%%"),
-            "Categoría": st.column_config.TextColumn("Categoría"),
-            "Activos": st.column_config.NumberColumn("Activos", format="$%.2e"),
-        },
-        use_container_width=True,
-        hide_index=True
-    )
+    with span("st.dataframe", rows=len(dataframe), styled=False):
+        st.dataframe(
+            dataframe,
+            column_config={
+                "Ticker": st.column_config.TextColumn("Símbolo", width="small"),
+                "Nombre": st.column_config.TextColumn("Nombre", width="large"),
+                "Precio": st.column_config.NumberColumn("Precio", format="$%.2f"),
+                "Potencial": st.column_config.ProgressColumn(
+                    "Potencial 52W",
+                    help="Potencial de recuperación hasta el máximo de 52 semanas",
+                    format="%.2f%%",
+                    min_value=-0.5,
+                    max_value=0.5,
+                ),
+                "Estado": st.column_config.TextColumn("Estado", width="medium"),
+                "Yield": st.column_config.NumberColumn("Yield", format="%.2f%%", help="Yield de dividendos (si aplica)"),
+                "Expense Ratio": st.column_config.NumberColumn("Exp. Ratio", format="%.4f", help="Ratio de gastos anual"),
+                "Retorno YTD": st.column_config.NumberColumn("Retorno YTD", format="%.2f%%"),
+                "Categoría": st.column_config.TextColumn("Categoría"),
+                "Activos": st.column_config.NumberColumn("Activos", format="$%.2e"),
+            },
+            use_container_width=True,
+            hide_index=True
+        )
 
 def render_crypto_dataframe(dataframe):
     def highlight_crypto_status(val):
@@ -368,26 +378,80 @@ def render_crypto_dataframe(dataframe):
             color = 'color: #ef4444; font-weight: bold'
         return color
 
-    st.dataframe(
-        dataframe.style.map(highlight_crypto_status, subset=['Estado']).map(highlight_trend, subset=['Tendencia']),
-        column_config={
-            "Ticker": st.column_config.TextColumn("Símbolo", width="small"),
-            "Nombre": st.column_config.TextColumn("Nombre", width="medium"),
-            "Precio": st.column_config.NumberColumn("Precio", format="$%.2f"),
-            "Potencial": st.column_config.ProgressColumn(
-                "Potencial 52W",
-                help="Distancia al máximo de 52 semanas",
-                format="%.2f%%",
-                min_value=-0.5,
-                max_value=1.5,
-            ),
-            "Estado": st.column_config.TextColumn("Estado (Oportunidad)"),
-            "Tendencia": st.column_config.TextColumn("Tendencia (MA)"),
-            "Market Cap": st.column_config.NumberColumn("Market Cap", format="$%.2e"),
-            "Volumen 24h": st.column_config.NumberColumn("Volumen 24h", format="$%.2e"),
-            "MA 50d": st.column_config.NumberColumn("MA 50d", format="$%.2f"),
-            "MA 200d": st.column_config.NumberColumn("MA 200d", format="$%.2f"),
-        },
-        use_container_width=True,
-        hide_index=True
+    with span("st.dataframe", rows=len(dataframe), styled=True):
+        st.dataframe(
+            dataframe.style
+                .map(highlight_crypto_status, subset=[c for c in ['Estado'] if c in dataframe.columns])
+                .map(highlight_trend, subset=[c for c in ['Tendencia'] if c in dataframe.columns]),
+            column_config={
+                "Ticker": st.column_config.TextColumn("Símbolo", width="small"),
+                "Nombre": st.column_config.TextColumn("Nombre", width="medium"),
+                "Precio": st.column_config.NumberColumn("Precio", format="$%.2f"),
+                "Potencial": st.column_config.ProgressColumn(
+                    "Potencial 52W",
+                    help="Distancia al máximo de 52 semanas",
+                    format="%.2f%%",
+                    min_value=-0.5,
+                    max_value=1.5,
+                ),
+                "Estado": st.column_config.TextColumn("Estado (Oportunidad)"),
+                "Tendencia": st.column_config.TextColumn("Tendencia (MA)"),
+                "Market Cap": st.column_config.NumberColumn("Market Cap", format="$%.2e"),
+                "Volumen 24h": st.column_config.NumberColumn("Volumen 24h", format="$%.2e"),
+                "MA 50d": st.column_config.NumberColumn("MA 50d", format="$%.2f"),
+                "MA 200d": st.column_config.NumberColumn("MA 200d", format="$%.2f"),
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+
+def render_streaming_dataframe(stream, tickers, render_func, refresh_every=0.3):
+    """
+    Renders an asset table progressively from stream_concurrently: rows appear
+    as their ticker completes (in watchlist order) and tickers that time out
+    stay listed as 'Pendiente' instead of disappearing.
+    """
+    placeholder = st.empty()
+    rows = {}
+    last_render = 0.0
+
+    def render():
+        ordered = [rows[t] for t in tickers if t in rows]
+        if ordered:
+            with placeholder.container():
+                render_func(pd.DataFrame(ordered))
+
+    for ticker, result, timed_out in stream:
+        if result is not None:
+            rows[ticker] = result
+        elif timed_out:
+            rows[ticker] = pending_row(ticker)
+        if time.monotonic() - last_render >= refresh_every:
+            render()
+            last_render = time.monotonic()
+    render()
+    return rows
+
+def render_trace_waterfall(rows):
+    """Waterfall of one trace's spans (rows from tracing.waterfall), one bar per span in start order."""
+    labels = [f"{'· ' * row['Nivel']}{row['Paso']}" for row in rows]
+    colors = ['#ef4444' if row['Error'] else '#38bdf8' if row['Nivel'] <= 1 else '#94a3b8' for row in rows]
+    fig = go.Figure(go.Bar(
+        y=list(range(len(rows))),
+        x=[row['Duración (ms)'] for row in rows],
+        base=[row['Inicio (ms)'] for row in rows],
+        orientation='h',
+        marker=dict(color=colors),
+        customdata=[[row['Hilo'], row['Atributos']] for row in rows],
+        hovertemplate="%{x:.1f} ms desde %{base:.1f} ms<br>%{customdata[0]}<br>%{customdata[1]}<extra></extra>"
+    ))
+    fig.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='#f8fafc'),
+        margin=dict(l=0, r=0, t=10, b=0),
+        height=max(300, 22 * len(rows)),
+        xaxis=dict(gridcolor='#334155', title="ms"),
+        yaxis=dict(tickvals=list(range(len(rows))), ticktext=labels, autorange="reversed")
     )
+    st.plotly_chart(fig, use_container_width=True)
@@ -1,62 +1,125 @@
-import yfinance as yf
 import pandas as pd
-import streamlit as st
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour to avoid rate limits
+from cache_backend import shared_cache
+from rate_limiter import UpstreamThrottled
+from metrics import instrumented, record_error
+from tracing import traced
+from history_provider import get_close_panel, get_close_series
+from fundamentals_provider import get_financials
+
+PE_OUTLIER_MAX = 200  # Historical P/E samples at or above this are ignored
+
+def _eps_series(fin):
+    """Picks 'Basic EPS' from the income statement, falling back to 'Diluted EPS'."""
+    if 'Basic EPS' in fin.index:
+        return fin.loc['Basic EPS']
+    # Try with 'Diluted EPS' if Basic is not available
+    if 'Diluted EPS' in fin.index:
+        return fin.loc['Diluted EPS']
+    return None
+
+def compute_historical_pe(close_panel, eps_table):
+    """
+    Average historical P/E for every ticker in one vectorized pass.
+    close_panel is a (dates x tickers) close frame and eps_table a long frame
+    with 'ticker', 'date' and 'eps' columns. Each report is matched as-of the
+    last close on or before its date; non-positive EPS and outliers are dropped.
+    Returns a Series of average P/E indexed by ticker (tickers without valid
+    samples are absent).
+    """
+    if close_panel.empty or eps_table.empty:
+        return pd.Series(dtype=float)
+
+    prices = (
+        close_panel.rename_axis(index='date', columns='ticker')
+        .reset_index()
+        .melt(id_vars='date', var_name='ticker', value_name='close')
+        .dropna(subset=['close'])
+        .sort_values('date')
+    )
+    reports = eps_table.assign(date=pd.to_datetime(eps_table['date'])).dropna(subset=['eps']).sort_values('date')
+    matched = pd.merge_asof(reports, prices, on='date', by='ticker', direction='backward')
+
+    matched = matched[matched['eps'] > 0]  # Avoid division by zero or weird negative P/Es for average
+    pe = matched['close'] / matched['eps']
+    valid = (pe > 0) & (pe < PE_OUTLIER_MAX)
+    return pe[valid].groupby(matched.loc[valid, 'ticker']).mean()
+
+def _eps_table(eps_by_ticker):
+    frames = [
+        pd.DataFrame({'ticker': ticker, 'date': pd.to_datetime(eps.index), 'eps': eps.to_numpy(dtype=float)})
+        for ticker, eps in eps_by_ticker.items()
+    ]
+    if not frames:
+        return pd.DataFrame(columns=['ticker', 'date', 'eps'])
+    return pd.concat(frames, ignore_index=True)
+
+def _fetch_eps(ticker_symbol):
+    return _eps_series(get_financials(ticker_symbol))
+
+@shared_cache(ttl=3600)  # Cache for 1 hour to avoid rate limits
+@instrumented
 def get_historical_pe(ticker_symbol):
     """
     Calculates the average P/E of the last 5 years using historical data.
     Returns (avg_pe, method_used)
     """
     try:
-        t = yf.Ticker(ticker_symbol)
-        
         # 1. Try to get historical EPS
-        fin = t.financials
-        if 'Basic EPS' not in fin.index:
-            # Try with 'Diluted EPS' if Basic is not available
-            if 'Diluted EPS' in fin.index:
-                eps_series = fin.loc['Diluted EPS']
-            else:
-                return None, "No historical EPS"
-        else:
-            eps_series = fin.loc['Basic EPS']
-            
-        # 2. Get historical prices for report dates
-        pe_values = []
-        history = t.history(period="5y")
-        
-        if history.empty:
+        eps_series = _fetch_eps(ticker_symbol)
+        if eps_series is None:
+            return None, "No historical EPS"
+
+        # 2. Match report dates against the stored price history
+        closes = get_close_series(ticker_symbol)
+        if closes.empty:
             return None, "No price history"
 
-        for date, eps in eps_series.items():
-            try:
-                ts = pd.Timestamp(date)
-                # Robust method: find price on or before report date
-                mask = (history.index <= ts)
-                if mask.any():
-                    price = history.loc[mask].iloc[-1]['Close']
-                    if eps > 0:  # Avoid division by zero or weird negative P/Es for average
-                        pe = price / eps
-                        # Filter extreme outliers
-                        if 0 < pe < 200:
-                            pe_values.append(pe)
-            except Exception:
-                continue
-                
-        if pe_values:
-            return sum(pe_values) / len(pe_values), "5y Historical Avg"
-        
+        pe = compute_historical_pe(closes.to_frame(ticker_symbol), _eps_table({ticker_symbol: eps_series}))
+        if ticker_symbol in pe.index:
+            return float(pe[ticker_symbol]), "5y Historical Avg"
+
         return None, "Insufficient data"
         
+    except UpstreamThrottled:
+        raise
     except Exception as e:
         print(f"Error calculating historical PE for {ticker_symbol}: {e}")
+        record_error("get_historical_pe", e)
         return None, "Error"
 
+def calculate_historical_pes(tickers):
+    """
+    Historical P/E for a whole universe: EPS statements are fetched per ticker
+    (there is no bulk endpoint) and matched against the stored price panel in
+    a single as-of join. Returns a Series of average P/E indexed by ticker.
+    """
+    eps_by_ticker = {}
+    for ticker in tickers:
+        try:
+            eps = _fetch_eps(ticker)
+        except UpstreamThrottled:
+            raise
+        except Exception as e:
+            print(f"Error fetching EPS for {ticker}: {e}")
+            continue
+        if eps is not None:
+            eps_by_ticker[ticker] = eps
+    return compute_historical_pe(get_close_panel(list(eps_by_ticker)), _eps_table(eps_by_ticker))
+
+@traced("valuation")
 def calculate_composite_fair_value(current_price, info, ticker_symbol):
     """
     Calculates a composite Fair Value using multiple models.
     """
+    hist_pe, _ = get_historical_pe(ticker_symbol)
+    return composite_fair_value(current_price, info, hist_pe)
+
+def composite_fair_value(current_price, info, hist_pe):
+    """
+    Composite Fair Value from already loaded inputs (no upstream calls), so
+    the screener can run it in worker processes.
+    """
     eps = info.get('trailingEps')
     pe_ratio = info.get('trailingPE')
     peg_ratio = info.get('pegRatio')
@@ -79,7 +142,6 @@ def calculate_composite_fair_value(current_price, info, ticker_symbol):
             pass
             
     # 3. Historical PE
-    hist_pe, _ = get_historical_pe(ticker_symbol)
     if hist_pe and eps:
         models['Historical PE'] = eps * hist_pe
 
@@ -0,0 +1,32 @@
+import json
+import os
+
+TICKERS_FILE = "tickers.json"
+DEFAULT_TICKERS = {
+    "stocks": ["AAPL", "TSLA", "MSFT", "GOOGL", "AMZN", "META", "NVDA", "NFLX", "AMD", "INTC"],
+    "etfs": [],
+    "crypto": []
+}
+
+def load_tickers():
+    if os.path.exists(TICKERS_FILE):
+        try:
+            with open(TICKERS_FILE, "r") as f:
+                data = json.load(f)
+                if isinstance(data, list):
+                    return {"stocks": data, "etfs": [], "crypto": []}
+                if isinstance(data, dict):
+                    for key in ["stocks", "etfs", "crypto"]:
+                        if key not in data:
+                            data[key] = []
+                    return data
+        except Exception:
+            pass
+    return {key: list(value) for key, value in DEFAULT_TICKERS.items()}
+
+def save_tickers(tickers):
+    try:
+        with open(TICKERS_FILE, "w") as f:
+            json.dump(tickers, f)
+    except Exception as e:
+        print(f"Error saving tickers: {e}")